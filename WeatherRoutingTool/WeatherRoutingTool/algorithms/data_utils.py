@@ -1,12 +1,109 @@
+import random
+from collections import OrderedDict
+
 import numpy as np
 import xarray as xr
 from geographiclib.geodesic import Geodesic
+from skimage.graph import MCP
+
+from WeatherRoutingTool.utils.field_sampler import GridAxis
 
 
 def get_closest(array, value):
     return np.abs(array - value).argmin()
 
 
+def get_closest_indices(points, values):
+    """
+    Vectorised equivalent of get_closest for monotonic (increasing or decreasing) points. Regular points are handled by
+    affine index arithmetic, irregular points by binary search (see GridAxis). Values outside of the range of points
+    are mapped to the closest boundary.
+    """
+    points = np.asarray(points, dtype=float)
+    is_decreasing = (points.shape[0] > 1) and (points[0] > points[-1])
+    axis = GridAxis(points[::-1] if is_decreasing else points)
+    idx, weight, _ = axis.get_index(values)
+    idx = np.where(weight > 0.5, idx + 1, idx)
+    return axis.size - 1 - idx if is_decreasing else idx
+
+
+##
+# Path searches of the initial population of the genetic algorithm. Every route is searched on its own shuffled cost
+# field and the search stops as soon as the end point is reached (no reuse, thus no caching). The searches are
+# independent and can be distributed over worker processes which receive the cost grid once at startup.
+
+worker_cost = None  # cost grid of the current worker process
+
+
+def init_worker(cost):
+    global worker_cost
+    worker_cost = cost
+
+
+def get_shuffled_cost(cost):
+    shuffled_cost = cost.copy()
+    nan_mask = np.isnan(shuffled_cost)  # corresponds, e.g., to land pixels
+    shuffled_cost[nan_mask] = np.nanmean(cost)
+
+    # shuffle first along South-North (latitude), then along West-East (longitude) axis
+    rng = np.random.default_rng()
+    shuffled_cost = rng.permutation(shuffled_cost, axis=0)
+    shuffled_cost = rng.permutation(shuffled_cost, axis=1)
+
+    # assign very high weights to nan values (land pixels)
+    shuffled_cost[nan_mask] = 1e20
+    return shuffled_cost
+
+
+def find_path(cost, start, end):
+    """
+    Return the minimum-cost path from start to end (grid indices). Same result as route_through_array(cost, start, end,
+    fully_connected=True, geometric=False).
+    """
+    mcp = MCP(cost, fully_connected=True)
+    mcp.find_costs([tuple(start)], [tuple(end)])
+    return mcp.traceback(tuple(end))
+
+
+def find_random_path(start, end):
+    return find_path(get_shuffled_cost(worker_cost), start, end)
+
+
+def get_max_per_bin(values, scores, bin_edges):
+    """
+    Vectorised equivalent of scipy.stats.binned_statistic(values, scores, statistic=np.nanmax, bins=bin_edges) which
+    additionally provides the index of the maximum of every bin. All but the last bin are half-open intervals
+    [edge_i, edge_i+1), the last bin includes its right edge. NaN scores are ignored.
+
+    Returns:
+        bin_max - maximum score per bin (NaN for empty bins)
+        bin_argmax - index of the maximum per bin, the lowest index is chosen for ties (-1 for empty bins)
+        bin_number - bin per element (-1 for elements outside of the bins or with NaN score)
+    """
+    values = np.asarray(values, dtype=float)
+    scores = np.asarray(scores, dtype=float)
+    bin_edges = np.asarray(bin_edges, dtype=float)
+    nbins = bin_edges.shape[0] - 1
+
+    bin_number = np.searchsorted(bin_edges, values, side='right') - 1
+    bin_number[values == bin_edges[-1]] = nbins - 1
+    valid = (bin_number >= 0) & (bin_number < nbins) & ~np.isnan(scores)
+    bin_number[~valid] = -1
+
+    # sort by bin, descending score and ascending index such that the first element of every bin is its maximum
+    idxs = np.flatnonzero(valid)
+    idxs = idxs[np.lexsort((idxs, -scores[idxs], bin_number[idxs]))]
+    is_first = np.ones(idxs.shape[0], dtype=bool)
+    is_first[1:] = bin_number[idxs[1:]] != bin_number[idxs[:-1]]
+    idxs_max = idxs[is_first]
+
+    bin_max = np.full(nbins, np.nan)
+    bin_argmax = np.full(nbins, -1)
+    bin_max[bin_number[idxs_max]] = scores[idxs_max]
+    bin_argmax[bin_number[idxs_max]] = idxs_max
+    return bin_max, bin_argmax, bin_number
+
+
 def distance(route):
     geod = Geodesic.WGS84
     dists = []
@@ -51,35 +148,76 @@ def time_diffs(speed, route):
 
 
 class GridMixin:
+    """
+    Grid-based helpers for the genetic algorithm.
+
+    Minimum-cost paths are searched on a pool of cost_pool_size shuffled cost fields which is generated for the first
+    request. The minimum-cost-path searches are cached per cost field and start index: a search explores the
+    paths from its start index to all grid points s.t. every following path from the same start index on the same cost
+    field is obtained by a traceback. The mcp_cache_size most recently used searches are kept.
+    """
     grid: xr.Dataset
+    cost_pool: list  # shuffled cost fields
+    mcp_cache: OrderedDict  # (index of cost field, start index) -> MCP object
 
-    def __init__(self, grid, *args, **kwargs):
+    def __init__(self, grid, *args, cost_pool_size=20, mcp_cache_size=100, **kwargs):
         super().__init__(*args, **kwargs)
         self.grid = grid
-
+        self.cost_pool_size = cost_pool_size
+        self.mcp_cache_size = mcp_cache_size
+        self.cost_pool = None
+        self.mcp_cache = OrderedDict()
+        self.lats = grid.coords['latitude'].values
+        self.lons = grid.coords['longitude'].values
+
+    def __getstate__(self):
+        # MCP objects cannot be copied (e.g. by the history of pymoo), copies start with an empty cache
+        state = self.__dict__.copy()
+        state['mcp_cache'] = OrderedDict()
+        return state
+
+    ##
+    # Conversion between grid indices and coordinates. Both functions accept a sequence of (lat, lon) pairs (e.g. a
+    # path returned by get_path) and return the latitudes, the longitudes and the route (array of shape (n, 2)) as
+    # numpy arrays.
     def index_to_coords(self, points_as_indices):
-        lats = self.grid.coords['latitude'][[lat_index for lat_index, lon_index in points_as_indices]].values.tolist()
-        lons = self.grid.coords['longitude'][[lon_index for lat_index, lon_index in points_as_indices]].values.tolist()
-        route = [[x, y] for x, y in zip(lats, lons)]
-        return lats, lons, route
+        indices = np.asarray(points_as_indices, dtype=int).reshape(-1, 2)
+        lats = self.lats[indices[:, 0]]
+        lons = self.lons[indices[:, 1]]
+        return lats, lons, np.column_stack((lats, lons))
 
     def coords_to_index(self, points_as_coords):
-        lats = [get_closest(self.grid.latitude.data, lat) for lat, lon in points_as_coords]
-        lons = [get_closest(self.grid.longitude.data, lon) for lat, lon in points_as_coords]
-        route = [[x, y] for x, y in zip(lats, lons)]
-        return lats, lons, route
+        coords = np.asarray(points_as_coords, dtype=float).reshape(-1, 2)
+        lats = get_closest_indices(self.lats, coords[:, 0])
+        lons = get_closest_indices(self.lons, coords[:, 1])
+        return lats, lons, np.column_stack((lats, lons))
 
     def get_shuffled_cost(self):
-        cost = self.grid.data
-        shuffled_cost = cost.copy()
-        nan_mask = np.isnan(shuffled_cost)  # corresponds, e.g., to land pixels
-        shuffled_cost[nan_mask] = np.nanmean(cost)
-
-        # shuffle first along South-North (latitude), then along West-East (longitude) axis
-        rng = np.random.default_rng()
-        shuffled_cost = rng.permutation(shuffled_cost, axis=0)
-        shuffled_cost = rng.permutation(shuffled_cost, axis=1)
-
-        # assign very high weights to nan values (land pixels)
-        shuffled_cost[nan_mask] = 1e20
-        return shuffled_cost
+        return get_shuffled_cost(self.grid.data)
+
+    def get_cost_pool(self):
+        if self.cost_pool is None:
+            self.cost_pool = [self.get_shuffled_cost() for i in range(0, self.cost_pool_size)]
+        return self.cost_pool
+
+    def get_path(self, start, end, ipool=None):
+        """
+        Return the minimum-cost path from start to end (grid indices) on the cost field ipool of the cost pool. A random
+        cost field is chosen if ipool is None. Same result as route_through_array(cost, start, end,
+        fully_connected=True, geometric=False).
+        """
+        cost_pool = self.get_cost_pool()
+        if ipool is None:
+            ipool = random.randrange(len(cost_pool))
+        key = (ipool, tuple(start))
+
+        mcp = self.mcp_cache.get(key)
+        if mcp is None:
+            mcp = MCP(cost_pool[ipool], fully_connected=True)
+            mcp.find_costs([tuple(start)])
+            self.mcp_cache[key] = mcp
+            if len(self.mcp_cache) > self.mcp_cache_size:
+                self.mcp_cache.popitem(last=False)
+        else:
+            self.mcp_cache.move_to_end(key)
+        return mcp.traceback(tuple(end))
@@ -9,11 +9,12 @@ from matplotlib import pyplot as plt
 from pymoo.algorithms.moo.nsga2 import NSGA2
 from pymoo.termination import get_termination
 from pymoo.optimize import minimize
-from pymoo.util.running_metric import RunningMetric
 
 import WeatherRoutingTool.utils.formatting as form
 import WeatherRoutingTool.utils.graphics as graphics
 from WeatherRoutingTool.algorithms.routingalg import RoutingAlg
+from WeatherRoutingTool.algorithms.genetic_history import GeneticHistory
+from WeatherRoutingTool.algorithms.genetic_pool import get_routing_problem, ParallelRoutingProblem
 from WeatherRoutingTool.algorithms.genetic_utils import (CrossoverFactory, MutationFactory, PopulationFactory,
                                                          RoutingProblem, RouteDuplicateElimination)
 from WeatherRoutingTool.constraints.constraints import ConstraintsList
@@ -49,6 +50,11 @@ class Genetic(RoutingAlg):
         self.mutation_type = config.GENETIC_MUTATION_TYPE
         self.pop_size = config.GENETIC_POPULATION_SIZE
         self.population_type = config.GENETIC_POPULATION_TYPE
+        self.n_workers = config.GENETIC_N_WORKERS
+        self.cost_pool_size = config.GENETIC_COST_POOL_SIZE
+        self.history_routes = config.GENETIC_HISTORY_ROUTES
+        self.history_log = config.GENETIC_HISTORY_LOG
+        self.config = config  # configuration of the worker processes
 
         self.ship_params = None
 
@@ -59,13 +65,24 @@ class Genetic(RoutingAlg):
         lat_int, lon_int = 10, 10
         wave_height = data.VHM0.isel(time=0)
         wave_height = wave_height[::lat_int, ::lon_int]
-        problem = RoutingProblem(departure_time=self.departure_time, boat=boat, constraint_list=constraints_list)
+        if self.n_workers > 1:
+            problem = ParallelRoutingProblem(self.departure_time, boat, constraints_list, self.n_workers,
+                                             get_routing_problem, (self.config,))
+        else:
+            problem = RoutingProblem(departure_time=self.departure_time, boat=boat, constraint_list=constraints_list)
         initial_population = PopulationFactory.get_population(self.population_type, self.start, self.finish,
-                                                              grid=wave_height)
-        mutation = MutationFactory.get_mutation(self.mutation_type, grid=wave_height)
+                                                              grid=wave_height, cost_pool_size=self.cost_pool_size,
+                                                              n_workers=self.n_workers)
+        mutation = MutationFactory.get_mutation(self.mutation_type, grid=wave_height,
+                                                cost_pool_size=self.cost_pool_size)
         crossover = CrossoverFactory.get_crossover()
         duplicates = RouteDuplicateElimination()
-        res = self.optimize(problem, initial_population, crossover, mutation, duplicates)
+        try:
+            res = self.optimize(problem, initial_population, crossover, mutation, duplicates)
+        finally:
+            if self.n_workers > 1:
+                problem.close()
+        problem.print_cache_statistics()
 
         result = self.terminate(result_object=res, problem=problem)
         return result
@@ -84,6 +101,7 @@ class Genetic(RoutingAlg):
         logger.info('generations: ' + str(self.ncount))
         logger.info('pop_size: ' + str(self.pop_size))
         logger.info('offsprings: ' + str(self.n_offsprings))
+        logger.info('workers: ' + str(self.n_workers))
 
     def terminate(self, **kwargs):
         super().terminate()
@@ -98,7 +116,8 @@ class Genetic(RoutingAlg):
 
         if figure_path is not None:
             self.plot_running_metric(res)
-            self.plot_population_per_generation(res, best_route)
+            if self.history_routes != 0:
+                self.plot_population_per_generation(res, best_route)
 
         lats = best_route[:, 0]
         lons = best_route[:, 1]
@@ -147,34 +166,30 @@ class Genetic(RoutingAlg):
                           return_least_infeasible=False)
         termination = get_termination("n_gen", self.ncount)
 
-        res = minimize(problem, algorithm, termination, save_history=True, verbose=True)
+        history = GeneticHistory(n_routes=self.history_routes, log_path=self.history_log)
+
+        res = minimize(problem, algorithm, termination, callback=history, verbose=True)
+        res.history = history
         # stop = timeit.default_timer()
         # route_cost(res.X)
         return res
 
     def plot_running_metric(self, res):
         figure_path = get_figure_path()
-        running = RunningMetric()
 
         plt.rcParams['font.size'] = graphics.get_standard('font_size')
         fig, ax = plt.subplots(figsize=graphics.get_standard('fig_size'))
 
-        igen = 0
         delta_nadir = np.full(self.ncount, -99.)
         delta_ideal = np.full(self.ncount, -99.)
-        for algorithm in res.history:
-            running.update(algorithm)
-            delta_f = running.delta_f
-            if igen > 0:
-                delta_nadir[igen] = running.delta_nadir[igen-1]
-                delta_ideal[igen] = running.delta_ideal[igen-1]
-            else:
-                delta_nadir[igen] = 0
-                delta_ideal[igen] = 0
-
-            x_f = (np.arange(len(delta_f)) + 1)
-            ax.plot(x_f, delta_f, label="t=%s (*)" % (igen + 1), alpha=0.9, linewidth=3)
-            igen = igen + 1
+        for igen, generation in enumerate(res.history.generations):
+            if 'delta_f' not in generation:
+                continue
+            delta_nadir[igen] = generation['delta_nadir']
+            delta_ideal[igen] = generation['delta_ideal']
+
+            x_f = (np.arange(len(generation['delta_f'])) + 1)
+            ax.plot(x_f, generation['delta_f'], label="t=%s (*)" % (igen + 1), alpha=0.9, linewidth=3)
         ax.set_yscale("symlog")
         ax.legend()
 
@@ -209,13 +224,13 @@ class Genetic(RoutingAlg):
             ax.remove()
             fig, ax = graphics.generate_basemap(fig, None, self.start, self.finish, figtitlestr, False)
 
-            for iroute in range(0, self.pop_size):
-                last_pop = history[igen].pop.get('X')
+            last_pop = history.get_routes(igen)
+            for iroute in range(0, len(last_pop)):
                 if iroute == 0:
-                    ax.plot(last_pop[iroute, 0][:, 1], last_pop[iroute, 0][:, 0], color="firebrick",
+                    ax.plot(last_pop[iroute][:, 1], last_pop[iroute][:, 0], color="firebrick",
                             label='full population')
                 else:
-                    ax.plot(last_pop[iroute, 0][:, 1], last_pop[iroute, 0][:, 0], color="firebrick")
+                    ax.plot(last_pop[iroute][:, 1], last_pop[iroute][:, 0], color="firebrick")
             if igen == (self.ncount - 1):
                 ax.plot(best_route[:, 1], best_route[:, 0], color="blue", label='best route')
             ax.legend()
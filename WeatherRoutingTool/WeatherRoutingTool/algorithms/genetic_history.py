@@ -0,0 +1,112 @@
+import json
+import logging
+
+import numpy as np
+from pymoo.core.callback import Callback
+from pymoo.util.running_metric import RunningMetric
+
+import WeatherRoutingTool.utils.formatting as form
+
+logger = logging.getLogger('WRT.Genetic')
+
+##
+# Lightweight history of the genetic algorithm.
+#
+# Instead of storing a copy of the whole algorithm per generation (pymoo's save_history), the callback only records
+# what is needed for the diagnostic plots, i.e. per generation:
+#   - 'n_gen', 'n_eval': generation and number of evaluations
+#   - 'f_min', 'f_mean', 'f_max': statistics of the objective of the population
+#   - 'n_feasible': number of feasible routes of the population
+#   - 'delta_f', 'delta_ideal', 'delta_nadir': running metric of the optimum (see pymoo.util.running_metric)
+#   - 'routes': optional snapshot of up to n_routes routes of the population
+# If log_path is provided, every generation is appended to the log as one line of json (coordinates rounded to
+# 'decimals'). In this case, the route snapshots are not kept in memory but read back from the log when requested.
+
+
+def read_history_log(log_path):
+    """
+    Return the list of generations written to log_path by GeneticHistory.
+    """
+    with open(log_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class GeneticHistory(Callback):
+    """
+    Callback that records the metrics of every generation of the genetic algorithm.
+
+    Parameters
+    ----------
+    n_routes : int
+        Maximum number of routes per generation stored for the plots of the population (evenly spaced over the
+        population). 0: no snapshots, None: full population.
+    log_path : str, optional
+        Path of the json lines file to which the generations are streamed.
+    decimals : int
+        Number of decimals of the coordinates in the log.
+    """
+
+    def __init__(self, n_routes=None, log_path=None, decimals=5):
+        super().__init__()
+        self.n_routes = n_routes
+        self.log_path = log_path
+        self.decimals = decimals
+        self.running = RunningMetric()
+        self.generations = []
+
+        if self.log_path is not None:
+            # start a new log for every run
+            open(self.log_path, 'w').close()
+            logger.info(form.get_log_step('Writing history of the genetic algorithm to ' + str(self.log_path), 0))
+
+    def get_snapshot(self, X):
+        if self.n_routes is None or X.shape[0] <= self.n_routes:
+            idxs = np.arange(X.shape[0])
+        else:
+            idxs = np.unique(np.linspace(0, X.shape[0] - 1, self.n_routes).round().astype(int))
+        return [np.round(np.asarray(X[idx, 0], dtype=float), self.decimals) for idx in idxs]
+
+    def notify(self, algorithm):
+        pop = algorithm.pop
+        F = pop.get('F')[:, 0]
+        generation = {'n_gen': int(algorithm.n_gen), 'n_eval': int(algorithm.evaluator.n_eval),
+                      'f_min': float(np.min(F)), 'f_mean': float(np.mean(F)), 'f_max': float(np.max(F)),
+                      'n_feasible': int(np.sum(pop.get('feasible')))}
+
+        self.running.update(algorithm)
+        if self.running.delta_f is not None:
+            # delta_ideal and delta_nadir of the current generation are zero by definition, the values with respect
+            # to the previous generation are the second to last entries
+            igen = len(self.running.delta_f) - 1
+            generation['delta_f'] = [float(delta) for delta in self.running.delta_f]
+            generation['delta_ideal'] = float(self.running.delta_ideal[igen - 1]) if igen > 0 else 0.
+            generation['delta_nadir'] = float(self.running.delta_nadir[igen - 1]) if igen > 0 else 0.
+
+        routes = self.get_snapshot(pop.get('X')) if self.n_routes != 0 else []
+
+        if self.log_path is not None:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(dict(generation, routes=[route.tolist() for route in routes])) + '\n')
+        else:
+            generation['routes'] = routes
+        self.generations.append(generation)
+
+    def get(self, key):
+        """
+        Return the values of key (see above) for all generations.
+        """
+        if key == 'routes':
+            return [self.get_routes(igen) for igen in range(0, len(self.generations))]
+        return [generation.get(key) for generation in self.generations]
+
+    def get_routes(self, igen):
+        """
+        Return the route snapshot of generation igen (counting from 0).
+        """
+        if self.log_path is None:
+            return self.generations[igen]['routes']
+        with open(self.log_path) as f:
+            for iline, line in enumerate(f):
+                if iline == igen:
+                    return [np.array(route) for route in json.loads(line)['routes']]
+        raise ValueError('Generation ' + str(igen) + ' not found in ' + str(self.log_path))
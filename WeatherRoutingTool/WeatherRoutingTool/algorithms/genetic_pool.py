@@ -0,0 +1,95 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.algorithms.genetic_utils import RoutingProblem
+from WeatherRoutingTool.constraints.constraints import ConstraintsListFactory
+from WeatherRoutingTool.ship.ship_factory import ShipFactory
+
+logger = logging.getLogger('WRT.Genetic')
+
+##
+# Parallel evaluation of the population of the genetic algorithm.
+#
+# The population is split into chunks which are evaluated by a persistent pool of worker processes. Every worker
+# initialises its own routing problem once at startup (i.e. it reads the environmental data and builds the constraints)
+# and keeps it for all following generations. Every chunk is evaluated in a single batched request of the worker. The
+# fitness cache is kept by the main process, i.e. only routes that have not been evaluated before are sent to the
+# workers.
+
+worker_problem = None  # routing problem of the current worker process
+
+
+def init_worker(get_problem, args):
+    global worker_problem
+    worker_problem = get_problem(*args)
+
+
+def get_routing_problem(config):
+    departure_time = datetime.strptime(config.DEPARTURE_TIME, '%Y-%m-%dT%H:%MZ')
+    boat = ShipFactory.get_ship(ShipFactory.get_worker_config(config))
+    constraint_list = ConstraintsListFactory.get_constraints_list_from_config(config)
+    return RoutingProblem(departure_time, boat, constraint_list)
+
+
+def evaluate_chunk(routes):
+    return worker_problem.evaluate_routes(routes)
+
+
+class ParallelRoutingProblem(RoutingProblem):
+    """
+    Routing problem that distributes the evaluation of the population over a pool of worker processes.
+
+    Parameters
+    ----------
+    departure_time, boat, constraint_list :
+        see RoutingProblem. Populations with less than min_chunk_size routes per worker are evaluated by the main
+        process.
+    n_workers : int
+        Number of worker processes.
+    get_problem : callable
+        Function that returns the RoutingProblem of a worker process when called with args. Needs to be picklable.
+    args : tuple
+        Arguments for get_problem.
+    min_chunk_size : int
+        Minimum number of routes per chunk.
+    """
+
+    def __init__(self, departure_time, boat, constraint_list, n_workers, get_problem, args=(), min_chunk_size=2):
+        super().__init__(departure_time, boat, constraint_list)
+        self.n_workers = n_workers
+        self.get_problem = get_problem
+        self.args = args
+        self.min_chunk_size = min_chunk_size
+        self.pool = None
+        self.exclude_from_serialization.append('pool')
+
+    def get_pool(self):
+        if self.pool is None:
+            logger.info(form.get_log_step('Starting pool of ' + str(self.n_workers) + ' workers for the evaluation of '
+                                          'the population', 0))
+            self.pool = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_worker, initargs=(self.get_problem, self.args))
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def evaluate_routes(self, routes):
+        n_chunks = min(self.n_workers, routes.shape[0] // self.min_chunk_size)
+        if n_chunks < 2:
+            return super().evaluate_routes(routes)
+
+        pool = self.get_pool()
+        futures = [pool.submit(evaluate_chunk, routes[chunk]) for chunk in
+                   np.array_split(np.arange(routes.shape[0]), n_chunks)]
+        results = [future.result() for future in futures]
+
+        return (np.concatenate([fuel for fuel, _ in results]),
+                np.concatenate([constraints for _, constraints in results]))
@@ -1,25 +1,74 @@
 import logging
+import multiprocessing
 import os
 import random
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 import cartopy.crs as ccrs
 import cartopy.feature as cf
 import numpy as np
 from matplotlib import pyplot as plt
 from pymoo.core.crossover import Crossover
-from pymoo.core.duplicate import ElementwiseDuplicateElimination
+from pymoo.core.duplicate import DuplicateElimination
 from pymoo.core.mutation import Mutation
-from pymoo.core.problem import ElementwiseProblem
+from pymoo.core.problem import Problem
 from pymoo.core.sampling import Sampling
-from skimage.graph import route_through_array
 
+import WeatherRoutingTool.utils.formatting as form
 import WeatherRoutingTool.utils.graphics as graphics
-from WeatherRoutingTool.algorithms.data_utils import GridMixin
+from WeatherRoutingTool.algorithms.data_utils import find_path, find_random_path, GridMixin, init_worker
 from WeatherRoutingTool.routeparams import RouteParams
 
 logger = logging.getLogger('WRT.Genetic')
 
 
+def get_route_fingerprint(route, decimals=6):
+    """
+    Return a hashable fingerprint of a route (array of shape (n_waypoints, 2)). Routes with the same number of
+    waypoints whose coordinates agree after rounding to decimals share the same fingerprint.
+    """
+    # adding 0 maps -0.0 to 0.0
+    return (np.round(np.asarray(route, dtype=float), decimals) + 0.).tobytes()
+
+
+def get_crossover_candidates(parents1, parents2):
+    """
+    Return the candidate crossover points for every pair of routes (parents1[k], parents2[k]), i.e. the waypoints of
+    parents1[k] that are also contained in parents2[k]. The candidates are returned as tuple of index arrays which
+    contain, for every such waypoint of parents1[k], the index of its first occurrence in parents1[k] and in
+    parents2[k]. The waypoints of all routes are labelled in a single pass.
+    """
+    routes = list(parents1) + list(parents2)
+    n_pairs = len(parents1)
+    offsets = np.cumsum([0] + [len(route) for route in routes])
+    # adding 0 maps -0.0 to 0.0
+    points = np.concatenate([np.asarray(route, dtype=float) for route in routes]) + 0.
+    _, labels = np.unique(points, axis=0, return_inverse=True)
+    labels = labels.ravel()
+    n_labels = labels.max() + 1
+
+    candidates = []
+    for k in range(n_pairs):
+        labels1 = labels[offsets[k]:offsets[k + 1]]
+        labels2 = labels[offsets[n_pairs + k]:offsets[n_pairs + k + 1]]
+        first1 = get_first_occurrence(labels1, n_labels)
+        first2 = get_first_occurrence(labels2, n_labels)
+        is_shared = first2[labels1] >= 0
+        candidates.append((first1[labels1[is_shared]], first2[labels1[is_shared]]))
+    return candidates
+
+
+def get_first_occurrence(labels, n_labels):
+    """
+    Return the index of the first occurrence of every label in labels (-1 for labels that do not occur).
+    """
+    first = np.full(n_labels, -1)
+    unique_labels, unique_idxs = np.unique(labels, return_index=True)
+    first[unique_labels] = unique_idxs
+    return first
+
+
 class GridBasedPopulation(GridMixin, Sampling):
     """
     Make initial population for genetic algorithm based on a grid and associated cost values
@@ -29,22 +78,31 @@ class GridBasedPopulation(GridMixin, Sampling):
      - implemented approach: https://stackoverflow.com/a/50465583, scenario 2
      - call print(GridBasedPopulation.mro()) to see the method resolution order
     """
-    def __init__(self, src, dest, grid, var_type=np.float64):
-        super().__init__(grid=grid)
+    def __init__(self, src, dest, grid, var_type=np.float64, cost_pool_size=20, n_workers=1):
+        super().__init__(grid=grid, cost_pool_size=cost_pool_size)
         self.var_type = var_type
         self.src = src
         self.dest = dest
+        self.n_workers = n_workers
 
     def _do(self, problem, n_samples, **kwargs):
         routes = np.full((n_samples, 1), None, dtype=object)
-        _, _, start_indices = self.coords_to_index([(self.src[0], self.src[1])])
-        _, _, end_indices = self.coords_to_index([(self.dest[0], self.dest[1])])
+        _, _, (start_index, end_index) = self.coords_to_index([self.src, self.dest])
+        start_index, end_index = tuple(start_index.tolist()), tuple(end_index.tolist())
+
+        # every route is searched on its own shuffled cost field, the searches are not cached as they are not reused
+        if self.n_workers > 1:
+            logger.info(form.get_log_step('Searching ' + str(n_samples) + ' routes of the initial population on '
+                                          + str(self.n_workers) + ' workers', 0))
+            with ProcessPoolExecutor(max_workers=self.n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                     initializer=init_worker, initargs=(self.grid.data,)) as pool:
+                paths = list(pool.map(find_random_path, [start_index] * n_samples, [end_index] * n_samples))
+        else:
+            paths = [find_path(self.get_shuffled_cost(), start_index, end_index) for i in range(n_samples)]
+
         for i in range(n_samples):
-            shuffled_cost = self.get_shuffled_cost()
-            route, _ = route_through_array(shuffled_cost, start_indices[0], end_indices[0],
-                                           fully_connected=True, geometric=False)
             # logger.debug(f"GridBasedPopulation._do: type(route)={type(route)}, route={route}")
-            _, _, route = self.index_to_coords(route)
+            _, _, route = self.index_to_coords(paths[i])
             routes[i][0] = np.array(route)
 
         figure_path = graphics.get_figure_path()
@@ -66,9 +124,9 @@ class PopulationFactory:
         pass
 
     @staticmethod
-    def get_population(population_type, src, dest, grid=None):
+    def get_population(population_type, src, dest, grid=None, cost_pool_size=20, n_workers=1):
         if population_type == 'grid_based':
-            population = GridBasedPopulation(src, dest, grid)
+            population = GridBasedPopulation(src, dest, grid, cost_pool_size=cost_pool_size, n_workers=n_workers)
         else:
             msg = f"Population type '{population_type}' is invalid!"
             logger.error(msg)
@@ -90,24 +148,29 @@ class GeneticCrossover(Crossover):
         # The input of has the following shape (n_parents, n_matings, n_var)
         _, n_matings, n_var = X.shape
         Y = np.full_like(X, None, dtype=object)
+        candidates = get_crossover_candidates(X[0, :, 0], X[1, :, 0])
         for k in range(n_matings):
             # get the first and the second parent
             a, b = X[0, k, 0], X[1, k, 0]
-            Y[0, k, 0], Y[1, k, 0] = self.cross_over(a, b)
+            Y[0, k, 0], Y[1, k, 0] = self.cross_over(a, b, candidates[k])
         # print("Y:",Y)
         return Y
 
-    def cross_over(self, parent1, parent2):
+    def cross_over(self, parent1, parent2, candidates=None):
         # src = parent1[0]
         # dest = parent1[-1]
-        intersect = np.array([x for x in parent1 if any((x == y).all() for y in parent2)])
+        if candidates is None:
+            candidates = get_crossover_candidates([parent1], [parent2])[0]
+        idxs1, idxs2 = candidates
 
-        if len(intersect) == 0:
+        if idxs1.shape[0] == 0:
             return parent1, parent2
         else:
-            cross_over_point = random.choice(intersect)
-            idx1 = np.where((parent1 == cross_over_point).all(axis=1))[0][0]
-            idx2 = np.where((parent2 == cross_over_point).all(axis=1))[0][0]
+            # every shared waypoint of parent1 is a candidate, i.e. waypoints that occur several times are weighted
+            # accordingly
+            icandidate = random.randrange(idxs1.shape[0])
+            idx1 = idxs1[icandidate]
+            idx2 = idxs2[icandidate]
             child1 = np.concatenate((parent1[:idx1], parent2[idx2:]), axis=0)
             child2 = np.concatenate((parent2[:idx2], parent1[idx1:]), axis=0)  # print(child1, child2)
         return child1, child2
@@ -127,8 +190,8 @@ class GridBasedMutation(GridMixin, Mutation):
     """
     Custom class to define genetic mutation for routes
     """
-    def __init__(self, grid, prob=0.4):
-        super().__init__(grid=grid)
+    def __init__(self, grid, prob=0.4, cost_pool_size=20):
+        super().__init__(grid=grid, cost_pool_size=cost_pool_size)
         self.prob = prob
 
     def _do(self, problem, X, **kwargs):
@@ -150,12 +213,9 @@ class GridBasedMutation(GridMixin, Mutation):
         start = random.randint(1, size - 2)
         end = random.randint(start, size - 2)
 
-        _, _, start_indices = self.coords_to_index([(route[start][0], route[start][1])])
-        _, _, end_indices = self.coords_to_index([(route[end][0], route[end][1])])
+        _, _, (start_index, end_index) = self.coords_to_index([route[start], route[end]])
 
-        shuffled_cost = self.get_shuffled_cost()
-        subpath, _ = route_through_array(shuffled_cost, start_indices[0], end_indices[0],
-                                         fully_connected=True, geometric=False)
+        subpath = self.get_path(start_index, end_index)
         _, _, subpath = self.index_to_coords(subpath)
         newPath = np.concatenate((route[:start], np.array(subpath), route[end + 1:]), axis=0)
         return newPath
@@ -166,9 +226,9 @@ class MutationFactory:
         pass
 
     @staticmethod
-    def get_mutation(mutation_type, grid=None):
+    def get_mutation(mutation_type, grid=None, cost_pool_size=20):
         if mutation_type == 'grid_based':
-            mutation = GridBasedMutation(grid)
+            mutation = GridBasedMutation(grid, cost_pool_size=cost_pool_size)
         else:
             msg = f"Mutation type '{mutation_type}' is invalid!"
             logger.error(msg)
@@ -176,24 +236,38 @@ class MutationFactory:
         return mutation
 
 
-class RoutingProblem(ElementwiseProblem):
+class RoutingProblem(Problem):
     """
     Class definition of the weather routing problem
+
+    The whole population is evaluated at once: the legs of all routes are combined to a single request of the power
+    model and the waypoints of all routes are checked in a single call of ConstraintsList.safe_endpoint. The results are
+    split back per route.
+
+    The fuel consumption and the number of constrained waypoints are cached per route fingerprint (see
+    get_route_fingerprint) s.t. routes that have been evaluated in previous generations are not requested again. The
+    cache keeps the fitness_cache_size most recently requested routes.
     """
     boat: None
     constraint_list: None
     departure_time: None
+    fitness_cache: OrderedDict  # route fingerprint -> (fuel, number of constrained waypoints)
 
-    def __init__(self, departure_time, boat, constraint_list):
+    def __init__(self, departure_time, boat, constraint_list, fitness_cache_size=10000):
         super().__init__(n_var=1, n_obj=1, n_constr=1)
         self.boat = boat
         self.constraint_list = constraint_list
         self.departure_time = departure_time
+        self.fitness_cache = OrderedDict()
+        self.fitness_cache_size = fitness_cache_size
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.exclude_from_serialization = ['fitness_cache']  # not copied to the history of the algorithm
 
-    def _evaluate(self, x, out, *args, **kwargs):
+    def _evaluate(self, X, out, *args, **kwargs):
         """
         Method defined by pymoo which has to be overriden
-        :param x: numpy matrix with shape (rows: number of solutions/individuals, columns: number of design variables)
+        :param X: numpy matrix with shape (rows: number of solutions/individuals, columns: number of design variables)
         :param out:
             out['F']: function values, vector of length of number of solutions
             out['G']: constraints
@@ -201,25 +275,76 @@ class RoutingProblem(ElementwiseProblem):
         :param kwargs:
         :return:
         """
-        # logger.debug(f"RoutingProblem._evaluate: type(x)={type(x)}, x.shape={x.shape}, x={x}")
-        fuel, _ = self.get_power(x[0])
-        constraints = self.get_constraints(x[0])
-        # print(costs.shape)
-        out['F'] = np.column_stack([fuel])
-        out['G'] = np.column_stack([constraints])
-
-    def is_neg_constraints(self, lat, lon, time):
-        lat = np.array([lat])
-        lon = np.array([lon])
-        is_constrained = [False for i in range(0, lat.shape[0])]
-        is_constrained = self.constraint_list.safe_endpoint(lat, lon, time, is_constrained)
-        # print(is_constrained)
-        return 0 if not is_constrained else 1
+        # logger.debug(f"RoutingProblem._evaluate: type(X)={type(X)}, X.shape={X.shape}")
+        fitness = self.get_fitness(X[:, 0])
+        out['F'] = np.column_stack([fitness[:, 0]])
+        out['G'] = np.column_stack([fitness[:, 1]])
 
-    def get_constraints(self, route):
+    def get_fitness(self, routes):
+        """
+        Return the fuel consumption and the number of constrained waypoints per route as array of shape (n_routes, 2).
+        Only routes that are not in the fitness cache are evaluated; routes that occur several times are evaluated once.
+        """
+        fitness = np.zeros((routes.shape[0], 2))
+        missing = {}
+        for iroute, route in enumerate(routes):
+            key = get_route_fingerprint(route)
+            cached = self.fitness_cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(iroute)
+            else:
+                self.fitness_cache.move_to_end(key)
+                fitness[iroute] = cached
+                self.cache_hits += 1
+
+        if missing:
+            self.cache_misses += len(missing)
+            idxs = np.array([positions[0] for positions in missing.values()])
+            fuel, constraints = self.evaluate_routes(routes[idxs])
+            for icol, (key, positions) in enumerate(missing.items()):
+                fitness[positions] = (fuel[icol], constraints[icol])
+                self.fitness_cache[key] = fitness[positions[0]].copy()
+                if len(self.fitness_cache) > self.fitness_cache_size:
+                    self.fitness_cache.popitem(last=False)
+        return fitness
+
+    def evaluate_routes(self, routes):
+        return self.get_power_per_route(routes), self.get_constraints_per_route(routes)
+
+    def print_cache_statistics(self):
+        logger.info(form.get_log_step('Fitness cache: ' + str(self.cache_hits) + ' hits, ' + str(self.cache_misses)
+                                      + ' evaluated routes', 0))
+
+    def get_constraints_per_route(self, routes):
+        """
+        Return the number of constrained waypoints per route.
+        """
         # ToDo: what about time?
-        constraints = np.sum([self.is_neg_constraints(lat, lon, None) for lat, lon in route])
-        return constraints
+        points = np.concatenate(list(routes), axis=0)
+        is_constrained = np.zeros(points.shape[0], dtype=bool)
+        is_constrained = self.constraint_list.safe_endpoint(points[:, 0], points[:, 1], None, is_constrained)
+        n_points = np.array([route.shape[0] for route in routes])
+        return np.array([np.sum(is_constrained_route) for is_constrained_route in
+                         np.split(is_constrained, np.cumsum(n_points)[:-1])])
+
+    def get_constraints(self, route):
+        return self.get_constraints_per_route([route])[0]
+
+    def get_power_per_route(self, routes):
+        """
+        Return the fuel consumption per route. The legs of all routes are sent to the power model in a single request.
+        """
+        route_dicts = [RouteParams.get_per_waypoint_coords(route[:, 1], route[:, 0], self.departure_time,
+                                                           self.boat.boat_speed_function()) for route in routes]
+        legs = {key: np.concatenate([route_dict[key] for route_dict in route_dicts]) for key in
+                ['courses', 'start_lats', 'start_lons', 'start_times', 'travel_times']}
+
+        shipparams = self.boat.get_fuel_per_time_netCDF(legs['courses'], legs['start_lats'], legs['start_lons'],
+                                                        legs['start_times'])
+        fuel = shipparams.get_fuel()
+        fuel = (fuel / 3600) * legs['travel_times']
+        n_legs = np.array([route_dict['courses'].shape[0] for route_dict in route_dicts])
+        return np.array([np.sum(fuel_route) for fuel_route in np.split(fuel, np.cumsum(n_legs)[:-1])])
 
     def get_power(self, route):
         route_dict = RouteParams.get_per_waypoint_coords(route[:, 1], route[:, 0], self.departure_time,
@@ -232,7 +357,21 @@ class RoutingProblem(ElementwiseProblem):
         return np.sum(fuel), shipparams
 
 
-class RouteDuplicateElimination(ElementwiseDuplicateElimination):
+class RouteDuplicateElimination(DuplicateElimination):
+    """
+    Duplicate elimination based on the fingerprints of the routes (see get_route_fingerprint). The fingerprints of the
+    population are collected in a set such that every route is checked by a single lookup.
+    """
+
+    def _do(self, pop, other, is_duplicate):
+        known_routes = set()
+        if other is not None:
+            known_routes.update(get_route_fingerprint(ind.X[0]) for ind in other)
 
-    def is_equal(self, a, b):
-        return np.array_equal(a.X[0], b.X[0])
+        for i, ind in enumerate(pop):
+            key = get_route_fingerprint(ind.X[0])
+            if key in known_routes:
+                is_duplicate[i] = True
+            else:
+                known_routes.add(key)
+        return is_duplicate
@@ -5,16 +5,18 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from geovectorslib import geod
-from scipy.stats import binned_statistic
 
 import WeatherRoutingTool.utils.formatting as form
 import WeatherRoutingTool.utils.graphics as graphics
 import WeatherRoutingTool.utils.unit_conversion as units
+from WeatherRoutingTool.algorithms.data_utils import get_max_per_bin
 from WeatherRoutingTool.algorithms.routingalg import RoutingAlg
 from WeatherRoutingTool.constraints.constraints import *
 from WeatherRoutingTool.routeparams import RouteParams
 from WeatherRoutingTool.ship.ship import Boat
 from WeatherRoutingTool.ship.shipparams import ShipParams
+from WeatherRoutingTool.utils.step_buffer import (StepArray, get_step, get_step_shape, get_steps, prepend_step,
+                                                  repeat_steps, reserve_steps, take_steps)
 from WeatherRoutingTool.weather import WeatherCond
 
 logger = logging.getLogger('WRT.Isobased')
@@ -49,12 +51,14 @@ class IsoBased(RoutingAlg):
        are 0 to satisfy this definition.
    '''
 
-    lats_per_step: np.ndarray  # lats: (M,N) array, N=headings+1, M=steps (M decreasing)
-    lons_per_step: np.ndarray  # longs: (M,N) array, N=headings+1, M=steps
-    azimuth_per_step: np.ndarray  # heading
-    dist_per_step: np.ndarray  # geodesic distance traveled per time stamp:
+    # the (M,N) arrays are kept in step buffers which store the variants as tree of parent indices and are
+    # preallocated based on ISOCHRONE_MAX_ROUTING_STEPS
+    lats_per_step = StepArray()  # lats: (M,N) array, N=headings+1, M=steps (M decreasing)
+    lons_per_step = StepArray()  # longs: (M,N) array, N=headings+1, M=steps
+    azimuth_per_step = StepArray()  # heading
+    dist_per_step = StepArray()  # geodesic distance traveled per time stamp:
     shipparams_per_step: ShipParams
-    starttime_per_step: np.ndarray
+    starttime_per_step = StepArray()
 
     current_azimuth: np.ndarray  # current azimuth
     current_variant: np.ndarray  # current variant
@@ -120,6 +124,7 @@ class IsoBased(RoutingAlg):
                                   prune_gcr_centered=config.ISOCHRONE_PRUNE_GCR_CENTERED)
         self.set_variant_segments(config.ROUTER_HDGS_SEGMENTS, config.ROUTER_HDGS_INCREMENTS_DEG)
         self.set_minimisation_criterion(config.ISOCHRONE_MINIMISATION_CRITERION)
+        self.reserve_steps(self.ncount + 1, self.prune_segments * (self.variant_segments + 1))
 
         self.path_to_route_folder = config.ROUTE_PATH
 
@@ -179,18 +184,18 @@ class IsoBased(RoutingAlg):
 
     def define_variants(self):
         # branch out for multiple headings
-        nof_input_routes = self.lats_per_step.shape[1]
+        nof_input_routes = self.get_current_lats().shape[0]
 
         new_finish_one = np.repeat(self.finish_temp[0], nof_input_routes)
         new_finish_two = np.repeat(self.finish_temp[1], nof_input_routes)
 
-        new_azi = geod.inverse(self.lats_per_step[0], self.lons_per_step[0], new_finish_one, new_finish_two)
+        new_azi = geod.inverse(self.get_current_lats(), self.get_current_lons(), new_finish_one, new_finish_two)
 
-        self.lats_per_step = np.repeat(self.lats_per_step, self.variant_segments + 1, axis=1)
-        self.lons_per_step = np.repeat(self.lons_per_step, self.variant_segments + 1, axis=1)
-        self.dist_per_step = np.repeat(self.dist_per_step, self.variant_segments + 1, axis=1)
-        self.azimuth_per_step = np.repeat(self.azimuth_per_step, self.variant_segments + 1, axis=1)
-        self.starttime_per_step = np.repeat(self.starttime_per_step, self.variant_segments + 1, axis=1)
+        repeat_steps(self, 'lats_per_step', self.variant_segments + 1)
+        repeat_steps(self, 'lons_per_step', self.variant_segments + 1)
+        repeat_steps(self, 'dist_per_step', self.variant_segments + 1)
+        repeat_steps(self, 'azimuth_per_step', self.variant_segments + 1)
+        repeat_steps(self, 'starttime_per_step', self.variant_segments + 1)
 
         self.shipparams_per_step.define_variants(self.variant_segments)
 
@@ -356,8 +361,8 @@ class IsoBased(RoutingAlg):
     def find_every_route_reaching_destination(self):
         """
         This function finds routes reaching the destination in the current last step of routing.
-        First, it creates a dataframe with origin point of the current route segments.
-        The route segments are grouped according to the origin point.
+        The route segments are grouped according to their origin point, i.e. the point of departure of the current
+        routing step. The selection is done on arrays and the results are written to dataframes once.
         'dist' is the distance that could be travelled with available amount of fuel.
         'dist_dest' is the distance from origin point to the destination.
         'st_index' is storing the same index order of other nd arrays such as self.lats_per_step
@@ -365,47 +370,40 @@ class IsoBased(RoutingAlg):
         (acts as a key from the dataframe to other arrays such as self.lats_per_step )
 
         Routes from the current step reaching the destination are stored in 'current_step_routes' dataframe.
-        Only the one route segment per branch originating from the same origin point that minimize the fuel is stored
-        in current_step_routes. Routes which are not reaching the destination in the current step are stored in
-        'next_step_routes' dataframe. In this case, all routes originating from the same origin point are stored in
-        the dataframe.
+        Only the route segment per branch originating from the same origin point that minimizes the fuel is stored
+        in current_step_routes (all of them if several route segments have the same fuel consumption). Routes which are
+        not reaching the destination in the current step are stored in 'next_step_routes' dataframe. In this case, all
+        routes originating from the same origin point are stored in the dataframe.
         """
-        df_current_last_step = pd.DataFrame()
-        df_current_last_step['st_lat'] = self.lats_per_step[1, :]
-        df_current_last_step['st_lon'] = self.lons_per_step[1, :]
-        df_current_last_step['dist'] = self.current_last_step_dist
-        df_current_last_step['dist_dest'] = self.current_last_step_dist_to_dest
-        df_current_last_step['fuel'] = self.shipparams_per_step.get_fuel()[0, :]
-
-        len_df = df_current_last_step.shape[0]
-
-        df_current_last_step.set_index(pd.RangeIndex(start=0, stop=len_df), inplace=True)
-        df_current_last_step.rename_axis('st_index', inplace=True)
-        df_current_last_step = df_current_last_step.reset_index()
-        df_current_last_step.set_index(['st_lat', 'st_lon'], inplace=True, drop=False)
-        df_grouped_by_routes_has_same_origin = df_current_last_step.groupby(level=['st_lat', 'st_lon'])
-
-        unique_origins = df_grouped_by_routes_has_same_origin.groups.keys()
-
-        self.current_step_routes = pd.DataFrame()
-        self.next_step_routes = pd.DataFrame()
-
-        for unique_key in unique_origins:
-            specific_route_group = df_grouped_by_routes_has_same_origin.get_group(unique_key)
-
-            df_reaching_destination = specific_route_group[
-                specific_route_group['dist'] >= specific_route_group['dist_dest']
-            ]
-            num_rows = df_reaching_destination.shape[0]
-
-            if num_rows > 0:
-                min_fuel = df_reaching_destination['fuel'].min()
-                rows_min_fuel = df_reaching_destination[df_reaching_destination['fuel'] == min_fuel]
-                # Make sure we keep only one route (ToDo: which one do we want to keep?)
-                row_min_fuel = rows_min_fuel.drop_duplicates('fuel')
-                self.current_step_routes = pd.concat([self.current_step_routes, row_min_fuel], ignore_index=True)
-            else:
-                self.next_step_routes = pd.concat([self.next_step_routes, specific_route_group], ignore_index=True)
+        st_lat = get_step(self, 'lats_per_step', 1)
+        st_lon = get_step(self, 'lons_per_step', 1)
+        dist = np.asarray(self.current_last_step_dist)
+        dist_dest = np.asarray(self.current_last_step_dist_to_dest)
+        fuel = get_step(self.shipparams_per_step, 'fuel', 0)
+
+        # group route segments by origin point (groups sorted by st_lat, st_lon)
+        unique_origins, group = np.unique(np.column_stack((st_lat, st_lon)), axis=0, return_inverse=True)
+        group = group.ravel()
+        is_reaching = dist >= dist_dest
+        group_is_reaching = np.bincount(group, weights=is_reaching, minlength=unique_origins.shape[0]) > 0
+
+        # per group, select the route segments reaching the destination with minimal fuel
+        idxs_reaching = np.flatnonzero(is_reaching & ~np.isnan(fuel))
+        min_fuel = np.full(unique_origins.shape[0], np.inf)
+        np.minimum.at(min_fuel, group[idxs_reaching], fuel[idxs_reaching])
+        idxs_current = idxs_reaching[fuel[idxs_reaching] == min_fuel[group[idxs_reaching]]]
+        idxs_current = idxs_current[np.argsort(group[idxs_current], kind='stable')]
+
+        # keep all route segments of groups of which none reaches the destination
+        idxs_next = np.flatnonzero(~group_is_reaching[group])
+        idxs_next = idxs_next[np.argsort(group[idxs_next], kind='stable')]
+
+        self.current_step_routes = pd.DataFrame({'st_index': idxs_current, 'st_lat': st_lat[idxs_current],
+                                                 'st_lon': st_lon[idxs_current], 'dist': dist[idxs_current],
+                                                 'dist_dest': dist_dest[idxs_current], 'fuel': fuel[idxs_current]})
+        self.next_step_routes = pd.DataFrame({'st_index': idxs_next, 'st_lat': st_lat[idxs_next],
+                                              'st_lon': st_lon[idxs_next], 'dist': dist[idxs_next],
+                                              'dist_dest': dist_dest[idxs_next], 'fuel': fuel[idxs_next]})
 
     def find_routes_reaching_destination_in_current_step(self, remaining_routes=0):
         """
@@ -431,13 +429,13 @@ class IsoBased(RoutingAlg):
         # ToDo: very similar to IsoFuel.final_pruning -> harmonize
 
         try:
-            lats_per_step = self.lats_per_step[:, idxs]
-            lons_per_step = self.lons_per_step[:, idxs]
-            azimuth_per_step = self.azimuth_per_step[:, idxs]
-            dist_per_step = self.dist_per_step[:, idxs]
+            lats_per_step = get_steps(self, 'lats_per_step', idxs)
+            lons_per_step = get_steps(self, 'lons_per_step', idxs)
+            azimuth_per_step = get_steps(self, 'azimuth_per_step', idxs)
+            dist_per_step = get_steps(self, 'dist_per_step', idxs)
             shipparams_per_step = self.shipparams_per_step.get_reduced_2D_object(idxs)
 
-            starttime_per_step = self.starttime_per_step[:, idxs]
+            starttime_per_step = get_steps(self, 'starttime_per_step', idxs)
             time = self.time[idxs]
 
             lats_per_step = np.flip(lats_per_step, 0)
@@ -471,8 +469,8 @@ class IsoBased(RoutingAlg):
         fig, ax = graphics.generate_basemap(self.fig, self.depth, self.start,
                                             self.finish)
 
-        lats_per_step = self.lats_per_step[:, idxs]
-        lons_per_step = self.lons_per_step[:, idxs]
+        lats_per_step = get_steps(self, 'lats_per_step', idxs)
+        lons_per_step = get_steps(self, 'lons_per_step', idxs)
 
         route, = ax.plot(lons_per_step,
                          lats_per_step, color="firebrick")
@@ -499,13 +497,13 @@ class IsoBased(RoutingAlg):
         idxs = self.next_step_routes['st_index']
         # Return a trimmed isochrone
         try:
-            self.lats_per_step = self.lats_per_step[:, idxs]
-            self.lons_per_step = self.lons_per_step[:, idxs]
-            self.azimuth_per_step = self.azimuth_per_step[:, idxs]
-            self.dist_per_step = self.dist_per_step[:, idxs]
+            take_steps(self, 'lats_per_step', idxs)
+            take_steps(self, 'lons_per_step', idxs)
+            take_steps(self, 'azimuth_per_step', idxs)
+            take_steps(self, 'dist_per_step', idxs)
             self.shipparams_per_step.select(idxs)
 
-            self.starttime_per_step = self.starttime_per_step[:, idxs]
+            take_steps(self, 'starttime_per_step', idxs)
 
             self.current_azimuth = self.current_variant[idxs]
             self.current_variant = self.current_variant[idxs]
@@ -517,38 +515,38 @@ class IsoBased(RoutingAlg):
             raise Exception('Pruned indices running out of bounds.')
 
     def update_shipparams(self, ship_params_single_step):
-        new_rpm = np.vstack((ship_params_single_step.get_rpm(), self.shipparams_per_step.get_rpm()))
-        new_power = np.vstack((ship_params_single_step.get_power(), self.shipparams_per_step.get_power()))
-        new_speed = np.vstack((ship_params_single_step.get_speed(), self.shipparams_per_step.get_speed()))
-        new_rwind = np.vstack((ship_params_single_step.get_rwind(), self.shipparams_per_step.get_rwind()))
-        new_rcalm = np.vstack((ship_params_single_step.get_rcalm(), self.shipparams_per_step.get_rcalm()))
-        new_rwaves = np.vstack((ship_params_single_step.get_rwaves(), self.shipparams_per_step.get_rwaves()))
-        new_rshallow = np.vstack((ship_params_single_step.get_rshallow(), self.shipparams_per_step.get_rshallow()))
-        new_rroughness = np.vstack(
-            (ship_params_single_step.get_rroughness(), self.shipparams_per_step.get_rroughness()))
-
-        self.shipparams_per_step.set_rpm(new_rpm)
-        self.shipparams_per_step.set_power(new_power)
-        self.shipparams_per_step.set_speed(new_speed)
-        self.shipparams_per_step.set_rwind(new_rwind)
-        self.shipparams_per_step.set_rcalm(new_rcalm)
-        self.shipparams_per_step.set_rwaves(new_rwaves)
-        self.shipparams_per_step.set_rshallow(new_rshallow)
-        self.shipparams_per_step.set_rroughness(new_rroughness)
+        prepend_step(self.shipparams_per_step, 'rpm', ship_params_single_step.get_rpm())
+        prepend_step(self.shipparams_per_step, 'power', ship_params_single_step.get_power())
+        prepend_step(self.shipparams_per_step, 'speed', ship_params_single_step.get_speed())
+        prepend_step(self.shipparams_per_step, 'r_wind', ship_params_single_step.get_rwind())
+        prepend_step(self.shipparams_per_step, 'r_calm', ship_params_single_step.get_rcalm())
+        prepend_step(self.shipparams_per_step, 'r_waves', ship_params_single_step.get_rwaves())
+        prepend_step(self.shipparams_per_step, 'r_shallow', ship_params_single_step.get_rshallow())
+        prepend_step(self.shipparams_per_step, 'r_roughness', ship_params_single_step.get_rroughness())
+
+    def reserve_steps(self, nsteps, nvariants):
+        reserve_steps(self, 'lats_per_step', nsteps, nvariants)
+        reserve_steps(self, 'lons_per_step', nsteps, nvariants)
+        reserve_steps(self, 'azimuth_per_step', nsteps, nvariants)
+        reserve_steps(self, 'dist_per_step', nsteps, nvariants)
+        reserve_steps(self, 'starttime_per_step', nsteps, nvariants)
+        self.shipparams_per_step.reserve_steps(nsteps, nvariants)
 
     def check_variant_def(self):
-        if (not ((self.lats_per_step.shape[1] == self.lons_per_step.shape[1]) and (
-                self.lats_per_step.shape[1] == self.azimuth_per_step.shape[1]) and (
-                         self.lats_per_step.shape[1] == self.dist_per_step.shape[1]))):
+        lats_shape = get_step_shape(self, 'lats_per_step')
+        lons_shape = get_step_shape(self, 'lons_per_step')
+        azimuth_shape = get_step_shape(self, 'azimuth_per_step')
+        dist_shape = get_step_shape(self, 'dist_per_step')
+
+        if (not ((lats_shape[1] == lons_shape[1]) and (lats_shape[1] == azimuth_shape[1]) and (
+                lats_shape[1] == dist_shape[1]))):
             raise 'define_variants: number of columns not matching!'
 
-        if (not ((self.lats_per_step.shape[0] == self.lons_per_step.shape[0]) and (
-                self.lats_per_step.shape[0] == self.azimuth_per_step.shape[0]) and (
-                         self.lats_per_step.shape[0] == self.dist_per_step.shape[0]) and (
-                         self.lats_per_step.shape[0] == (self.count + 1)))):
+        if (not ((lats_shape[0] == lons_shape[0]) and (lats_shape[0] == azimuth_shape[0]) and (
+                lats_shape[0] == dist_shape[0]) and (lats_shape[0] == (self.count + 1)))):
             raise ValueError(
                 'define_variants: number of rows not matching! count = ' + str(self.count) + ' lats per step ' + str(
-                    self.lats_per_step.shape[0]))
+                    lats_shape[0]))
 
     def pruning(self, trim, bins, larger_direction_based=True):
         debug = False
@@ -560,31 +558,20 @@ class IsoBased(RoutingAlg):
             print('current courses', self.current_variant)
             print('full_dist_traveled', self.full_time_traveled)
 
-        idxs = []
-
-        bin_stat = None
-        bin_edges = None
-        bin_number = None
         if larger_direction_based:
-            bin_stat, bin_edges, bin_number = self.larger_direction_based_pruning(bins)
+            bin_max, bin_argmax, bin_number = self.larger_direction_based_pruning(bins)
         else:
-            bin_stat, bin_edges, bin_number = self.courses_based_pruning(bins)
+            bin_max, bin_argmax, bin_number = self.courses_based_pruning(bins)
 
         if trim:
-            for i in range(len(bin_edges) - 1):
-                try:
-                    if (bin_stat[i] == 0):
-                        # form.print_step('Pruning: sector ' + str(i) + 'is null (binstat[i])=' + str(bin_stat[i]) +
-                        # 'full_dist_traveled=' + str(self.full_dist_traveled))
-                        continue
-                    idxs.append(np.where(self.full_dist_traveled == bin_stat[i])[0][0])
-                except IndexError:
-                    pass
-            idxs = list(set(idxs))
+            # keep the route with maximal full_dist_traveled per bin, skip empty bins and bins with only constrained
+            # routes
+            idxs = bin_argmax[(bin_argmax >= 0) & (bin_max != 0)]
         else:
-            for i in range(len(bin_edges) - 1):
-                idxs.append(np.where(self.full_dist_traveled == bin_stat[i])[0])
-            idxs = list(set([item for subl in idxs for item in subl]))
+            # keep all routes with maximal full_dist_traveled per bin
+            is_max = (bin_number >= 0) & (self.full_dist_traveled == bin_max[bin_number])
+            idxs = np.flatnonzero(is_max)
+        idxs = np.unique(idxs)
 
         # ToDo: use logger.debug and args.debug
         if debug:
@@ -601,13 +588,13 @@ class IsoBased(RoutingAlg):
 
         # Return a trimmed isochrone
         try:
-            self.lats_per_step = self.lats_per_step[:, idxs]
-            self.lons_per_step = self.lons_per_step[:, idxs]
-            self.azimuth_per_step = self.azimuth_per_step[:, idxs]
-            self.dist_per_step = self.dist_per_step[:, idxs]
+            take_steps(self, 'lats_per_step', idxs)
+            take_steps(self, 'lons_per_step', idxs)
+            take_steps(self, 'azimuth_per_step', idxs)
+            take_steps(self, 'dist_per_step', idxs)
             self.shipparams_per_step.select(idxs)
 
-            self.starttime_per_step = self.starttime_per_step[:, idxs]
+            take_steps(self, 'starttime_per_step', idxs)
 
             self.current_azimuth = self.current_variant[idxs]
             self.current_variant = self.current_variant[idxs]
@@ -619,18 +606,14 @@ class IsoBased(RoutingAlg):
             raise Exception('Pruned indices running out of bounds.')
 
     def courses_based_pruning(self, bins):
-        bin_stat, bin_edges, bin_number = binned_statistic(self.current_variant, self.full_dist_traveled,
-                                                           statistic=np.nanmax, bins=bins)
-        return bin_stat, bin_edges, bin_number
+        return get_max_per_bin(self.current_variant, self.full_dist_traveled, bins)
 
     def larger_direction_based_pruning(self, bins):
-        start_lats = np.repeat(self.start_temp[0], self.lats_per_step.shape[1])
-        start_lons = np.repeat(self.start_temp[1], self.lons_per_step.shape[1])
-        larger_direction = geod.inverse(start_lats, start_lons, self.lats_per_step[0], self.lons_per_step[0])
+        start_lats = np.repeat(self.start_temp[0], self.get_current_lats().shape[0])
+        start_lons = np.repeat(self.start_temp[1], self.get_current_lons().shape[0])
+        larger_direction = geod.inverse(start_lats, start_lons, self.get_current_lats(), self.get_current_lons())
         larger_direction = larger_direction['azi1']
-        bin_stat, bin_edges, bin_number = binned_statistic(larger_direction, self.full_dist_traveled,
-                                                           statistic=np.nanmax, bins=bins)
-        return bin_stat, bin_edges, bin_number
+        return get_max_per_bin(larger_direction, self.full_dist_traveled, bins)
 
     def pruning_per_step(self, trim=True):
         if self.prune_gcr_centered:
@@ -656,9 +639,10 @@ class IsoBased(RoutingAlg):
         # of the azimuth defined by the distance between the start point and the destination for the mean distance
         # travelled
         # during the current routing step.
-        start_lats = np.repeat(self.start_temp[0], self.lats_per_step.shape[1])
-        start_lons = np.repeat(self.start_temp[1], self.lons_per_step.shape[1])
-        full_travel_dist = geod.inverse(start_lats, start_lons, self.lats_per_step[0], self.lons_per_step[1])
+        start_lats = np.repeat(self.start_temp[0], self.get_current_lats().shape[0])
+        start_lons = np.repeat(self.start_temp[1], self.get_current_lons().shape[0])
+        full_travel_dist = geod.inverse(start_lats, start_lons, self.get_current_lats(),
+                                        get_step(self, 'lons_per_step', 1))
         mean_dist = np.mean(full_travel_dist['s12'])
         gcr_point = geod.direct([self.start_temp[0]], [self.start_temp[1]], self.gcr_azi_temp, mean_dist)
 
@@ -698,11 +682,11 @@ class IsoBased(RoutingAlg):
             print('Pruning... Pruning symmetry axis defined by median of considered headings.')
 
         # propagate current end points towards temporary destination
-        nof_input_routes = self.lats_per_step.shape[1]
+        nof_input_routes = self.get_current_lats().shape[0]
         new_finish_one = np.repeat(self.finish_temp[0], nof_input_routes)
         new_finish_two = np.repeat(self.finish_temp[1], nof_input_routes)
 
-        new_azi = geod.inverse(self.lats_per_step[0], self.lons_per_step[0], new_finish_one, new_finish_two)
+        new_azi = geod.inverse(self.get_current_lats(), self.get_current_lons(), new_finish_one, new_finish_two)
 
         # sort azimuths and select (approximate) median
         new_azi_sorted = np.sort(new_azi['azi1'])
@@ -774,10 +758,10 @@ class IsoBased(RoutingAlg):
         return self.current_variant
 
     def get_current_lats(self):
-        return self.lats_per_step[0, :]
+        return get_step(self, 'lats_per_step', 0)
 
     def get_current_lons(self):
-        return self.lons_per_step[0, :]
+        return get_step(self, 'lons_per_step', 0)
 
     def get_current_speed(self):
         return self.speed_per_step[0]
@@ -881,10 +865,10 @@ class IsoBased(RoutingAlg):
     def check_constraints(self, move, constraint_list):
         debug = False
 
-        is_constrained = [False for i in range(0, self.lats_per_step.shape[1])]
+        is_constrained = [False for i in range(0, self.get_current_lats().shape[0])]
         if (debug):
             form.print_step('shape is_constraint before checking:' + str(len(is_constrained)), 1)
-        is_constrained = constraint_list.safe_crossing(self.lats_per_step[0], self.lons_per_step[0], move['lat2'],
+        is_constrained = constraint_list.safe_crossing(self.get_current_lats(), self.get_current_lons(), move['lat2'],
                                                        move['lon2'], self.time, is_constrained)
         if (debug):
             form.print_step('is_constrained after checking' + str(is_constrained), 1)
@@ -892,10 +876,10 @@ class IsoBased(RoutingAlg):
 
     def update_position(self, move, is_constrained, dist):
         debug = False
-        self.lats_per_step = np.vstack((move['lat2'], self.lats_per_step))
-        self.lons_per_step = np.vstack((move['lon2'], self.lons_per_step))
-        self.dist_per_step = np.vstack((dist, self.dist_per_step))
-        self.azimuth_per_step = np.vstack((self.current_variant, self.azimuth_per_step))
+        prepend_step(self, 'lats_per_step', move['lat2'])
+        prepend_step(self, 'lons_per_step', move['lon2'])
+        prepend_step(self, 'dist_per_step', dist)
+        prepend_step(self, 'azimuth_per_step', self.current_variant)
 
         # ToDo: use logger.debug and args.debug
         if debug:
@@ -905,11 +889,12 @@ class IsoBased(RoutingAlg):
             print('dist_per_step', self.dist_per_step)
             print('dist', dist)
 
-        start_lats = np.repeat(self.start_temp[0], self.lats_per_step.shape[1])
-        start_lons = np.repeat(self.start_temp[1], self.lons_per_step.shape[1])
+        nof_routes = move['lat2'].shape[0]
+        start_lats = np.repeat(self.start_temp[0], nof_routes)
+        start_lons = np.repeat(self.start_temp[1], nof_routes)
         travel_dist = geod.inverse(start_lats, start_lons, move['lat2'], move['lon2'])  # calculate full distance
-        end_lats = np.repeat(self.finish_temp[0], self.lats_per_step.shape[1])
-        end_lons = np.repeat(self.finish_temp[1], self.lons_per_step.shape[1])
+        end_lats = np.repeat(self.finish_temp[0], nof_routes)
+        end_lons = np.repeat(self.finish_temp[1], nof_routes)
         dist_to_dest = geod.inverse(move['lat2'], move['lon2'], end_lats, end_lons)  # calculate full distance
 
         # traveled, azimuth of gcr connecting start and new position
@@ -918,9 +903,6 @@ class IsoBased(RoutingAlg):
         # gcrs['s12'][is_constrained] = 0
         travel_dist['s12'][is_constrained] = 0
 
-        concatenated_distance = np.sum(self.dist_per_step, axis=0)
-        concatenated_distance[is_constrained] = 0
-
         if np.all(dist_to_dest['s12']) > 0:
             if self.minimisation_criterion == 'squareddist_over_disttodest':
                 self.full_dist_traveled = travel_dist['s12'] * travel_dist['s12'] / dist_to_dest['s12']
@@ -933,7 +915,7 @@ class IsoBased(RoutingAlg):
             print('full_dist_traveled:', self.full_dist_traveled)
 
     def update_fuel(self, delta_fuel):
-        self.shipparams_per_step.set_fuel(np.vstack((delta_fuel, self.shipparams_per_step.get_fuel())))
+        prepend_step(self.shipparams_per_step, 'fuel', delta_fuel)
         for i in range(0, self.full_fuel_consumed.shape[0]):
             self.full_fuel_consumed[i] += delta_fuel[i]
 
@@ -1027,8 +1009,8 @@ class IsoBased(RoutingAlg):
         logger.info(self.finish_temp)
 
     def check_destination(self):
-        destination_lats = self.lats_per_step[0]
-        destination_lons = self.lons_per_step[0]
+        destination_lats = self.get_current_lats()
+        destination_lons = self.get_current_lons()
 
         arrived_at_destination = (destination_lats == self.finish[0]) & (destination_lons == self.finish[1])
         if not arrived_at_destination:
@@ -7,6 +7,7 @@ import numpy as np
 import WeatherRoutingTool.utils.formatting as form
 from WeatherRoutingTool.algorithms.isobased import IsoBased
 from WeatherRoutingTool.routeparams import RouteParams
+from WeatherRoutingTool.utils.step_buffer import get_steps, prepend_step
 
 logger = logging.getLogger('WRT.routingalg')
 
@@ -85,7 +86,7 @@ class IsoFuel(IsoBased):
         for i in range(0, self.full_time_traveled.shape[0]):
             self.full_time_traveled[i] += delta_time[i]
             self.time[i] += dt.timedelta(seconds=delta_time[i])
-        self.starttime_per_step = np.vstack((self.time, self.starttime_per_step))
+        prepend_step(self, 'starttime_per_step', self.time)
 
     def final_pruning(self):
         # ToDo: use logger.debug and args.debug
@@ -101,11 +102,11 @@ class IsoFuel(IsoBased):
 
         # Return a trimmed isochrone
         try:
-            self.lats_per_step = self.lats_per_step[:, idxs]
-            self.lons_per_step = self.lons_per_step[:, idxs]
-            self.azimuth_per_step = self.azimuth_per_step[:, idxs]
-            self.dist_per_step = self.dist_per_step[:, idxs]
-            self.starttime_per_step = self.starttime_per_step[:, idxs]
+            self.lats_per_step = get_steps(self, 'lats_per_step', idxs)
+            self.lons_per_step = get_steps(self, 'lons_per_step', idxs)
+            self.azimuth_per_step = get_steps(self, 'azimuth_per_step', idxs)
+            self.dist_per_step = get_steps(self, 'dist_per_step', idxs)
+            self.starttime_per_step = get_steps(self, 'starttime_per_step', idxs)
             self.shipparams_per_step.select(idxs)
 
             self.current_azimuth = self.current_variant[idxs]
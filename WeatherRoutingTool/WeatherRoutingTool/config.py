@@ -17,10 +17,26 @@ RECOMMENDED_CONFIG_VARIABLES = {
 # optional variables with default values
 OPTIONAL_CONFIG_VARIABLES = {
     'ALGORITHM_TYPE': 'isofuel',
+    'BOAT_N_WORKERS': 1,
+    'BOAT_POWER_CACHE': False,
+    'BOAT_POWER_CACHE_DIR': None,
+    'BOAT_POWER_CACHE_SIZE': 100000,
+    'BOAT_POWER_CACHE_TOLERANCES': None,
+    'BOAT_SINGLE_COURSE_REQUESTS': False,
+    'BOAT_SURROGATE_TABLE': None,
+    'BOAT_TYPE': 'tanker',
+    'CONSTRAINTS_LAND_POLYGONS_TOLERANCE': 0,
+    'CONSTRAINTS_LAYER_CACHE_DIR': None,
     'CONSTRAINTS_LIST': ['land_crossing_global_land_mask', 'water_depth'],
+    'CONSTRAINTS_RASTER_CACHE_DIR': None,
+    'CONSTRAINTS_RASTER_RESOLUTION': None,
     'DELTA_FUEL': 3000,
     'DELTA_TIME_FORECAST': 3,
+    'GENETIC_COST_POOL_SIZE': 20,
+    'GENETIC_HISTORY_LOG': None,
+    'GENETIC_HISTORY_ROUTES': 20,
     'GENETIC_MUTATION_TYPE': 'grid_based',
+    'GENETIC_N_WORKERS': 1,
     'GENETIC_NUMBER_GENERATIONS': 20,
     'GENETIC_NUMBER_OFFSPRINGS': 2,
     'GENETIC_POPULATION_SIZE': 20,
@@ -50,8 +66,20 @@ class Config:
         self.ALGORITHM_TYPE = None  # options: 'isofuel'
         self.BOAT_DRAUGHT = None  # in m
         self.BOAT_SPEED = None  # in m/s
-        self.CONSTRAINTS_LIST = None  # options: 'land_crossing_global_land_mask', 'land_crossing_polygons', 'seamarks',
-        # 'water_depth', 'on_map', 'via_waypoints'
+        self.BOAT_N_WORKERS = None  # number of worker processes for power requests
+        self.BOAT_POWER_CACHE = None  # cache ship parameters for quantised states (True/False)
+        self.BOAT_POWER_CACHE_DIR = None  # directory for the on-disk tier of the power cache
+        self.BOAT_POWER_CACHE_SIZE = None  # maximum number of states kept in memory by the power cache
+        self.BOAT_POWER_CACHE_TOLERANCES = None  # quantisation of 'position', 'course', 'time' and 'speed'
+        self.BOAT_SINGLE_COURSE_REQUESTS = None  # send one request to mariPower per course (True/False)
+        self.BOAT_SURROGATE_TABLE = None  # path to surrogate table for BOAT_TYPE 'surrogate'
+        self.BOAT_TYPE = None  # options: 'tanker', 'tanker_in_memory', 'surrogate'
+        self.CONSTRAINTS_LAND_POLYGONS_TOLERANCE = None  # simplification tolerance of the exact land crossing (degrees)
+        self.CONSTRAINTS_LAYER_CACHE_DIR = None  # local copy of the seamark and land polygon layers of the database
+        self.CONSTRAINTS_LIST = None  # options: 'land_crossing_global_land_mask', 'land_crossing_polygons',
+        # 'land_crossing_polygons_exact', 'seamarks', 'water_depth', 'on_map', 'via_waypoints'
+        self.CONSTRAINTS_RASTER_CACHE_DIR = None  # directory for cached constraint rasters
+        self.CONSTRAINTS_RASTER_RESOLUTION = None  # cell size of the constraint raster (degrees), None: no raster
         self.COURSES_FILE = None  # path to file that acts as intermediate storage for courses per routing step
         self.DATA_MODE = None  # options: 'automatic', 'from_file', 'odc'
         self.DEFAULT_MAP = None  # bbox in which route optimization is performed (lat_min, lon_min, lat_max, lon_max)
@@ -60,7 +88,11 @@ class Config:
         self.DELTA_TIME_FORECAST = None  # time resolution of weather forecast (hours)
         self.DEPARTURE_TIME = None  # start time of travelling, format: 'yyyy-mm-ddThh:mmZ'
         self.DEPTH_DATA = None  # path to depth data
+        self.GENETIC_COST_POOL_SIZE = None  # number of shuffled cost fields for initial population and mutation
+        self.GENETIC_HISTORY_LOG = None  # json lines file to which the history of the genetic algorithm is streamed
+        self.GENETIC_HISTORY_ROUTES = None  # number of routes per generation stored for the population plots
         self.GENETIC_MUTATION_TYPE = None  # type for mutation (options: 'grid_based')
+        self.GENETIC_N_WORKERS = None  # number of worker processes for the evaluation of the population
         self.GENETIC_NUMBER_GENERATIONS = None  # number of generations for genetic algorithm
         self.GENETIC_NUMBER_OFFSPRINGS = None  # number of offsprings for genetic algorithm
         self.GENETIC_POPULATION_SIZE = None  # population size for genetic algorithm
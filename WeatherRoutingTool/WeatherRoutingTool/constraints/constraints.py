@@ -1,4 +1,7 @@
+import hashlib
 import logging
+from functools import lru_cache
+from importlib.metadata import version
 
 import cartopy.crs as ccrs
 import cartopy.feature as cf
@@ -7,12 +10,16 @@ import matplotlib.pyplot as plt
 import numpy as np
 import xarray as xr
 from global_land_mask import globe
+from scipy.ndimage import distance_transform_edt
 import ast
 
 from maridatadownloader import DownloaderFactory
 import WeatherRoutingTool.utils.graphics as graphics
 import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.constraints.layer_cache import ConstraintLayerCache
 from WeatherRoutingTool.routeparams import RouteParams
+from WeatherRoutingTool.utils.field_sampler import FieldSampler
+from WeatherRoutingTool.utils.file_utils import get_file_identity
 from WeatherRoutingTool.utils.maps import Map
 from WeatherRoutingTool.weather import WeatherCond
 
@@ -21,6 +28,7 @@ import os
 import sqlalchemy as db
 import pandas as pd
 import geopandas as gpd
+import shapely
 from shapely.geometry import Point, LineString, box
 from shapely.strtree import STRtree
 
@@ -54,6 +62,54 @@ logger = logging.getLogger("WRT.Constraints")
 #           between starting point and destination;
 #           alternatively it can also be checked for a single point whether a constraint is hit via
 #           ConstraintList.safe_endpoint(lat, lon, time)
+#
+# Time-independent discrete constraints that provide get_raster_id() (LandCrossing, WaterDepth, StayOnMap) can be
+# combined to a RasterisedConstraints object which evaluates them once on a raster covering the map.
+#
+# Negative constraints are evaluated from the cheapest to the most expensive one (see Constraint.cost). Pointwise
+# constraints are only evaluated for the candidates that have not been rejected by a cheaper constraint. The name of
+# the first constraint that rejects a candidate is stored in ConstraintsList.rejected_by.
+
+
+def get_angular_distance(lat_start, lon_start, lat_end, lon_end):
+    """
+    Return the great circle distance between start and end points as central angle (degrees).
+    """
+    lat_start, lon_start, lat_end, lon_end = [np.radians(np.asarray(x, dtype=float)) for x in
+                                              (lat_start, lon_start, lat_end, lon_end)]
+    hav = np.sin((lat_end - lat_start) / 2) ** 2 + np.cos(lat_start) * np.cos(lat_end) * np.sin(
+        (lon_end - lon_start) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.sqrt(np.clip(hav, 0, 1))))
+
+
+def get_great_circle_points(lat_start, lon_start, lat_end, lon_end, fractions):
+    """
+    Return latitudes and longitudes of the points on the great circles from the start points to the end points at
+    the given fractions of the distance. fractions needs to broadcast against the start and end points, e.g. arrays of
+    shape (n_points, n_legs) for n_legs start and end points.
+    """
+    def to_cartesian(lat, lon):
+        lat = np.radians(np.asarray(lat, dtype=float))
+        lon = np.radians(np.asarray(lon, dtype=float))
+        return np.array([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    fractions = np.asarray(fractions, dtype=float)
+    vec_start = to_cartesian(lat_start, lon_start)
+    vec_end = to_cartesian(lat_end, lon_end)
+    omega = np.radians(get_angular_distance(lat_start, lon_start, lat_end, lon_end))
+    sin_omega = np.sin(omega)
+
+    # spherical linear interpolation, linear interpolation for (almost) identical start and end points
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight_start = np.where(sin_omega > 1e-12, np.sin((1 - fractions) * omega) / sin_omega, 1 - fractions)
+        weight_end = np.where(sin_omega > 1e-12, np.sin(fractions * omega) / sin_omega, fractions)
+    vec = weight_start * vec_start[:, np.newaxis] + weight_end * vec_end[:, np.newaxis]
+
+    lats = np.degrees(np.arctan2(vec[2], np.hypot(vec[0], vec[1])))
+    lons = np.degrees(np.arctan2(vec[1], vec[0]))
+    lats = np.where(fractions == 1, np.asarray(lat_end, dtype=float), lats)
+    lons = np.where(fractions == 1, np.asarray(lon_end, dtype=float), lons)
+    return lats, lons
 
 
 class Constraint:
@@ -62,6 +118,8 @@ class Constraint:
     lat: np.ndarray
     lon: np.ndarray
     time: np.ndarray
+    cost = 10  # relative cost of the evaluation per candidate, cheaper constraints are evaluated first
+    pointwise = True  # result for a candidate only depends on its own coordinates
 
     # resource_type: int
 
@@ -124,28 +182,46 @@ class NegativeContraint(Constraint):
 
 class NegativeConstraintFromWeather(NegativeContraint):
     wt: WeatherCond
+    weather_variable: str  # name of the variable of the weather dataset that is checked
+    pointwise = False  # the weather is provided per candidate by check_weather
 
     def __init__(self, name, weather):
         NegativeContraint.__init__(self, name)
         self.wt = weather
 
     def check_weather(self, lat, lon, time):
-        pass
+        """
+        Return the values of weather_variable at all points (lat, lon, time), sampled in a single request via the
+        FieldSampler of the weather.
+        """
+        if time is not None and np.ndim(time) > 0:
+            time = np.asarray(time, dtype='datetime64[ns]')
+        elif time is not None:
+            time = np.datetime64(time, 'ns')
+        return self.wt.get_weather_at_points(np.asarray(lat, dtype=float), np.asarray(lon, dtype=float), time,
+                                             [self.weather_variable])[self.weather_variable]
 
 
 class ConstraintPars:
-    resolution: int
+    resolution: int  # inverse of the minimum number of samples per routing segment
+    sample_distance: float  # maximum distance between samples (degrees), None: resolution of the constraint data
+    max_samples: int  # maximum number of samples per routing segment
+    use_clearance: bool  # skip sampling of segments far away from rasterised constraints
     bCheckEndPoints: bool
     bCheckCrossing: bool
 
     def __init__(self):
         self.resolution = 1.0 / 20
+        self.sample_distance = None
+        self.max_samples = 2000
+        self.use_clearance = True
         self.bCheckEndPoints = True
         self.bCheckCrossing = True
 
     def print(self):
         logger.info("Print settings of Constraint Pars:")
         logger.info(form.get_log_step("resolution=" + str(self.resolution), 1))
+        logger.info(form.get_log_step("sample_distance=" + str(self.sample_distance), 1))
         logger.info(form.get_log_step("bCheckEndPoints=" + str(self.bCheckEndPoints), 1))
 
 
@@ -164,11 +240,16 @@ class ConstraintsListFactory:
 
         if 'land_crossing_polygons' in constraints_string_list:
             map_size = kwargs.get('map_size')
-            land_crossing_polygons = LandPolygonsCrossing(map_size)
-            constraints_list.add_neg_constraint(land_crossing_polygons)
+            land_crossing_polygons = LandPolygonsCrossing(map_size, kwargs.get('layer_cache_dir'))
+            constraints_list.add_neg_constraint(land_crossing_polygons, 'continuous')
+
+        if 'land_crossing_polygons_exact' in constraints_string_list:
+            land_crossing_exact = LandPolygonsIntersection(kwargs.get('map_size'), kwargs.get('layer_cache_dir'),
+                                                           kwargs.get('land_polygons_tolerance', 0))
+            constraints_list.add_neg_constraint(land_crossing_exact, 'continuous')
 
         if 'seamarks' in constraints_string_list:
-            seamarks = SeamarkCrossing()
+            seamarks = SeamarkCrossing(kwargs.get('map_size'), kwargs.get('layer_cache_dir'))
             constraints_list.add_neg_constraint(seamarks, 'continuous')
 
         if 'water_depth' in constraints_string_list:
@@ -192,6 +273,13 @@ class ConstraintsListFactory:
             on_map.set_map(map_size.lat1, map_size.lon1, map_size.lat2, map_size.lon2)
             constraints_list.add_neg_constraint(on_map)
 
+        raster_resolution = kwargs.get('raster_resolution')
+        if raster_resolution is not None:
+            if 'map_size' not in kwargs:
+                raise ValueError('To rasterise the constraints, you need to provide the map size.')
+            constraints_list.rasterise_constraints(kwargs.get('map_size'), raster_resolution,
+                                                   kwargs.get('raster_cache_dir'))
+
         if 'via_waypoints' in constraints_string_list:
             if 'waypoints' not in kwargs:
                 raise ValueError('To use the waypoints constraint module, you need to provide the waypoints.')
@@ -203,6 +291,16 @@ class ConstraintsListFactory:
         constraints_list.print_settings()
         return constraints_list
 
+    @classmethod
+    def get_constraints_list_from_config(cls, config):
+        lat1, lon1, lat2, lon2 = config.DEFAULT_MAP
+        return cls.get_constraints_list(
+            constraints_string_list=config.CONSTRAINTS_LIST, data_mode=config.DATA_MODE,
+            boat_draught=config.BOAT_DRAUGHT, map_size=Map(lat1, lon1, lat2, lon2), depthfile=config.DEPTH_DATA,
+            waypoints=config.INTERMEDIATE_WAYPOINTS, raster_resolution=config.CONSTRAINTS_RASTER_RESOLUTION,
+            raster_cache_dir=config.CONSTRAINTS_RASTER_CACHE_DIR, layer_cache_dir=config.CONSTRAINTS_LAYER_CACHE_DIR,
+            land_polygons_tolerance=config.CONSTRAINTS_LAND_POLYGONS_TOLERANCE)
+
 
 class ConstraintsList:
     pars: ConstraintPars
@@ -217,6 +315,7 @@ class ConstraintsList:
     current_positive: int
 
     constraints_crossed: list
+    rejected_by: np.ndarray  # name of the first constraint that rejected a candidate of the last check, else None
     weather: WeatherCond
 
     def __init__(self, pars):
@@ -225,6 +324,7 @@ class ConstraintsList:
         self.negative_constraints_discrete = []
         self.negative_constraints_continuous = []
         self.constraints_crossed = []
+        self.rejected_by = None
         self.neg_dis_size = 0
         self.neg_cont_size = 0
         self.pos_size = 0
@@ -309,81 +409,138 @@ class ConstraintsList:
     # Check whether there is a constraint on the space-time point defined by lat, lon, time. To do so, the code loops
     # over all Constraints added to the ConstraintList
     def safe_endpoint(self, lat, lon, current_time, is_constrained):
-        debug = False
-
-        for iConst in range(0, self.neg_dis_size):
-            is_constrained_temp = self.negative_constraints_discrete[iConst].constraint_on_point(lat, lon, current_time)
-            if is_constrained_temp.any():
-                self.constraints_crossed.append(self.negative_constraints_discrete[iConst].message)
-            # ToDo: use logger.debug and args.debug
-            if debug:
-                print("is_constrained_temp: ", is_constrained_temp)
-                print("is_constrained: ", is_constrained)  # form.print_current_time('constraint execution', start_time)
-
-            is_constrained += is_constrained_temp
-        # if (is_constrained.any()) & (debug): self.print_constraints_crossed()
-        return is_constrained
+        return self.check_negative_constraints(self.negative_constraints_discrete, [lat, lon], current_time,
+                                               is_constrained,
+                                               lambda constr, coords, time: constr.constraint_on_point(*coords, time))
 
     def safe_crossing(self, lat_start, lon_start, lat_end, lon_end, current_time, is_constrained):
-        is_constrained_discrete = is_constrained
-        is_constrained_continuous = is_constrained
-        is_constrained_discrete = self.safe_crossing_discrete(lat_start, lon_start, lat_end, lon_end, current_time,
-                                                              is_constrained)
-        is_constrained_continuous = self.safe_crossing_continuous(lat_start, lon_start, lat_end, lon_end, current_time)
-
-        # TO NBE UPDATED
-        is_constrained = is_constrained + is_constrained_discrete + is_constrained_continuous
-        # is_constrained.append(is_constrained_discrete)
-        # is_constrained.append(is_constrained_continuous)
+        is_constrained = self.safe_crossing_discrete(lat_start, lon_start, lat_end, lon_end, current_time,
+                                                     is_constrained)
+        rejected_by_discrete = self.rejected_by
+        is_constrained = self.safe_crossing_continuous(lat_start, lon_start, lat_end, lon_end, current_time,
+                                                       is_constrained)
+        self.rejected_by = np.where(rejected_by_discrete == None, self.rejected_by, rejected_by_discrete)
         return is_constrained
 
-    def safe_crossing_continuous(self, lat_start, lon_start, lat_end, lon_end, current_time):
-        debug = False
-        is_constrained = [False for i in range(0, len(lat_start))]
-        is_constrained = np.array(is_constrained)
+    def safe_crossing_continuous(self, lat_start, lon_start, lat_end, lon_end, current_time, is_constrained=None):
+        if is_constrained is None:
+            is_constrained = np.zeros(len(lat_start), dtype=bool)
+        return self.check_negative_constraints(self.negative_constraints_continuous,
+                                               [lat_start, lon_start, lat_end, lon_end], current_time, is_constrained,
+                                               lambda constr, coords, time: constr.check_crossing(*coords, time))
+
+    ##
+    # Evaluate the negative constraints in the order of their cost (see add_neg_constraint). get_result(constr, coords,
+    # time) returns the result of a single constraint for the candidates defined by the coordinate arrays in coords.
+    # Pointwise constraints only receive the candidates that have not been rejected by a cheaper constraint, all other
+    # constraints receive all candidates. The evaluation stops as soon as all candidates are rejected.
+    def check_negative_constraints(self, constraints, coords, current_time, is_constrained, get_result):
+        coords = [np.asarray(coord) for coord in coords]
+        shape = coords[0].shape
+        is_constrained = np.broadcast_to(np.asarray(is_constrained, dtype=bool), shape).copy()
+        self.rejected_by = np.full(shape, None, dtype=object)
+
+        for constr in constraints:
+            is_unconstrained = ~is_constrained
+            if not is_unconstrained.any():
+                break
+
+            if constr.pointwise:
+                time = current_time
+                if np.ndim(current_time) > 0:
+                    time = np.broadcast_to(current_time, shape)[is_unconstrained]
+                is_constrained_temp = np.zeros(shape, dtype=bool)
+                is_constrained_temp[is_unconstrained] = get_result(constr,
+                                                                   [coord[is_unconstrained] for coord in coords], time)
+            else:
+                is_constrained_temp = np.broadcast_to(np.asarray(get_result(constr, coords, current_time),
+                                                                 dtype=bool), shape) & is_unconstrained
+
+            if is_constrained_temp.any():
+                self.constraints_crossed.append(constr.message)
+                self.rejected_by[is_constrained_temp] = constr.name
+            logger.debug(form.get_log_step(constr.name + ' rejected ' + str(np.count_nonzero(is_constrained_temp))
+                                           + ' of ' + str(np.count_nonzero(is_unconstrained)) + ' candidates', 1))
+            is_constrained = is_constrained | is_constrained_temp
 
-        # ToDo: use logger.debug and args.debug
-        if debug:
-            print('Entering continuous checks')
-            print('Length of latitudes: ' + str(len(lat_start)))
-
-        for constr in self.negative_constraints_continuous:
-            is_constrained_temp = constr.check_crossing(lat_start, lon_start, lat_end, lon_end, current_time)
-            logger.info('is_constrained_temp: ', is_constrained_temp)
-            logger.info('is_constrained: ', is_constrained)
-            is_constrained += is_constrained_temp
-            logger.info('is_constrained end of loop: ', is_constrained)
-        # ToDo: use logger.debug and args.debug
-        if debug:
-            print('is_constrained_final: ', is_constrained)
         return is_constrained
 
+    def get_sample_distance(self):
+        """
+        Return the maximum distance between the samples of a routing segment (degrees). If not set in ConstraintPars,
+        the finest resolution of the data of the discrete constraints is used.
+        """
+        if self.pars.sample_distance is not None:
+            return self.pars.sample_distance
+        resolutions = [constr.get_resolution() for constr in self.negative_constraints_discrete if
+                       hasattr(constr, 'get_resolution')]
+        if not resolutions:
+            return None
+        return min(resolutions)
+
+    def get_number_of_samples(self, lat_start, lon_start, lat_end, lon_end):
+        n_samples = np.full(np.shape(lat_start), int(round(1.0 / self.pars.resolution)))
+        sample_distance = self.get_sample_distance()
+        if sample_distance is not None:
+            dist = get_angular_distance(lat_start, lon_start, lat_end, lon_end)
+            n_samples = np.maximum(n_samples, np.ceil(dist / sample_distance).astype(int))
+        return np.minimum(n_samples, self.pars.max_samples)
+
+    def get_clear_segments(self, lat_start, lon_start, lat_end, lon_end):
+        """
+        Return a mask of the routing segments that are shorter than the clearance of their start or end point. Such
+        segments cannot hit any of the discrete constraints and don't need to be sampled. Clearances are only available
+        if all discrete constraints provide get_clearance (i.e. are rasterised).
+        """
+        is_clear = np.zeros(lat_start.shape, dtype=bool)
+        if not self.pars.use_clearance or not all(
+                hasattr(constr, 'get_clearance') for constr in self.negative_constraints_discrete):
+            return is_clear
+
+        dist = get_angular_distance(lat_start, lon_start, lat_end, lon_end)
+        for lat, lon in ((lat_start, lon_start), (lat_end, lon_end)):
+            clearance = np.min([constr.get_clearance(lat, lon) for constr in self.negative_constraints_discrete],
+                               axis=0, initial=np.inf)
+            is_clear |= clearance > dist
+        return is_clear
+
     ##
     # Check whether there is a constraint on the way from a starting point (lat_start, lon_start) to the destination
     # (lat_end, lon_end).
-    # To do so, the code segments the travel distance into steps (step length given by ConstraintPars.resolution) and
-    # loops through all these steps
-    # calling ConstraintList.safe_endpoint()
+    # To do so, the code samples the routing segments along the great circle. The number of samples per segment is
+    # given by the segment length divided by the sample distance (see get_sample_distance) but at least
+    # 1/ConstraintPars.resolution. The samples of all segments are checked in a single call of
+    # ConstraintList.safe_endpoint() as array of shape (number of samples, number of segments). Segments with less
+    # samples are padded with their destination. Segments that are already constrained or far away from any constraint
+    # (see get_clear_segments) are not sampled.
     def safe_crossing_discrete(self, lat_start, lon_start, lat_end, lon_end, current_time, is_constrained):
         debug = False
 
-        delta_lats = (lat_end - lat_start) * self.pars.resolution
-        delta_lons = (lon_end - lon_start) * self.pars.resolution
-        x0 = lat_start
-        y0 = lon_start
-
-        # if (debug):
-        # form.print_step('Constraints: Moving from (' + str(lat_start) + ',' + str(lon_start) + ') to (' + str(
-        #        lat_end) + ',' + str(lon_end), 0)
-
-        nSteps = int(1.0 / self.pars.resolution)
-        for iStep in range(0, nSteps):
-            x = x0 + delta_lats
-            y = y0 + delta_lons
-
-            is_constrained = self.safe_endpoint(x, y, current_time, is_constrained)
-            x0 = x
-            y0 = y
+        lat_start = np.asarray(lat_start, dtype=float)
+        lon_start = np.asarray(lon_start, dtype=float)
+        lat_end = np.asarray(lat_end, dtype=float)
+        lon_end = np.asarray(lon_end, dtype=float)
+
+        is_constrained = np.broadcast_to(np.asarray(is_constrained, dtype=bool), lat_start.shape)
+        is_checked = ~self.get_clear_segments(lat_start, lon_start, lat_end, lon_end) & ~is_constrained
+        is_constrained_segments = np.zeros(lat_start.shape, dtype=bool)
+        rejected_by = np.full(lat_start.shape, None, dtype=object)
+        if is_checked.any():
+            n_samples = self.get_number_of_samples(lat_start[is_checked], lon_start[is_checked], lat_end[is_checked],
+                                                   lon_end[is_checked])
+            fractions = np.minimum(np.arange(1, n_samples.max(initial=1) + 1)[:, np.newaxis] / n_samples, 1)
+            lats, lons = get_great_circle_points(lat_start[is_checked], lon_start[is_checked], lat_end[is_checked],
+                                                 lon_end[is_checked], fractions)
+            time = current_time
+            if np.ndim(current_time) > 0:
+                # one time per segment is shared by all samples of the segment
+                time = np.broadcast_to(np.broadcast_to(current_time, lat_start.shape)[is_checked], lats.shape)
+            is_constrained_samples = self.safe_endpoint(lats, lons, time, np.zeros(lats.shape, dtype=bool))
+            is_constrained_segments[is_checked] = np.any(is_constrained_samples, axis=0)
+            rejected_by[is_checked] = self.rejected_by[np.argmax(is_constrained_samples, axis=0),
+                                                       np.arange(is_constrained_samples.shape[1])]
+        is_constrained = is_constrained | is_constrained_segments
+        self.rejected_by = rejected_by
 
         if debug:
             lat_start_constrained = lat_start[is_constrained == 1]
@@ -398,29 +555,25 @@ class ConstraintsList:
                     "[" + str(lat_start_constrained[i]) + "," + str(lon_start_constrained[i]) + "] to [" + str(
                         lat_end_constrained[i]) + "," + str(lon_end_constrained[i]) + "]", 2, )
 
-        # if not ((round(x0.all,8) == round(self.lats_per_step[0, :].all) and (x0.all == self.lons_per_step[0, :].all)):
-        #    exc = 'Did not check destination, only checked lat=' + str(x0) + ', lon=' + str(y0)
-        #    raise ValueError(exc)
-
-        if not np.allclose(x, lat_end):
-            raise Exception("Constraints.land_crossing(): did not reach latitude of destination!")
-        if not np.allclose(y, lon_end):
-            raise Exception("Constraints.land_crossing(): did not reach longitude of destination!")
-
         return is_constrained
 
     def add_pos_constraint(self, constraint):
         self.positive_constraints.append(constraint)
         self.pos_size += 1
 
+    ##
+    # Add a negative constraint. The lists of negative constraints are kept sorted by Constraint.cost (constraints with
+    # equal cost keep the order in which they have been added).
     def add_neg_constraint(self, constraint, option='discrete'):
         if option == 'discrete':
             self.negative_constraints_discrete.append(constraint)
+            self.negative_constraints_discrete.sort(key=lambda constr: constr.cost)
             self.neg_dis_size += 1
             return
 
         if option == 'continuous':
             self.negative_constraints_continuous.append(constraint)
+            self.negative_constraints_continuous.sort(key=lambda constr: constr.cost)
             self.neg_cont_size += 1
             return
 
@@ -428,11 +581,26 @@ class ConstraintsList:
             'You chose to add a negetive constraint with option ' + option + '. However only options -discrete- and '
                                                                              '-continuous- are implemented ')
 
+    def rasterise_constraints(self, map_size, resolution, cache_dir=None):
+        """
+        Replace all discrete negative constraints that support rasterisation by a single RasterisedConstraints object.
+        """
+        rasterisable = [constr for constr in self.negative_constraints_discrete if hasattr(constr, 'get_raster_id')]
+        if not rasterisable:
+            return
+        raster = RasterisedConstraints(rasterisable, map_size, resolution, cache_dir)
+        self.negative_constraints_discrete = [constr for constr in self.negative_constraints_discrete if
+                                              constr not in rasterisable]
+        self.neg_dis_size = len(self.negative_constraints_discrete)
+        self.add_neg_constraint(raster)
+
     def check_weather(self):
         pass
 
 
 class LandCrossing(NegativeContraint):
+    cost = 2
+
     def __init__(self):
         NegativeContraint.__init__(self, "LandCrossing")
         self.message += "crossing land!"  # self.resource_type = 0
@@ -441,6 +609,13 @@ class LandCrossing(NegativeContraint):
         # self.print_debug('checking point: ' + str(lat) + ',' + str(lon))
         return globe.is_land(lat, lon)
 
+    def get_resolution(self):
+        # the global land mask is a grid of 21600 x 43200 points
+        return 180 / 21600
+
+    def get_raster_id(self):
+        return 'LandCrossing_global-land-mask-' + version('global-land-mask')
+
     def print_info(self):
         logger.info(form.get_log_step("no land crossing", 1))
 
@@ -448,9 +623,11 @@ class LandCrossing(NegativeContraint):
 class WaveHeight(NegativeConstraintFromWeather):
     current_wave_height: np.ndarray
     max_wave_height: float
+    weather_variable = 'VHM0'
+    cost = 5
 
-    def __init__(self):
-        NegativeContraint.__init__(self, "WaveHeight")
+    def __init__(self, weather=None):
+        NegativeConstraintFromWeather.__init__(self, "WaveHeight", weather)
         self.message += "waves are to high!"
         # self.resource_type = 0
         self.current_wave_height = np.array([-99])
@@ -458,7 +635,9 @@ class WaveHeight(NegativeConstraintFromWeather):
 
     def constraint_on_point(self, lat, lon, time):
         # self.print_debug('checking point: ' + str(lat) + ',' + str(lon))
-        self.check_weather(lat, lon, time)
+        # without weather, current_wave_height has to be provided by the caller
+        if self.wt is not None:
+            self.current_wave_height = self.check_weather(lat, lon, time)
         # logger.info('current_wave_height:', self.current_wave_height)
         return self.current_wave_height > self.max_wave_height
 
@@ -471,6 +650,7 @@ class WaterDepth(NegativeContraint):
     depth_data: xr  # the xarray.Dataset is expected to have a variable called "depth"
     current_depth: np.ndarray
     min_depth: float
+    cost = 5
 
     def __init__(self, data_mode, draught, map_size, depth_path=''):
         NegativeContraint.__init__(self, 'WaterDepth')
@@ -478,8 +658,10 @@ class WaterDepth(NegativeContraint):
         self.current_depth = np.array([-99])
         self.min_depth = draught
         self.map_size = map_size
+        self.depth_path = depth_path
 
         self.depth_data = None
+        self.depth_sampler = None
 
         if data_mode == 'odc':
             self.depth_data = self.load_data_ODC(depth_path, 'global_relief', measurements=['depth'])
@@ -550,11 +732,23 @@ class WaterDepth(NegativeContraint):
         # form.print_step('current_depth:' + str(self.current_depth), 1)
         return returnvalue
 
+    def get_depth_sampler(self):
+        # depth data within the map is loaded to memory for the first request
+        if self.depth_sampler is None:
+            bbox = (self.map_size.lat1, self.map_size.lon1, self.map_size.lat2, self.map_size.lon2)
+            self.depth_sampler = FieldSampler.from_dataset(self.depth_data, ['depth'], bbox=bbox)
+        return self.depth_sampler
+
     def check_depth(self, lat, lon, time):
-        lat_da = xr.DataArray(lat, dims="dummy")
-        lon_da = xr.DataArray(lon, dims="dummy")
-        rounded_ds = self.depth_data["depth"].interp(latitude=lat_da, longitude=lon_da, method="linear")
-        self.current_depth = rounded_ds.to_numpy()
+        self.current_depth = self.get_depth_sampler().sample(lat, lon)['depth']
+
+    def get_resolution(self):
+        return float(min(np.abs(np.diff(self.depth_data['latitude'][:2].to_numpy()))[0],
+                         np.abs(np.diff(self.depth_data['longitude'][:2].to_numpy()))[0]))
+
+    def get_raster_id(self):
+        # the depth file is identified by path, size and modification time as hashing large files is expensive
+        return 'WaterDepth_' + str(self.min_depth) + '_' + get_file_identity(self.depth_path)
 
     def print_info(self):
         logger.info(form.get_log_step("minimum water depth=" + str(self.min_depth) + "m", 1))
@@ -643,6 +837,7 @@ class StayOnMap(NegativeContraint):
     lon1: float
     lat2: float
     lon2: float
+    cost = 1
 
     def __init__(self):
         NegativeContraint.__init__(self, "StayOnMap")
@@ -656,6 +851,9 @@ class StayOnMap(NegativeContraint):
     def print_info(self):
         logger.info(form.get_log_step("stay on wheather map", 1))
 
+    def get_raster_id(self):
+        return 'StayOnMap_' + str((self.lat1, self.lon1, self.lat2, self.lon2))
+
     def set_map(self, lat1, lon1, lat2, lon2):
         self.lat1 = lat1
         self.lon1 = lon1
@@ -663,6 +861,144 @@ class StayOnMap(NegativeContraint):
         self.lon2 = lon2
 
 
+class RasterisedConstraints(NegativeContraint):
+    """
+    Combination of time-independent discrete constraints which are evaluated once at the cell centres of a raster
+    covering the map. The result is stored as packed bitmap s.t. the check for an arbitrary number of points reduces to
+    a single vectorised lookup. Points outside of the map are checked by the original constraints.
+
+    The bitmap is cached on disk (if cache_dir is provided). The cache file is identified by the map, the resolution and
+    the raster IDs of the constraints which contain e.g. the draught and the hash of the depth data.
+
+    For routing segments in open water, get_clearance provides a lower bound for the distance to the closest constrained
+    cell. It is obtained from a Euclidean distance transform of the bitmap which is computed for the first request.
+
+    Parameters
+    ----------
+    constraints : list
+        Constraints that provide constraint_on_point(lat, lon, time) and get_raster_id().
+    map_size : Map
+        Area covered by the raster.
+    resolution : float
+        Size of the raster cells (degrees).
+    cache_dir : str, optional
+        Directory for the cached bitmaps.
+    """
+    constraints: list
+    map_size: Map
+    resolution: float
+    shape: tuple
+    bitmap: np.ndarray  # packed bitmap of shape (ceil(n_lat * n_lon / 8),), True for constrained cells
+    clearance: np.ndarray  # distance of the cell centres to the closest constrained cell (degrees)
+    cost = 1
+
+    def __init__(self, constraints, map_size, resolution, cache_dir=None):
+        NegativeContraint.__init__(self, 'RasterisedConstraints')
+        self.message += 'crossing rasterised constraints (' + ', '.join(
+            [constr.name for constr in constraints]) + ')!'
+        self.constraints = constraints
+        self.map_size = map_size
+        self.resolution = resolution
+        self.clearance = None
+        self.shape = (int(np.ceil(round((map_size.lat2 - map_size.lat1) / resolution, 6))),
+                      int(np.ceil(round((map_size.lon2 - map_size.lon1) / resolution, 6))))
+
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, 'constraints_raster_' + self.get_cache_id() + '.npz')
+
+        if (cache_file is not None) and os.path.exists(cache_file):
+            logger.info(form.get_log_step('Reading rasterised constraints from ' + cache_file, 0))
+            with np.load(cache_file) as archive:
+                self.bitmap = archive['bitmap']
+        else:
+            self.bitmap = self.build_bitmap()
+            if cache_file is not None:
+                os.makedirs(cache_dir, exist_ok=True)
+                np.savez_compressed(cache_file, bitmap=self.bitmap)
+
+    def get_resolution(self):
+        return self.resolution
+
+    def get_cache_id(self):
+        raster_id = [str((self.map_size.lat1, self.map_size.lon1, self.map_size.lat2, self.map_size.lon2)),
+                     str(self.resolution)] + sorted(constr.get_raster_id() for constr in self.constraints)
+        return hashlib.sha256('|'.join(raster_id).encode()).hexdigest()[:16]
+
+    def build_bitmap(self, rows_per_chunk=256):
+        logger.info(form.get_log_step('Rasterising constraints on grid of shape ' + str(self.shape), 0))
+        lats = self.map_size.lat1 + (np.arange(self.shape[0]) + 0.5) * self.resolution
+        lons = self.map_size.lon1 + (np.arange(self.shape[1]) + 0.5) * self.resolution
+
+        is_constrained = np.zeros(self.shape, dtype=bool)
+        for row in range(0, self.shape[0], rows_per_chunk):
+            lat_grid, lon_grid = np.meshgrid(lats[row:row + rows_per_chunk], lons, indexing='ij')
+            is_constrained[row:row + rows_per_chunk] = self.check_constraints(lat_grid.ravel(), lon_grid.ravel(),
+                                                                              None).reshape(lat_grid.shape)
+        return np.packbits(is_constrained.ravel())
+
+    def check_constraints(self, lat, lon, time):
+        is_constrained = np.zeros(lat.shape, dtype=bool)
+        for constr in self.constraints:
+            is_constrained |= np.asarray(constr.constraint_on_point(lat, lon, time), dtype=bool)
+        return is_constrained
+
+    def get_cell_index(self, lat, lon):
+        """
+        Return the flat indices of the raster cells that contain the points and a mask of the points on the map.
+        """
+        is_on_map = ((lat >= self.map_size.lat1) & (lat <= self.map_size.lat2) & (lon >= self.map_size.lon1) & (
+                lon <= self.map_size.lon2))
+        ilat = np.clip(((lat - self.map_size.lat1) / self.resolution).astype(int), 0, self.shape[0] - 1)
+        ilon = np.clip(((lon - self.map_size.lon1) / self.resolution).astype(int), 0, self.shape[1] - 1)
+        return ilat * self.shape[1] + ilon, is_on_map
+
+    def get_clearance(self, lat, lon):
+        """
+        Return a lower bound for the distance of the points to the closest constrained cell or the boundary of the map
+        (degrees). Distances in longitude are scaled by the cosine of the latitude farthest from the equator. Points
+        outside of the map have a clearance of zero.
+        """
+        if self.clearance is None:
+            is_constrained = np.unpackbits(self.bitmap, count=self.shape[0] * self.shape[1]).astype(bool)
+            # points outside of the map are checked by the original constraints and thus count as constrained
+            is_constrained = np.pad(is_constrained.reshape(self.shape), 1, constant_values=True)
+            lon_scale = np.cos(np.radians(max(abs(self.map_size.lat1), abs(self.map_size.lat2))))
+            clearance = distance_transform_edt(~is_constrained, sampling=(self.resolution, self.resolution * lon_scale))
+            # distances are calculated between cell centres, thus subtract the diagonal of a cell
+            clearance = np.maximum(clearance[1:-1, 1:-1] - np.sqrt(2) * self.resolution, 0)
+            self.clearance = clearance.astype(np.float32).ravel()
+
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        icell, is_on_map = self.get_cell_index(lat, lon)
+        return np.where(is_on_map, self.clearance[icell], 0)
+
+    def constraint_on_point(self, lat, lon, time):
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        icell, is_on_map = self.get_cell_index(lat, lon)
+        is_constrained = ((self.bitmap[icell >> 3] >> (7 - (icell & 7))) & 1).astype(bool)
+
+        if not is_on_map.all():
+            is_constrained[~is_on_map] = self.check_constraints(lat[~is_on_map], lon[~is_on_map], time)
+        return is_constrained
+
+    def print_info(self):
+        logger.info(form.get_log_step('rasterised constraints with resolution ' + str(self.resolution) + '°:', 1))
+        for constr in self.constraints:
+            constr.print_info()
+
+
+@lru_cache(maxsize=None)
+def get_database_engine(url):
+    """
+    Return the SQLAlchemy engine for url. The engine (and thus its connection pool) is created once and shared by all
+    constraints that connect to the same database.
+    """
+    return db.create_engine(url, pool_pre_ping=True)
+
+
 class ContinuousCheck(NegativeContraint):
     """
     Contains various functions to test data connection,
@@ -684,25 +1020,66 @@ class ContinuousCheck(NegativeContraint):
 
     tags : list
         Values of the seamark tags that need to be considered
+
+    map_size : Map
+        if provided, only geometries within the map (plus bbox_buffer degrees) are requested from the database
+
+    layer_cache : ConstraintLayerCache
+        if provided, the geometries are read from the local cache instead of the database
+
+    tree : STRtree
+        spatial index of the geometries of the constraint, built for the first request and kept for all following
+        requests with the same query
     """
+    cost = 100
 
-    def __init__(self):
+    def __init__(self, map_size=None, layer_cache_dir=None):
         NegativeContraint.__init__(self, "ContinuousChecks")
         self.host = os.getenv("WRT_DB_HOST")
         self.database = os.getenv("WRT_DB_DATABASE")
         self.user = os.getenv("WRT_DB_USERNAME")
         self.password = os.getenv("WRT_DB_PASSWORD")
         self.port = os.getenv("WRT_DB_PORT")
+        self.map_size = map_size
+        self.bbox_buffer = 0.5
         self.seamark_object = ["nodes", "ways", "land_polygons"]
-        self.query = ["SELECT * FROM openseamap.nodes", "SELECT *, linestring AS geom FROM openseamap.ways",
-                      "SELECT *,geometry as geom FROM openseamap.land_polygons"]
         self.predicates = ["intersects", "contains", "touches", "crosses", "overlaps"]
         self.tags = ["separation_zone", "separation_line", "restricted_area"]
+        self.query = self.get_queries()
+        self.layer_cache = None
+        if layer_cache_dir is not None:
+            self.layer_cache = ConstraintLayerCache(layer_cache_dir)
         self.land_polygon_gdf = None
+        self.tree = None
+        self.tree_query = None
 
     def print_info(self):
         logger.info(form.get_log_step("no seamarks crossing", 1))
 
+    def get_bbox(self):
+        if self.map_size is None:
+            return None
+        return (self.map_size.lat1 - self.bbox_buffer, self.map_size.lon1 - self.bbox_buffer,
+                self.map_size.lat2 + self.bbox_buffer, self.map_size.lon2 + self.bbox_buffer)
+
+    def get_queries(self):
+        """
+        Return the sql queries for the tables nodes, ways and land_polygons. Seamarks are filtered for the values of
+        self.tags (the tags are stored as hstore). If a map is provided, only geometries whose bounding box intersects
+        the map (plus bbox_buffer) are selected which allows for the use of the spatial index of the database.
+        """
+        tag_filter = "avals(tags) && ARRAY[" + ", ".join(["'" + tag + "'" for tag in self.tags]) + "]"
+        bbox_filter = {"nodes": "", "ways": "", "land_polygons": ""}
+        if self.map_size is not None:
+            lat1, lon1, lat2, lon2 = self.get_bbox()
+            envelope = "ST_MakeEnvelope(" + ", ".join([str(lon1), str(lat1), str(lon2), str(lat2)]) + ", 4326)"
+            bbox_filter = {"nodes": " AND geom && " + envelope, "ways": " AND linestring && " + envelope,
+                           "land_polygons": " WHERE geometry && " + envelope}
+
+        return ["SELECT * FROM openseamap.nodes WHERE " + tag_filter + bbox_filter["nodes"],
+                "SELECT *, linestring AS geom FROM openseamap.ways WHERE " + tag_filter + bbox_filter["ways"],
+                "SELECT *,geometry as geom FROM openseamap.land_polygons" + bbox_filter["land_polygons"]]
+
     def connect_database(self):
         """
         Connect to the database
@@ -714,16 +1091,56 @@ class ContinuousCheck(NegativeContraint):
 
         Returns
         ----------
-        Engine of PostgreSQL
+        Engine of PostgreSQL (shared by all constraints, see get_database_engine)
         """
         # Connect to the PostgreSQL database using SQLAlchemy
-        engine = db.create_engine(
+        engine = get_database_engine(
             "postgresql://{user}:{pwd}@{host}:{port}/{db}".format(user=self.user, pwd=self.password, host=self.host,
                                                                   db=self.database, port=self.port))
         return engine
 
+    def get_tree(self, query, get_geometries):
+        """
+        Return the STRtree of the geometries returned by get_geometries(). The tree is only rebuilt if the query
+        differs from the query of the previous request.
+        """
+        if (self.tree is None) or (self.tree_query != query):
+            geometries = get_geometries()
+            logger.info(form.get_log_step('Building spatial index for ' + str(len(geometries)) + ' geometries', 1))
+            self.tree = STRtree(np.asarray(geometries))
+            self.tree_query = query
+        return self.tree
+
+    def get_segments(self, lat_start, lon_start, lat_end, lon_end):
+        """
+        Return the routing segments as array of LineStrings. The number of segments is given by the number of start
+        points.
+        """
+        n_segments = len(lat_start)
+        start = np.column_stack((np.asarray(lon_start, dtype=float)[:n_segments],
+                                 np.asarray(lat_start, dtype=float)[:n_segments]))
+        end = np.column_stack((np.asarray(lon_end, dtype=float)[:n_segments],
+                               np.asarray(lat_end, dtype=float)[:n_segments]))
+        return shapely.linestrings(np.stack((start, end), axis=1))
+
+    def query_tree(self, tree, lat_start, lon_start, lat_end, lon_end):
+        """
+        Check all routing segments for intersections with the geometries of tree in a single request. Returns a list of
+        bools (True: segment is constrained).
+        """
+        segments = self.get_segments(lat_start, lon_start, lat_end, lon_end)
+        is_constrained = np.zeros(segments.shape[0], dtype=bool)
+        if segments.shape[0] > 0:
+            idx_segments, _ = tree.query(segments, predicate='intersects')
+            is_constrained[idx_segments] = True
+        logger.debug(str(is_constrained.sum()) + ' of ' + str(segments.shape[0]) + ' routing segments constrained by '
+                     + self.name)
+        return is_constrained.tolist()
+
 
 class RunTestContinuousChecks(ContinuousCheck):
+    pointwise = False  # the results are provided per position in the request
+
     def __init__(self, test_dict):
         NegativeContraint.__init__(self, "ContinuousChecks")
         self.test_result_dict = test_dict
@@ -767,8 +1184,9 @@ class SeamarkCrossing(ContinuousCheck):
         Values of the seamark tags that need to be considered
     """
 
-    def __init__(self):  # query,predicates,tags):
-        super().__init__()  # self.engine = ContinuousCheck.connect_database()  # self.query=ContinuousCheck().query
+    def __init__(self, map_size=None, layer_cache_dir=None):  # query,predicates,tags):
+        super().__init__(map_size, layer_cache_dir)
+        # self.engine = ContinuousCheck.connect_database()  # self.query=ContinuousCheck().query
         # self.predicates=ContinuousCheck().predicates
 
     def query_nodes(self, engine=None, query=None):
@@ -790,7 +1208,9 @@ class SeamarkCrossing(ContinuousCheck):
         """
         # Define SQL query to retrieve list of tables
         # sql_query = "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
-        if (engine is None) and (query is None):
+        if (engine is None) and (query is None) and (self.layer_cache is not None):
+            gdf = self.layer_cache.read("nodes", self.get_bbox())
+        elif (engine is None) and (query is None):
             gdf = gpd.read_postgis(con=self.connect_database(), sql=self.query[0], geom_col="geom", crs="epsg:4326")
             gdf = gdf[gdf["geom"] != None]
         # elif (engine is not None) and (query is not None):
@@ -837,7 +1257,9 @@ class SeamarkCrossing(ContinuousCheck):
         # Use geopandas to read the SQL query into a dataframe from postgis
         # gdf = gpd.read_postgis(con=engine, sql=query, geom_col="geom")
 
-        if (engine is None) and (query is None):
+        if (engine is None) and (query is None) and (self.layer_cache is not None):
+            gdf = self.layer_cache.read("ways", self.get_bbox())
+        elif (engine is None) and (query is None):
             gdf = gpd.read_postgis(con=self.connect_database(), sql=self.query[1], geom_col="geom", crs="epsg:4326")
             gdf = gdf[gdf["geom"] != None]
         else:
@@ -850,6 +1272,21 @@ class SeamarkCrossing(ContinuousCheck):
 
         return gdf
 
+    def filter_seamark_tags(self, gdf, seamark_list):
+        """
+        Return the features of gdf that carry one of the values of seamark_list in their tags (one entry per matching
+        value). Tags are parsed once if they are stored as strings. Returns an empty GeoDataFrame if no feature
+        matches, e.g. if the map does not contain any seamarks.
+        """
+        gdf = gdf.copy()
+        gdf["tags"] = gdf["tags"].apply(lambda t: ast.literal_eval(t) if isinstance(t, str) else t)
+        tag_values = gdf["tags"].apply(lambda t: set(t.values()) if isinstance(t, dict) else set())
+
+        gdf_list = [gdf[tag_values.apply(lambda values: tag in values).to_numpy(dtype=bool)] for tag in seamark_list]
+        if not gdf_list:
+            return gdf.iloc[0:0]
+        return pd.concat(gdf_list)
+
     def gdf_seamark_combined_nodes(self, engine=None, query=None, seamark_list=None, seamark_object=None):
         """
         Create new GeoDataFrame with specified seamark tags
@@ -888,16 +1325,7 @@ class SeamarkCrossing(ContinuousCheck):
             else:
                 gdf = self.query_nodes(engine=engine, query=query)
 
-            gdf_list = []
-            for i in range(0, len(seamark_list)):
-                if isinstance(gdf["tags"][i], str):
-                    gdf["tags"] = gdf["tags"].apply(ast.literal_eval)
-                    gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                    gdf_list.append(gdf1)
-                else:
-                    gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                    gdf_list.append(gdf1)
-            gdf_concat = pd.concat(gdf_list)
+            gdf_concat = self.filter_seamark_tags(gdf, seamark_list)
 
         return gdf_concat
 
@@ -938,16 +1366,7 @@ class SeamarkCrossing(ContinuousCheck):
             else:
                 gdf = self.query_ways(query=query, engine=engine)
 
-            gdf_list = []
-            for i in range(0, len(seamark_list)):
-                if isinstance(gdf["tags"][i], str):
-                    gdf["tags"] = gdf["tags"].apply(ast.literal_eval)
-                    gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                    gdf_list.append(gdf1)
-                else:
-                    gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                    gdf_list.append(gdf1)
-            gdf_concat = pd.concat(gdf_list)
+            gdf_concat = self.filter_seamark_tags(gdf, seamark_list)
 
         return gdf_concat
 
@@ -1028,18 +1447,7 @@ class SeamarkCrossing(ContinuousCheck):
 
             if ("nodes" in seamark_object) and ("ways" in seamark_object):
                 gdf = self.concat_nodes_ways(query=query, engine=engine)
-                gdf_list = []
-                for i in range(0, len(seamark_list)):
-                    if isinstance(gdf["tags"].iloc[i], str):
-                        gdf["tags"] = gdf["tags"].apply(ast.literal_eval)
-                        gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                        gdf_list.append(gdf1)
-
-                    else:
-                        gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                        gdf_list.append(gdf1)
-
-                gdf_concat = pd.concat(gdf_list)
+                gdf_concat = self.filter_seamark_tags(gdf, seamark_list)
                 logger.info(f'concat geodataframe is {gdf_concat}')
 
                 return gdf_concat
@@ -1051,17 +1459,7 @@ class SeamarkCrossing(ContinuousCheck):
             if ("nodes" in seamark_object) and ("ways" in seamark_object):
                 gdf = self.concat_nodes_ways()
                 logger.info(f"concat gdf {gdf}")
-                gdf_list = []
-                for i in range(0, len(seamark_list)):
-                    if isinstance(gdf["tags"].iloc[i], str):
-                        gdf["tags"] = gdf["tags"].apply(ast.literal_eval)
-                        gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                        gdf_list.append(gdf1)
-                    else:
-                        gdf1 = gdf[gdf["tags"].apply(lambda x: seamark_list[i] in x.values())]
-                        gdf_list.append(gdf1)
-
-                gdf_concat = pd.concat(gdf_list)
+                gdf_concat = self.filter_seamark_tags(gdf, seamark_list)
                 logger.info(f'concat geodataframe is {gdf_concat}')
 
                 return gdf_concat
@@ -1095,77 +1493,20 @@ class SeamarkCrossing(ContinuousCheck):
              bool of spatial relation result (True or False)
          """
 
-        query_tree = []
         if engine is None and query is None:
-            concat_gdf = self.gdf_seamark_combined_nodes_ways()
-
-            for i in range(len(lat_start)):
-                start_point = Point(lon_start[i], lat_start[i])
-                end_point = Point(lon_end[i], lat_end[i])
-                line = LineString([start_point, end_point])
-
-                # creating geospatial dataframe objects from linestring geometries
-                route_df = gpd.GeoDataFrame(geometry=[line])
-
-                # checking the spatial relations using shapely.STRTree spatial indexing method
-                # for predicate in self.predicates:
-                concat_df = concat_gdf
-                # concat_df = ways_gdf  # with all the ways from the seamarks data
-                logger.info(f'PRINT CONCAT DF {concat_df}')
-                tree = STRtree(concat_df["geom"])
-                geom_object = tree.query(route_df["geom"], predicate='intersects').tolist()
-
-                # checks if there is spatial relation between routes and seamarks objects
-                if geom_object == [[], []] or geom_object == []:
-                    # if route is not constrained
-                    query_tree.append(False)
-                    logger.info(f'NO CROSSING for  {line} in the query tree: {query_tree} ')
-                else:
-                    # if route is constrained
-                    query_tree.append(True)
-                    logger.info(f'CROSSING for  {line} in the query tree: {query_tree} ')
-
-            # returns a list bools (spatial relation)
-            return query_tree
+            tree = self.get_tree(None, lambda: self.gdf_seamark_combined_nodes_ways()["geom"])
         else:
-            concat_gdf = self.gdf_seamark_combined_nodes_ways(engine=engine, query=query, seamark_list=seamark_list,
-                                                              seamark_object=seamark_object)
-
-            # generating the LineString geometry from start and end point
-            logger.info(type(lat_start))
-            for i in range(len(lat_start)):
-                start_point = Point(lon_start[i], lat_start[i])
-                end_point = Point(lon_end[i], lat_end[i])
-                line = LineString([start_point, end_point])
-
-                # creating geospatial dataframe objects from linestring geometries
-                route_df = gpd.GeoDataFrame(geometry=[line])
-
-                # checking the spatial relations using shapely.STRTree spatial indexing method
-                # for predicate in self.predicates:
-                concat_df = concat_gdf
-                logger.info(f'PRINT CONCAT DF {concat_df}')
-                tree = STRtree(concat_df["geom"])
-                geom_object = tree.query(route_df["geometry"], predicate='intersects').tolist()
-
-                # checks if there is spatial relation between routes and seamarks objects
-                if geom_object == [[], []] or geom_object == []:
-                    # if route is not constrained
-                    query_tree.append(False)
-                    logger.info(f'NO CROSSING for  {line} in the query tree: {query_tree} ')
-                else:
-                    # if route is constrained
-                    query_tree.append(True)
-                    logger.info(f'CROSSING for  {line} in the query tree: {query_tree} ')
+            tree_query = (str(engine.url), str(query), str(seamark_list), str(seamark_object))
+            tree = self.get_tree(tree_query, lambda: self.gdf_seamark_combined_nodes_ways(
+                engine=engine, query=query, seamark_list=seamark_list, seamark_object=seamark_object)["geom"])
 
-            # returns a list bools (spatial relation)
-            return query_tree
+        # returns a list bools (spatial relation)
+        return self.query_tree(tree, lat_start, lon_start, lat_end, lon_end)
 
 
 class LandPolygonsCrossing(ContinuousCheck):
-    def __init__(self, map_size):
-        super().__init__()
-        self.map_size = map_size
+    def __init__(self, map_size, layer_cache_dir=None):
+        super().__init__(map_size, layer_cache_dir)
 
     def query_land_polygons(self, engine=None, query=None):
         """
@@ -1186,7 +1527,10 @@ class LandPolygonsCrossing(ContinuousCheck):
         """
 
         # Use geopandas to read the SQL query into a dataframe from postgis
-        if query is None and engine is None:
+        if query is None and engine is None and self.layer_cache is not None:
+            gdf = self.layer_cache.read("land_polygons", self.get_bbox())
+
+        elif query is None and engine is None:
             query = self.query[2]
             engine = self.connect_database()
             gdf = gpd.read_postgis(sql=query, con=engine, geom_col="geom")
@@ -1202,7 +1546,7 @@ class LandPolygonsCrossing(ContinuousCheck):
 
     def get_land_polygons(self):
 
-        if not self.land_polygon_gdf:
+        if self.land_polygon_gdf is None:
             self.land_polygon_gdf = self.query_land_polygons()
         return self.land_polygon_gdf
 
@@ -1233,39 +1577,78 @@ class LandPolygonsCrossing(ContinuousCheck):
             bool of spatial relation result (True or False)
         """
 
-        query_tree = []
         if query is not None and engine is not None:
-            concat_gdf = self.query_land_polygons(engine=engine, query=query)
+            tree = self.get_tree((str(engine.url), query),
+                                 lambda: self.query_land_polygons(engine=engine, query=query)["geom"])
         else:
-            concat_gdf = self.get_land_polygons()
-            concat_gdf.clip(box(self.map_size[1], self.map_size[0], self.map_size[3], self.map_size[2]))
+            tree = self.get_tree(None, lambda: self.get_land_polygons()["geom"])
 
-        # generating the LineString geometry from start and end point
-        for i in range(len(lat_start)):
-            start_point = Point(lon_start[i], lat_start[i])
-            end_point = Point(lon_end[i], lat_end[i])
-            line = LineString([start_point, end_point])
+        # returns a list bools (spatial relation)
+        return self.query_tree(tree, lat_start, lon_start, lat_end, lon_end)
 
-            # creating geospatial dataframe objects from linestring geometries
-            route_df = gpd.GeoDataFrame(geometry=[line])
 
-            # checking the spatial relations using shapely.STRTree spatial indexing method
+class LandPolygonsIntersection(LandPolygonsCrossing):
+    """
+    Exact check of the routing segments against the land polygons.
 
-            concat_df = concat_gdf
-            if query is not None and engine is not None:
-                tree = STRtree(concat_df["geom"])
-            else:
-                tree = STRtree(concat_df["geom"])
+    The land polygons are clipped once to the map (plus bbox_buffer), optionally simplified and combined to a single
+    prepared MultiPolygon. All routing segments of a request are then checked by a single vectorised call of
+    shapely.intersects. Segments are only checked against the land within the clipped area.
 
-            geom_object = tree.query(route_df["geometry"], predicate="intersects").tolist()
+    Attributes
+    ----------
 
-            # checks if there is spatial relation between routes and seamarks objects
-            if geom_object == [[], []] or geom_object == []:
-                # if route is not constrained
-                query_tree.append(False)
-            else:
-                # if route is constrained
-                query_tree.append(True)
+    simplify_tolerance : float
+        tolerance for the simplification of the land polygons (degrees), 0: no simplification
 
-        # returns a list bools (spatial relation)
-        return query_tree
+    land_geometry : MultiPolygon
+        prepared land polygons, built for the first request and kept for all following requests with the same query
+    """
+    cost = 20
+
+    def __init__(self, map_size, layer_cache_dir=None, simplify_tolerance=0):
+        super().__init__(map_size, layer_cache_dir)
+        self.simplify_tolerance = simplify_tolerance
+        self.land_geometry = None
+        self.land_geometry_query = None
+
+    def print_info(self):
+        logger.info(form.get_log_step("no land crossing (land polygons, simplification tolerance="
+                                      + str(self.simplify_tolerance) + "°)", 1))
+
+    def get_land_geometry(self, query, get_geometries):
+        """
+        Return the prepared land geometry built from the polygons returned by get_geometries(). The geometry is only
+        rebuilt if the query differs from the query of the previous request.
+        """
+        if (self.land_geometry is None) or (self.land_geometry_query != query):
+            geometries = np.asarray(get_geometries())
+            bbox = self.get_bbox()
+            if bbox is not None:
+                geometries = shapely.clip_by_rect(geometries, bbox[1], bbox[0], bbox[3], bbox[2])
+            if self.simplify_tolerance > 0:
+                geometries = shapely.simplify(geometries, self.simplify_tolerance, preserve_topology=True)
+            parts = shapely.get_parts(geometries[~shapely.is_empty(geometries)])
+            polygons = parts[shapely.get_type_id(parts) == shapely.GeometryType.POLYGON]
+            logger.info(form.get_log_step('Preparing ' + str(len(polygons)) + ' land polygons', 1))
+            self.land_geometry = shapely.multipolygons(polygons)
+            shapely.prepare(self.land_geometry)
+            self.land_geometry_query = query
+        return self.land_geometry
+
+    def check_crossing(self, lat_start, lon_start, lat_end, lon_end, query=None, engine=None, time=None):
+        """
+        Check if the routing segments intersect the land polygons. Returns a list of bools (True: segment is
+        constrained).
+        """
+        if query is not None and engine is not None:
+            land_geometry = self.get_land_geometry((str(engine.url), query),
+                                                   lambda: self.query_land_polygons(engine=engine, query=query)["geom"])
+        else:
+            land_geometry = self.get_land_geometry(None, lambda: self.get_land_polygons()["geom"])
+
+        segments = self.get_segments(lat_start, lon_start, lat_end, lon_end)
+        is_constrained = shapely.intersects(land_geometry, segments)
+        logger.debug(str(is_constrained.sum()) + ' of ' + str(segments.shape[0]) + ' routing segments constrained by '
+                     + self.name)
+        return is_constrained.tolist()
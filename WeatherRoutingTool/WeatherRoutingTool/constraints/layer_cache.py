@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import sqlalchemy as db
+from shapely.geometry import box
+
+import WeatherRoutingTool.utils.formatting as form
+
+logger = logging.getLogger("WRT.Constraints")
+
+##
+# Local copy of the constraint layers of the database (seamark nodes and ways, land polygons).
+#
+# The layers are split into tiles of tile_size x tile_size degrees which are written as FlatGeobuf files (including a
+# spatial index). Geometries that overlap several tiles are written to all of them. The manifest 'manifest.json'
+# contains the export timestamp of the database, the tile size and the list of tiles per layer. Constraints read only
+# the tiles that overlap the requested bounding box and do not need a connection to the database.
+
+CACHE_LAYERS = ["nodes", "ways", "land_polygons"]
+
+
+def get_export_timestamp(engine):
+    """
+    Return the time of the latest change of the seamark tables of the database as string.
+    """
+    query = ("SELECT GREATEST((SELECT max(tstamp) FROM openseamap.nodes), "
+             "(SELECT max(tstamp) FROM openseamap.ways))")
+    with engine.connect() as connection:
+        timestamp = connection.execute(db.text(query)).scalar()
+    return str(timestamp)
+
+
+class ConstraintLayerCache:
+    """
+    Tiled on-disk cache of the constraint layers.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cache.
+    tile_size : float
+        Size of the tiles (degrees), only used for the export.
+    """
+
+    def __init__(self, cache_dir, tile_size=10):
+        self.cache_dir = cache_dir
+        self.tile_size = tile_size
+        self.manifest_path = os.path.join(cache_dir, "manifest.json")
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifest_path):
+            return None
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def is_up_to_date(self, timestamp):
+        manifest = self.read_manifest()
+        return (manifest is not None) and (manifest["timestamp"] == timestamp)
+
+    def get_tile_name(self, layer, ilat, ilon):
+        return layer + "_" + str(ilat) + "_" + str(ilon) + ".fgb"
+
+    def export(self, engine, queries, timestamp):
+        """
+        Export the layers to tiles. queries maps the layer names to sql queries which return the geometries in the
+        column 'geom' and optionally the columns 'id' and 'tags'.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        manifest = {"timestamp": timestamp, "tile_size": self.tile_size, "tiles": {}}
+
+        for layer, query in queries.items():
+            gdf = gpd.read_postgis(con=engine, sql=query, geom_col="geom", crs="epsg:4326")
+            gdf = gdf[gdf["geom"] != None]
+            gdf = gdf[[col for col in ["id", "tags"] if col in gdf.columns] + ["geom"]]
+            if "tags" in gdf.columns:
+                gdf["tags"] = gdf["tags"].apply(str)
+            logger.info(form.get_log_step("Exporting " + str(len(gdf)) + " geometries of layer " + layer, 0))
+
+            manifest["tiles"][layer] = []
+            for ilat in range(int(np.floor(-90 / self.tile_size)), int(np.ceil(90 / self.tile_size))):
+                for ilon in range(int(np.floor(-180 / self.tile_size)), int(np.ceil(180 / self.tile_size))):
+                    tile = box(ilon * self.tile_size, ilat * self.tile_size, (ilon + 1) * self.tile_size,
+                               (ilat + 1) * self.tile_size)
+                    idxs = gdf.sindex.query(tile, predicate="intersects")
+                    if idxs.shape[0] == 0:
+                        continue
+                    tile_name = self.get_tile_name(layer, ilat, ilon)
+                    gdf.iloc[np.sort(idxs)].to_file(os.path.join(self.cache_dir, tile_name), driver="FlatGeobuf")
+                    manifest["tiles"][layer].append(tile_name)
+
+        with open(self.manifest_path, "w") as f:
+            json.dump(manifest, f)
+
+    def sync(self, engine, queries, force=False):
+        """
+        Export the layers if the cache does not exist or if the database has changed since the last export.
+        """
+        timestamp = get_export_timestamp(engine)
+        if self.is_up_to_date(timestamp) and not force:
+            logger.info(form.get_log_step("Constraint layer cache is up to date (database export " + timestamp + ")",
+                                          0))
+            return
+        self.export(engine, queries, timestamp)
+
+    def read(self, layer, bbox=None):
+        """
+        Return the geometries of layer as GeoDataFrame with geometry column 'geom'. If bbox = (lat_min, lon_min,
+        lat_max, lon_max) is provided, only the tiles overlapping the bounding box are read.
+        """
+        manifest = self.read_manifest()
+        if manifest is None:
+            raise ValueError("No constraint layer cache found in " + self.cache_dir + ". Please run "
+                             "write_constraint_cache.py first.")
+        tile_size = manifest["tile_size"]
+        tiles = manifest["tiles"].get(layer, [])
+        read_bbox = None
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            read_bbox = (lon_min, lat_min, lon_max, lat_max)
+            ilats = range(int(np.floor(lat_min / tile_size)), int(np.floor(lat_max / tile_size)) + 1)
+            ilons = range(int(np.floor(lon_min / tile_size)), int(np.floor(lon_max / tile_size)) + 1)
+            bbox_tiles = {self.get_tile_name(layer, ilat, ilon) for ilat in ilats for ilon in ilons}
+            tiles = [tile for tile in tiles if tile in bbox_tiles]
+
+        gdf_list = [gpd.read_file(os.path.join(self.cache_dir, tile), bbox=read_bbox) for tile in tiles]
+        if not gdf_list:
+            return gpd.GeoDataFrame(columns=["id", "tags", "geom"], geometry="geom", crs="epsg:4326")
+        gdf = pd.concat(gdf_list).rename_geometry("geom")
+
+        # geometries overlapping several tiles are contained in all of them
+        if "id" in gdf.columns:
+            gdf = gdf.drop_duplicates(subset="id")
+        else:
+            gdf = gdf[~gdf["geom"].to_wkb().duplicated()]
+        return gdf.reset_index(drop=True)
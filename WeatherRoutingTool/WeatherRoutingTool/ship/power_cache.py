@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import sqlite3
+from collections import OrderedDict
+
+import numpy as np
+
+import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.ship.shipparams import ShipParams, get_coords_per_course, get_fuel_per_time_2D
+from WeatherRoutingTool.utils.file_utils import get_file_identity
+
+logger = logging.getLogger('WRT.ship')
+
+##
+# Cache for the ship parameters returned by the power model.
+#
+# Requests are identified by the state (lat, lon, time, course, speed) quantised to configurable tolerances. Thus,
+# requests for states that differ by less than the tolerances are answered by the ship parameters of the state that has
+# been requested first. The cache consists of an in-memory tier with bounded LRU eviction and an optional on-disk tier
+# (sqlite) which is shared by all runs that use the same ship and input files (see get_cache_id).
+
+DEFAULT_CACHE_TOLERANCES = {
+    'position': 0.01,  # (degrees)
+    'course': 1,  # (degrees)
+    'time': 3 * 3600,  # (s)
+    'speed': 0.01  # (m/s)
+}
+
+
+def get_cache_id(config, ship_id):
+    """
+    Return the identifier of the on-disk tier of the power cache. The identifier combines the ship ID (power model and
+    ship, see Boat.get_ship_id) with the identities of the input files of the power model (weather file, depth file and,
+    for the surrogate, the surrogate table). Files are identified by path, size and modification time as hashing large
+    files is expensive. The boat speed is part of the cached states and wrappers of the boat (e.g. parallel requests)
+    do not change the ship parameters, thus neither is part of the identifier.
+    """
+    input_files = [config.WEATHER_DATA, config.DEPTH_DATA]
+    if config.BOAT_TYPE == 'surrogate':
+        input_files.append(config.BOAT_SURROGATE_TABLE)
+    file_ids = [get_file_identity(filepath) for filepath in input_files]
+    return ship_id + '_' + hashlib.sha256('|'.join(file_ids).encode()).hexdigest()[:16]
+
+
+class PowerCache:
+    """
+    LRU cache for ship parameters keyed on the quantised state of the ship.
+
+    Parameters
+    ----------
+    max_size : int
+        Maximum number of states kept in memory.
+    tolerances : dict, optional
+        Quantisation steps for 'position', 'course', 'time' and 'speed', see DEFAULT_CACHE_TOLERANCES.
+    cache_dir : str, optional
+        Directory of the on-disk tier. If None, only the in-memory tier is used.
+    cache_id : str, optional
+        Identifier of the on-disk tier, e.g. a combination of ship ID and input files, see get_cache_id.
+    """
+
+    def __init__(self, max_size=100000, tolerances=None, cache_dir=None, cache_id=None):
+        self.max_size = max_size
+        self.tolerances = dict(DEFAULT_CACHE_TOLERANCES)
+        if tolerances is not None:
+            self.tolerances.update(tolerances)
+        self.entries = OrderedDict()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.db = None
+        if cache_dir is not None:
+            if cache_id is None:
+                raise ValueError('The on-disk tier of the power cache requires a cache_id.')
+            os.makedirs(cache_dir, exist_ok=True)
+            self.db = sqlite3.connect(os.path.join(cache_dir, 'power_cache_' + cache_id + '.sqlite'))
+            self.db.execute('CREATE TABLE IF NOT EXISTS params (key TEXT PRIMARY KEY, value BLOB)')
+
+    @classmethod
+    def from_config(cls, config, boat):
+        tolerances = {'time': config.DELTA_TIME_FORECAST * 3600}
+        if config.BOAT_POWER_CACHE_TOLERANCES is not None:
+            tolerances.update(config.BOAT_POWER_CACHE_TOLERANCES)
+        cache_id = None
+        if config.BOAT_POWER_CACHE_DIR is not None:
+            cache_id = get_cache_id(config, boat.get_ship_id())
+        return cls(config.BOAT_POWER_CACHE_SIZE, tolerances, config.BOAT_POWER_CACHE_DIR, cache_id)
+
+    def get_keys(self, courses, lats, lons, time, speed):
+        time = np.asarray(time, dtype='datetime64[s]').astype(np.int64)
+        n_course_bins = int(round(360 / self.tolerances['course']))
+        state = np.column_stack((np.round(np.asarray(lats, dtype=float) / self.tolerances['position']),
+                                 np.round(np.asarray(lons, dtype=float) / self.tolerances['position']),
+                                 np.round(time / self.tolerances['time']),
+                                 np.round(np.asarray(courses, dtype=float) / self.tolerances['course']) % n_course_bins,
+                                 np.round(np.asarray(speed, dtype=float) / self.tolerances['speed']))).astype(np.int64)
+        return [','.join(map(str, row)) for row in state.tolist()]
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        if self.db is not None:
+            row = self.db.execute('SELECT value FROM params WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                value = np.frombuffer(row[0], dtype=float)
+                self.put(key, value, write_to_disk=False)
+                self.disk_hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, key, value, write_to_disk=True):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+        if (self.db is not None) and write_to_disk:
+            self.db.execute('INSERT OR REPLACE INTO params VALUES (?, ?)', (key, value.tobytes()))
+
+    def commit(self):
+        if self.db is not None:
+            self.db.commit()
+
+    def print_statistics(self):
+        n_requests = self.hits + self.disk_hits + self.misses
+        logger.info(form.get_log_step('Power cache: ' + str(self.hits) + ' hits, ' + str(self.disk_hits)
+                                      + ' disk hits, ' + str(self.misses) + ' misses for ' + str(n_requests)
+                                      + ' requested states', 0))
+
+
+##
+# Boat that answers power requests from a PowerCache and forwards only the uncached states to the wrapped boat. All
+# other attributes and functions are taken from the wrapped boat.
+
+class CachedBoat:
+    def __init__(self, boat, cache):
+        self.boat = boat
+        self.cache = cache
+
+    def __getattr__(self, name):
+        # only called for attributes that are not found on CachedBoat; 'boat' and special methods must not be delegated
+        # as they are looked up before __init__ has run, e.g. by copy and pickle
+        if name == 'boat' or (name.startswith('__') and name.endswith('__')):
+            raise AttributeError(name)
+        return getattr(self.boat, name)
+
+    def get_fuel_per_time_netCDF(self, courses, lats, lons, time, unique_coords=False):
+        courses = np.asarray(courses, dtype=float)
+        time = np.asarray(time)
+        lats, lons = get_coords_per_course(courses, lats, lons, unique_coords)
+
+        param_names = ShipParams.get_param_names()
+        keys = self.cache.get_keys(courses, lats, lons, time, np.full(courses.shape, self.boat.speed))
+        values = np.zeros((len(param_names), courses.shape[0]))
+
+        # states that are requested several times within the same batch are only sent once
+        missing = {}
+        for i, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                values[:, i] = cached
+
+        if missing:
+            idxs = np.array([i[0] for i in missing.values()])
+            ship_params = self.boat.get_fuel_per_time_netCDF(courses[idxs], lats[idxs], lons[idxs], time[idxs])
+            new_values = np.vstack([np.broadcast_to(getattr(ship_params, name), idxs.shape) for name in param_names])
+            for icol, (key, positions) in enumerate(missing.items()):
+                values[:, positions] = new_values[:, icol:icol + 1]
+                self.cache.put(key, new_values[:, icol].copy())
+            self.cache.commit()
+
+        return ShipParams(**{name: values[iname] for iname, name in enumerate(param_names)})
+
+    def get_fuel_per_time_netCDF_2D(self, courses, lats, lons, time):
+        return get_fuel_per_time_2D(self, courses, lats, lons, time)
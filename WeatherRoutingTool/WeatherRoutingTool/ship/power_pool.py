@@ -0,0 +1,104 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.ship.shipparams import ShipParams, get_coords_per_course, get_fuel_per_time_2D
+
+logger = logging.getLogger('WRT.ship')
+
+##
+# Parallel execution of power requests.
+#
+# The courses of a request are split into chunks which are evaluated by a persistent pool of worker processes. Every
+# worker initialises its own boat once at startup (e.g. reading the environmental data) and keeps it for all following
+# requests. The ship parameters returned by the workers are merged in the original order of the courses.
+
+worker_boat = None  # boat of the current worker process
+
+
+def init_worker(get_boat, args):
+    global worker_boat
+    worker_boat = get_boat(*args)
+
+
+def get_params_for_chunk(speed, courses, lats, lons, time):
+    worker_boat.set_boat_speed(speed)
+    ship_params = worker_boat.get_fuel_per_time_netCDF(courses, lats, lons, time)
+    return {name: np.broadcast_to(getattr(ship_params, name), courses.shape) for name in
+            ShipParams.get_param_names()}
+
+
+class ParallelBoat:
+    """
+    Boat that distributes power requests over a pool of worker processes. All other attributes and functions are
+    taken from the wrapped boat.
+
+    Parameters
+    ----------
+    boat : Boat
+        Boat of the main process. Requests with less than min_chunk_size courses per worker are evaluated by this boat.
+    n_workers : int
+        Number of worker processes.
+    get_boat : callable
+        Function that returns the boat of a worker process when called with args. Needs to be picklable.
+    args : tuple
+        Arguments for get_boat.
+    min_chunk_size : int
+        Minimum number of courses per chunk.
+    """
+
+    def __init__(self, boat, n_workers, get_boat, args=(), min_chunk_size=10):
+        self.boat = boat
+        self.n_workers = n_workers
+        self.get_boat = get_boat
+        self.args = args
+        self.min_chunk_size = min_chunk_size
+        self.pool = None
+
+    def __getattr__(self, name):
+        # only called for attributes that are not found on ParallelBoat; 'boat' and special methods must not be
+        # delegated as they are looked up before __init__ has run, e.g. by copy and pickle
+        if name == 'boat' or (name.startswith('__') and name.endswith('__')):
+            raise AttributeError(name)
+        return getattr(self.boat, name)
+
+    def __getstate__(self):
+        # the pool of worker processes can not be copied, copies start their own pool when needed
+        state = self.__dict__.copy()
+        state['pool'] = None
+        return state
+
+    def get_pool(self):
+        if self.pool is None:
+            logger.info(form.get_log_step('Starting pool of ' + str(self.n_workers) + ' workers for power requests', 0))
+            self.pool = ProcessPoolExecutor(max_workers=self.n_workers, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=init_worker, initargs=(self.get_boat, self.args))
+        return self.pool
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def get_fuel_per_time_netCDF(self, courses, lats, lons, time, unique_coords=False):
+        courses = np.asarray(courses, dtype=float)
+        time = np.asarray(time)
+        lats, lons = get_coords_per_course(courses, lats, lons, unique_coords)
+
+        n_chunks = min(self.n_workers, courses.shape[0] // self.min_chunk_size)
+        if n_chunks < 2:
+            return self.boat.get_fuel_per_time_netCDF(courses, lats, lons, time)
+
+        pool = self.get_pool()
+        futures = [pool.submit(get_params_for_chunk, self.boat.speed, courses[chunk], lats[chunk], lons[chunk],
+                               time[chunk]) for chunk in np.array_split(np.arange(courses.shape[0]), n_chunks)]
+        results = [future.result() for future in futures]
+
+        return ShipParams(**{name: np.concatenate([result[name] for result in results]) for name in
+                             ShipParams.get_param_names()})
+
+    def get_fuel_per_time_netCDF_2D(self, courses, lats, lons, time):
+        return get_fuel_per_time_2D(self, courses, lats, lons, time)
@@ -1,11 +1,14 @@
+import importlib.metadata
 import logging
 import math
+import os
 import sys
+import tempfile
+import weakref
 
 import datetime
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import xarray as xr
 from scipy.interpolate import RegularGridInterpolator
 from geovectorslib import geod
@@ -15,7 +18,7 @@ import WeatherRoutingTool.utils.formatting as form
 import WeatherRoutingTool.utils.unit_conversion as units
 from mariPower import __main__
 from WeatherRoutingTool.utils.unit_conversion import knots_to_mps  # Convert  knot value in meter per second
-from WeatherRoutingTool.ship.shipparams import ShipParams
+from WeatherRoutingTool.ship.shipparams import ShipParams, get_fuel_per_time_2D
 from WeatherRoutingTool.weather import WeatherCond
 
 logger = logging.getLogger('WRT.ship')
@@ -25,6 +28,13 @@ logger = logging.getLogger('WRT.ship')
 # Tanker: implements interface to mariPower package which is used for power estimation.
 # SailingBoat: implements sailing boat as originally done in wind-router package. Deprecated. ToDo: can be deleted?
 
+def get_mariPower_version():
+    try:
+        return importlib.metadata.version('mariPower')
+    except importlib.metadata.PackageNotFoundError:
+        return str(getattr(mariPower, '__version__', 'unknown'))
+
+
 class Boat:
     speed: float  # boat speed in m/s
     simple_fuel_model: xr.Dataset  # xarray dataset containing
@@ -41,6 +51,16 @@ class Boat:
     def boat_speed_function(self, wind=None):
         pass
 
+    def get_fuel_per_time_netCDF_2D(self, courses, lats, lons, time):
+        return get_fuel_per_time_2D(self, courses, lats, lons, time)
+
+    def get_ship_id(self):
+        """
+        Return an identifier of the power model and the ship, e.g. for the on-disk tier of the power cache. Boats that
+        return the same ship parameters share the identifier.
+        """
+        return type(self).__name__
+
 
 ##
 # Class implementing connection to mariPower package.
@@ -53,13 +73,19 @@ class Boat:
 #       -> Tanker.write_netCDF_courses
 # 3) The WRT sends the paths to the 'EnvData netCDF' and the 'courses netCDF' to mariPower and requests the power
 # calculation.
-#       -> Tanker.get_fuel_netCDF_loop
+#       -> Tanker.get_fuel_netCDF
 # 4) The mariPower package writes the results for the power estimation to the 'courses netCDF'.
 # 5) The WRT extracts the power from the 'courses netCDF'.
 #       -> Tanker.extract_fuel_from_netCDF
 #
-# Steps 1), 3), and 5) are combined in the function
+# Steps 2), 3), and 5) are combined in the function
 #       -> Tanker.get_fuel_per_time_netCDF
+# or, for requests of several courses per space-time point that are passed as 2D arrays, in the function
+#       -> Tanker.get_fuel_per_time_netCDF_2D
+#
+# For versions of mariPower that accept only one course per space-time point, set Tanker.single_course_requests to
+# True (config: BOAT_SINGLE_COURSE_REQUESTS). In this case, one request is sent per course (see
+# Tanker.get_fuel_netCDF_per_course).
 #
 #
 # Functions that are named something like *simple_fuel* are meant to be used as placeholders for the mariPower
@@ -80,10 +106,15 @@ class Tanker(Boat):
     def __init__(self, rpm):
         Boat.__init__(self)
         self.rpm = rpm
+        self.single_course_requests = False
 
     def print_init(self):
         logger.info(form.get_log_step('Boat speed' + str(self.speed), 1))
 
+    def get_ship_id(self):
+        # Tanker and TankerInMemory differ only in the exchange of the courses
+        return 'mariPower-' + get_mariPower_version() + '-' + type(self.hydro_model).__name__
+
     def init_hydro_model_single_pars(self):
         self.hydro_model = mariPower.ship.CBT()
         # shipSpeed = 13 * 1852 / 3600
@@ -185,6 +216,23 @@ class Tanker(Boat):
 
         return ptemp
 
+    ##
+    # initiate estimation of power consumption in mariPower for one environmental state relative to the ship as
+    # defined for the surrogate model (see ship.surrogate). The ship is heading north s.t. the relative angles
+    # correspond to the absolute directions of wind, waves and currents.
+    def get_params_per_state(self, state):
+        self.hydro_model.WindDirection = math.radians(state['wind_angle'])
+        self.hydro_model.WindSpeed = state['wind_speed']
+        self.hydro_model.WaveDirection = math.radians(state['wave_angle'])
+        self.hydro_model.WaveSignificantHeight = state['wave_height']
+        self.hydro_model.WavePeakPeriod = state['wave_period']
+        self.hydro_model.CurrentDirection = math.radians(state['current_angle'])
+        self.hydro_model.CurrentSpeed = state['current_speed']
+
+        Fx, driftAngle, ptemp, n, delta = self.hydro_model.IterateMotion(0, state['speed'], aUseHeading=True,
+                                                                         aUpdateCalmwaterResistanceEveryIteration=False)
+        return {'power': ptemp, 'rpm': n}
+
     ##
     # initialisation of simple fuel model that is used as dummy for accurate power estimation via mariPower
     def calibrate_simple_fuel(self):
@@ -251,17 +299,36 @@ class Tanker(Boat):
         return P
 
     ##
-    # Writes netCDF which stores courses in dependence on latitude, longitude and time for further processing by
-    # mariPower.
+    # Returns xarray dataset which stores courses in dependence on latitude, longitude and time for further processing
+    # by mariPower.
     # Several courses can be provided per space point. In this case, the arrays lats and lons need to be filled
     # e.g. power estimation is requested for 3 courses (c1, c2, c3) for 1 space-time point (lat1, lon1) then:
     #   courses = {c1, c2, c3}
     #   lats = {lat1, lat1, lat1}
     #   lons = {lon1, lon1, lon1}
+    def get_netCDF_courses(self, courses, lats, lons, time, unique_coords=False):
+        if unique_coords:
+            it = sorted(np.unique(lons, return_index=True)[1])
+            lons = lons[it]
+            lats = lats[it]
+        # number or coordinate pairs
+        n_coords = lons.shape[0]
+        n_courses = int(courses.shape[0] / n_coords)  # number of courses per coordinate pair
 
-    def write_netCDF_courses(self, courses, lats, lons, time, unique_coords=False):
+        assert courses.shape[0] == n_coords * n_courses
+
+        # courses are sorted by coordinate pair, thus the iterators it_pos and it_course correspond to the rows and
+        # columns of the reshaped arrays
+        time_reshape = time.reshape(n_coords, n_courses)[:, 0]
+        return self.get_netCDF_courses_2D(courses.reshape(n_coords, n_courses), lats, lons, time_reshape)
+
+    ##
+    # Returns xarray dataset for the courses of shape (n_coords, n_courses), i.e. n_courses courses per space-time
+    # point. lats, lons and time contain one entry per space-time point.
+    def get_netCDF_courses_2D(self, courses, lats, lons, time):
         debug = False
-        speed = np.repeat(self.speed, courses.shape, axis=0)
+        n_coords, n_courses = courses.shape
+        speed = np.repeat(self.speed, courses.size, axis=0).reshape(courses.shape)
         courses = units.degree_to_pmpi(courses)
 
         # ToDo: use logger.debug and args.debug
@@ -277,50 +344,17 @@ class Tanker(Boat):
             form.print_step(lons_str, 1)
             form.print_step(course_str, 1)
             form.print_step(speed_str, 1)
-        n_coords = None
-        if unique_coords:
-            it = sorted(np.unique(lons, return_index=True)[1])
-            lons = lons[it]
-            lats = lats[it]
-            n_coords = lons.shape[0]
-        else:
-            n_coords = lons.shape[0]
-        # number or coordinate pairs
-        n_courses = int(courses.shape[0] / n_coords)  # number of courses per coordinate pair
-
-        # generate iterator for courses and coordinate pairs
-        it_course = np.arange(n_courses) + 1  # get iterator with a length of the number of unique longitude values
-        it_course = np.hstack(
-            (it_course,) * n_coords)  # prepare iterator for Data Frame: repeat each element as often as
-        it_pos = np.arange(n_coords) + 1
-        it_pos = np.repeat(it_pos, n_courses)  # np.hstack((it_pos,) * n_courses)
-
-        if (debug):
-            form.print_step('it_course=' + str(it_course))
-            form.print_step('it_pos=' + str(it_pos))
-
-        assert courses.shape == it_pos.shape
-        assert courses.shape == it_course.shape
-        assert courses.shape == speed.shape
 
-        # generate pandas DataFrame
-        df = pd.DataFrame({'it_pos': it_pos, 'it_course': it_course, 'courses': courses, 'speed': speed, })
-
-        df = df.set_index(['it_pos', 'it_course'])
-        # ToDo: use logger.debug and args.debug
-        if (debug):
-            print('pandas DataFrame:', df)
-
-        ds = df.to_xarray()
-
-        time_reshape = time.reshape(ds['it_pos'].shape[0], ds['it_course'].shape[0])[:, 0]
+        coords = dict(it_pos=(['it_pos'], np.arange(n_coords) + 1), it_course=(['it_course'], np.arange(n_courses) + 1))
+        data_vars = dict(courses=(['it_pos', 'it_course'], courses), speed=(['it_pos', 'it_course'], speed))
+        ds = xr.Dataset(data_vars, coords)
 
         logger.info('Request power calculation for ' + str(n_courses) + ' courses and ' + str(n_coords) +
                     ' coordinates')
 
         ds["lon"] = (['it_pos'], lons)
         ds["lat"] = (['it_pos'], lats)
-        ds["time"] = (['it_pos'], time_reshape)
+        ds["time"] = (['it_pos'], time)
         assert ds['lon'].shape == ds['lat'].shape
         assert ds['time'].shape == ds['lat'].shape
 
@@ -328,6 +362,15 @@ class Tanker(Boat):
         if (debug):
             print('xarray DataSet', ds)
 
+        return ds
+
+    ##
+    # Writes netCDF which stores courses in dependence on latitude, longitude and time for further processing by
+    # mariPower (see Tanker.get_netCDF_courses).
+    def write_netCDF_courses(self, courses, lats, lons, time, unique_coords=False):
+        debug = False
+        ds = self.get_netCDF_courses(courses, lats, lons, time, unique_coords)
+
         ds.to_netcdf(self.courses_path + str())
         if (debug):
             ds_read = xr.open_dataset(self.courses_path)
@@ -335,24 +378,29 @@ class Tanker(Boat):
         ds.close()
 
     ##
-    # extracts power from 'courses netCDF' which has been written by mariPower and returns it as 1D array.
-    def extract_params_from_netCDF(self, ds):
+    # extracts power from 'courses netCDF' which has been written by mariPower and returns it as 1D array. If flatten
+    # is False, the ship parameters are returned as 2D arrays of shape (n_coords, n_courses).
+    def extract_params_from_netCDF(self, ds, flatten=True):
         debug = False
         if (debug):
             form.print_step('Dataset with ship parameters:' + str(ds), 1)
 
-        power = ds['Power_brake'].to_numpy().flatten()
-        rpm = ds['RotationRate'].to_numpy().flatten()
-        fuel = ds['Fuel_consumption_rate'].to_numpy().flatten() * 1000 * 1 / 3600  # mariPower provides
-        r_wind = ds['Wind_resistance'].to_numpy().flatten()
-        r_calm = ds['Calm_resistance'].to_numpy().flatten()
-        r_waves = ds['Wave_resistance'].to_numpy().flatten()
-        r_shallow = ds['Shallow_water_resistance'].to_numpy().flatten()
-        r_roughness = ds['Hull_roughness_resistance'].to_numpy().flatten()
+        def get_param(name):
+            param = ds[name].to_numpy()
+            return param.flatten() if flatten else param
+
+        power = get_param('Power_brake')
+        rpm = get_param('RotationRate')
+        fuel = get_param('Fuel_consumption_rate') * 1000 * 1 / 3600  # mariPower provides
+        r_wind = get_param('Wind_resistance')
+        r_calm = get_param('Calm_resistance')
+        r_waves = get_param('Wave_resistance')
+        r_shallow = get_param('Shallow_water_resistance')
+        r_roughness = get_param('Hull_roughness_resistance')
 
         # fuel_consumption_rate [t/h] -> convert to kg/s
 
-        ship_params = ShipParams(fuel=fuel, power=power, rpm=rpm, speed=np.repeat(self.speed, power.shape, axis=0),
+        ship_params = ShipParams(fuel=fuel, power=power, rpm=rpm, speed=np.full(power.shape, self.speed),
                                  r_wind=r_wind, r_calm=r_calm, r_waves=r_waves, r_shallow=r_shallow,
                                  r_roughness=r_roughness)
 
@@ -388,7 +436,6 @@ class Tanker(Boat):
     ##
     # Passes paths for 'courses netCDF' and 'environmental data netCDF' to mariPower and request estimation of power
     # consumption.
-    # Is not yet working as explained for Tanker.get_fuel_netCDF_loop
     #
     def get_fuel_netCDF(self):
         ship = mariPower.ship.CBT()
@@ -403,74 +450,55 @@ class Tanker(Boat):
         return ds_read
 
     ##
-    # @brief splits data in 'courses netCDF' one bunches per course per space point, sends them to mariPower
-    # separately and merges them again afterwards.
+    # @brief compatibility shim for versions of mariPower that can only handle requests with 1 course per space point.
     #
-    # mariPower can currently handle only requests with 1 course per space point. Thus, the data in the 'course
-    # netCDF' is split in
-    # several bunchs each one containing an xarray with only one course per space point. The bunches are send to
-    # mariPower separately
-    # and the returned data sets are merged into one. Will (hopefully) be redundant as soon as mariPower accepts
-    # requests with several
-    # courses per space-time point and will then be replaced by Tanker.get_fuel_netCDF()
-    def get_fuel_netCDF_loop(self):
-        debug = False
-        filename_single = '/home/kdemmich/MariData/Code/MariGeoRoute/Isochrone/CoursesRouteSingle.nc'
-        # filename_single = 'C:/Users/Maneesha/Documents/GitHub/MariGeoRoute/WeatherRoutingTool/CoursesRouteSingle.nc'
-        ds = xr.load_dataset(self.courses_path)
-        n_vars = ds['it'].shape[0]
-        ds_merged = xr.Dataset()
+    # The courses dataset is split in bunches each containing only one course per space point. The bunches are sent
+    # to mariPower separately and the returned datasets are merged into one in a single concatenation.
+    def get_fuel_netCDF_per_course(self, ds_courses):
+        ds_per_course = []
+        for icourse in range(0, ds_courses['it_course'].shape[0]):
+            ds_single = ds_courses.isel(it_course=[icourse]).assign_coords(it_course=[1])
+            ds_single.to_netcdf(self.courses_path, mode='w')
+            ds = self.get_fuel_netCDF()
+            ds_per_course.append(ds.load().assign_coords(it_course=[icourse + 1]))
+            ds.close()
+
+        ds_merged = xr.concat(ds_per_course, dim='it_course', data_vars='minimal', coords='minimal',
+                              compat='override')
+        return ds_merged
 
-        if (debug):
-            form.print_line()
-            form.print_step('get_fuel_netCDF_loop: loop over all variants per space point', 0)
-            form.print_step('original dataset: ' + str(ds), 0)
-
-        for ivar in range(1, n_vars + 1):
-            ds_read_temp = ds.isel(it=[ivar - 1])
-            ds_read_temp.coords['it'] = [1]
-            ds_read_temp.to_netcdf(filename_single, mode='w')
-            ds_read_temp.close()
-            ship = mariPower.ship.CBT()
-            if (debug):
-                ds_read_test = xr.load_dataset(filename_single)
-                courses_test = ds_read_test['courses']
-                form.print_step('courses_test' + str(courses_test.to_numpy()), 1)
-                form.print_step('speed' + str(ds_read_test['speed'].to_numpy()), 1)
-            # start_time = time.time()
-            mariPower.__main__.PredictPowerOrSpeedRoute(ship, filename_single, self.environment_path, None, False,
-                                                        False)
-            # form.print_current_time('time for mariPower request:', start_time)
-
-            ds_temp = xr.load_dataset(filename_single)
-            ds_temp.coords['it'] = [ivar]
-            if ivar == 1:
-                ds_merged = ds_temp.copy()
-            else:
-                ds_merged = xr.concat([ds_merged, ds_temp], dim="it")
-            if (debug):
-                form.print_step('step ' + str(ivar) + ': merged dataset:' + str(ds_merged), 1)
-        ds_merged['lon'] = ds_merged['lon'].sel(it=1).drop('it')
-        ds_merged['time'] = ds_merged['time'].sel(it=1).drop('it')
+    ##
+    # sends the courses dataset to mariPower and returns the dataset with the ship parameters
+    def get_fuel_from_dataset(self, ds_courses):
+        if self.single_course_requests:
+            return self.get_fuel_netCDF_per_course(ds_courses)
 
-        if (debug):
-            form.print_step('final merged dataset:' + str(ds_merged))
-        ds.close()
-        return ds_merged
+        ds_courses.to_netcdf(self.courses_path)
+        ds_courses.close()
+        return self.get_fuel_netCDF()
 
     ##
     # main function for communication with mariPower package (see documentation above)
     def get_fuel_per_time_netCDF(self, courses, lats, lons, time, unique_coords=False):
-        self.write_netCDF_courses(courses, lats, lons, time, unique_coords)
-
-        # ds = self.get_fuel_netCDF_loop()
-        # ds = self.get_fuel_netCDF_dummy(ds, courses, wind)
-        ds = self.get_fuel_netCDF()
+        ds_courses = self.get_netCDF_courses(courses, lats, lons, time, unique_coords)
+        ds = self.get_fuel_from_dataset(ds_courses)
         ship_params = self.extract_params_from_netCDF(ds)
         ds.close()
 
         return ship_params
 
+    ##
+    # request of the ship parameters for courses of shape (n_coords, n_courses), i.e. n_courses courses per
+    # space-time point, in one batch. lats, lons and time contain one entry per space-time point. The ship parameters
+    # are returned as 2D arrays of the same shape as courses.
+    def get_fuel_per_time_netCDF_2D(self, courses, lats, lons, time):
+        ds_courses = self.get_netCDF_courses_2D(courses, lats, lons, time)
+        ds = self.get_fuel_from_dataset(ds_courses)
+        ship_params = self.extract_params_from_netCDF(ds, flatten=False)
+        ds.close()
+
+        return ship_params
+
     ##
     # ToDo: deprecated?
     def boat_speed_function(self, wind=None):
@@ -537,3 +565,45 @@ class Tanker(Boat):
         plt.xlabel('speed (m/s)')
         plt.ylabel('power (W)')
         plt.show()
+
+
+##
+# Tanker that keeps the courses dataset in memory instead of using COURSES_FILE as intermediate storage.
+#
+# The courses and the results of the power estimation are passed as xarray datasets. As mariPower only accepts paths
+# to netCDF files, the dataset is handed over via a file that is private to the instance and placed in shared
+# memory (if available). Thus, no data is written to disk and several routing processes on the same host do not
+# overwrite each other's courses.
+
+class TankerInMemory(Tanker):
+    shm_dir = '/dev/shm'  # directory in shared memory used for the exchange with mariPower
+
+    def __init__(self, rpm):
+        Tanker.__init__(self, rpm)
+        self.finalizer = None
+
+    def init_hydro_model_Route(self, filepath_env, filepath_courses, filepath_depth):
+        Tanker.init_hydro_model_Route(self, filepath_env, None, filepath_depth)
+
+        exchange_dir = self.shm_dir if os.path.isdir(self.shm_dir) else None
+        fd, self.courses_path = tempfile.mkstemp(suffix='.nc', prefix='wrt_courses_', dir=exchange_dir)
+        os.close(fd)
+        self.finalizer = weakref.finalize(self, remove_exchange_file, self.courses_path)
+        logger.info('Exchanging courses with mariPower via ' + self.courses_path)
+
+    def set_courses_path(self, path):
+        logger.warning('TankerInMemory does not use a courses file. Ignoring path ' + str(path))
+
+    ##
+    # same as Tanker.get_fuel_netCDF but the returned dataset is fully loaded into memory
+    def get_fuel_netCDF(self):
+        ship = mariPower.ship.CBT()
+
+        mariPower.__main__.PredictPowerOrSpeedRoute(ship, self.courses_path, self.environment_path)
+        ds_read = xr.load_dataset(self.courses_path)
+        return ds_read
+
+
+def remove_exchange_file(path):
+    if os.path.exists(path):
+        os.remove(path)
@@ -0,0 +1,66 @@
+import copy
+import logging
+
+import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.ship.power_cache import CachedBoat, PowerCache
+from WeatherRoutingTool.ship.power_pool import ParallelBoat
+from WeatherRoutingTool.ship.ship import Tanker, TankerInMemory
+from WeatherRoutingTool.ship.surrogate import SurrogatePowerTable, SurrogateTanker
+
+logger = logging.getLogger('WRT.ship')
+
+
+class ShipFactory:
+
+    @classmethod
+    def get_ship(cls, config):
+        ship = None
+
+        if config.BOAT_TYPE == 'tanker':
+            logger.info(form.get_log_step('Exchanging courses with mariPower via ' + config.COURSES_FILE, 0))
+            ship = Tanker(-99)
+
+        if config.BOAT_TYPE == 'tanker_in_memory':
+            ship = TankerInMemory(-99)
+
+        if config.BOAT_TYPE == 'surrogate':
+            if config.BOAT_SURROGATE_TABLE is None:
+                raise ValueError('To use the surrogate model, you need to provide the path to the surrogate table '
+                                 'via BOAT_SURROGATE_TABLE.')
+            logger.info(form.get_log_step('Reading surrogate table from ' + config.BOAT_SURROGATE_TABLE, 0))
+            ship = SurrogateTanker(SurrogatePowerTable.from_file(config.BOAT_SURROGATE_TABLE))
+
+        if ship is None:
+            raise ValueError('Boat type ' + str(config.BOAT_TYPE) + ' is not available. Supported options are '
+                             '\'tanker\', \'tanker_in_memory\' and \'surrogate\'.')
+
+        if config.BOAT_SINGLE_COURSE_REQUESTS:
+            if config.BOAT_TYPE == 'surrogate':
+                raise ValueError('BOAT_SINGLE_COURSE_REQUESTS is only available for mariPower (BOAT_TYPE \'tanker\' '
+                                 'or \'tanker_in_memory\').')
+            logger.info(form.get_log_step('Sending one request to mariPower per course', 0))
+            ship.single_course_requests = True
+
+        ship.init_hydro_model_Route(config.WEATHER_DATA, config.COURSES_FILE, config.DEPTH_DATA)
+        ship.set_boat_speed(config.BOAT_SPEED)
+
+        if config.BOAT_N_WORKERS > 1:
+            ship = ParallelBoat(ship, config.BOAT_N_WORKERS, ShipFactory.get_ship, (cls.get_worker_config(config),))
+
+        if config.BOAT_POWER_CACHE:
+            logger.info(form.get_log_step('Caching ship parameters for quantised states', 0))
+            ship = CachedBoat(ship, PowerCache.from_config(config, ship))
+        return ship
+
+    ##
+    # configuration of the boats of the worker processes: the courses are kept in memory s.t. the workers do not share
+    # COURSES_FILE, caching is done by the main process. All other options (e.g. BOAT_SINGLE_COURSE_REQUESTS) are
+    # taken from the configuration of the main process.
+    @classmethod
+    def get_worker_config(cls, config):
+        worker_config = copy.copy(config)
+        if worker_config.BOAT_TYPE == 'tanker':
+            worker_config.BOAT_TYPE = 'tanker_in_memory'
+        worker_config.BOAT_N_WORKERS = 1
+        worker_config.BOAT_POWER_CACHE = False
+        return worker_config
@@ -2,19 +2,35 @@ import logging
 
 import numpy as np
 
+from WeatherRoutingTool.utils.step_buffer import StepArray, get_steps, repeat_steps, reserve_steps, take_steps
+
 logger = logging.getLogger('WRT.ship')
 
 
+def get_coords_per_course(courses, lats, lons, unique_coords=False):
+    """
+    Return one latitude and longitude per course. If unique_coords is True, lats and lons are expected to contain the
+    coordinate pairs as for Tanker.get_netCDF_courses, i.e. the courses are sorted by coordinate pair.
+    """
+    if unique_coords:
+        it = sorted(np.unique(lons, return_index=True)[1])
+        n_courses = int(courses.shape[0] / len(it))
+        lats = np.repeat(lats[it], n_courses)
+        lons = np.repeat(lons[it], n_courses)
+    return np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)
+
+
 class ShipParams():
-    fuel: np.ndarray  # (kg)
-    power: np.ndarray  # (W)
-    rpm: np.ndarray  # (Hz)
-    speed: np.ndarray  # (m/s)
-    r_calm: np.ndarray  # (N)
-    r_wind: np.ndarray  # (N)
-    r_waves: np.ndarray  # (N)
-    r_shallow: np.ndarray  # (N)
-    r_roughness: np.ndarray  # (N)
+    # 2D arrays are kept in preallocated step buffers, see utils.step_buffer
+    fuel = StepArray()  # (kg)
+    power = StepArray()  # (W)
+    rpm = StepArray()  # (Hz)
+    speed = StepArray()  # (m/s)
+    r_calm = StepArray()  # (N)
+    r_wind = StepArray()  # (N)
+    r_waves = StepArray()  # (N)
+    r_shallow = StepArray()  # (N)
+    r_roughness = StepArray()  # (N)
     fuel_type: str
 
     def __init__(self, fuel, power, rpm, speed, r_calm, r_wind, r_waves, r_shallow, r_roughness):
@@ -72,15 +88,16 @@ class ShipParams():
         logger.info('r_roughness: ', self.r_roughness.shape)
 
     def define_variants(self, variant_segments):
-        self.speed = np.repeat(self.speed, variant_segments + 1, axis=1)
-        self.fuel = np.repeat(self.fuel, variant_segments + 1, axis=1)
-        self.power = np.repeat(self.power, variant_segments + 1, axis=1)
-        self.rpm = np.repeat(self.rpm, variant_segments + 1, axis=1)
-        self.r_calm = np.repeat(self.r_calm, variant_segments + 1, axis=1)
-        self.r_wind = np.repeat(self.r_wind, variant_segments + 1, axis=1)
-        self.r_waves = np.repeat(self.r_waves, variant_segments + 1, axis=1)
-        self.r_shallow = np.repeat(self.r_shallow, variant_segments + 1, axis=1)
-        self.r_roughness = np.repeat(self.r_roughness, variant_segments + 1, axis=1)
+        for name in self.get_param_names():
+            repeat_steps(self, name, variant_segments + 1)
+
+    def reserve_steps(self, nsteps, nvariants):
+        for name in self.get_param_names():
+            reserve_steps(self, name, nsteps, nvariants)
+
+    @classmethod
+    def get_param_names(cls):
+        return ['fuel', 'power', 'rpm', 'speed', 'r_calm', 'r_wind', 'r_waves', 'r_shallow', 'r_roughness']
 
     def get_power(self):
         return self.power
@@ -140,15 +157,12 @@ class ShipParams():
         self.r_roughness = new_rroughnes
 
     def select(self, idxs):
-        self.speed = self.speed[:, idxs]
-        self.fuel = self.fuel[:, idxs]
-        self.power = self.power[:, idxs]
-        self.rpm = self.rpm[:, idxs]
-        self.r_wind = self.r_wind[:, idxs]
-        self.r_calm = self.r_calm[:, idxs]
-        self.r_waves = self.r_waves[:, idxs]
-        self.r_shallow = self.r_shallow[:, idxs]
-        self.r_roughness = self.r_roughness[:, idxs]
+        if np.ndim(idxs) == 0:
+            for name in self.get_param_names():
+                setattr(self, name, get_steps(self, name, idxs))
+        else:
+            for name in self.get_param_names():
+                take_steps(self, name, idxs)
 
     def flip(self):
         # should be replaced by more careful implementation
@@ -230,15 +244,15 @@ class ShipParams():
 
     def get_reduced_2D_object(self, idx):
         try:
-            speed = self.speed[:, idx]
-            fuel = self.fuel[:, idx]
-            power = self.power[:, idx]
-            rpm = self.rpm[:, idx]
-            r_wind = self.r_wind[:, idx]
-            r_calm = self.r_calm[:, idx]
-            r_waves = self.r_waves[:, idx]
-            r_shallow = self.r_shallow[:, idx]
-            r_roughness = self.r_roughness[:, idx]
+            speed = get_steps(self, 'speed', idx)
+            fuel = get_steps(self, 'fuel', idx)
+            power = get_steps(self, 'power', idx)
+            rpm = get_steps(self, 'rpm', idx)
+            r_wind = get_steps(self, 'r_wind', idx)
+            r_calm = get_steps(self, 'r_calm', idx)
+            r_waves = get_steps(self, 'r_waves', idx)
+            r_shallow = get_steps(self, 'r_shallow', idx)
+            r_roughness = get_steps(self, 'r_roughness', idx)
         except ValueError:
             raise ValueError(
                 'Index ' + str(idx) + ' is not available for array with length ' + str(self.speed.shape[0]))
@@ -246,3 +260,15 @@ class ShipParams():
         sp = ShipParams(fuel=fuel, power=power, rpm=rpm, speed=speed, r_wind=r_wind, r_calm=r_calm, r_waves=r_waves,
                         r_shallow=r_shallow, r_roughness=r_roughness)
         return sp
+
+
+def get_fuel_per_time_2D(boat, courses, lats, lons, time):
+    """
+    Request the ship parameters for courses of shape (n_coords, n_courses) from a boat that expects one entry of lats,
+    lons and time per course. Returns the ship parameters as 2D arrays of the same shape as courses.
+    """
+    n_courses = courses.shape[1]
+    ship_params = boat.get_fuel_per_time_netCDF(courses.flatten(), np.repeat(lats, n_courses),
+                                                np.repeat(lons, n_courses), np.repeat(time, n_courses))
+    return ShipParams(**{name: np.reshape(getattr(ship_params, name), courses.shape) for name in
+                         ShipParams.get_param_names()})
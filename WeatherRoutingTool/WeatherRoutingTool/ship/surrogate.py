@@ -0,0 +1,260 @@
+import itertools
+import json
+import logging
+
+import numpy as np
+import xarray as xr
+from scipy.interpolate import RegularGridInterpolator
+
+import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.ship.ship import Boat
+from WeatherRoutingTool.ship.shipparams import ShipParams, get_coords_per_course
+from WeatherRoutingTool.utils.field_sampler import FieldSampler
+
+logger = logging.getLogger('WRT.ship')
+
+##
+# Surrogate model for the power estimation of mariPower.
+#
+# The power model is sampled on a regular grid over the environmental state relative to the ship, i.e.:
+#   - wind_angle, wave_angle, current_angle: direction of wind, waves and current relative to the course of the ship
+#       (degrees, from 0° to 180°). Port and starboard are assumed to be symmetric. Wind and waves are defined by the
+#       direction they are coming from, currents by the direction they are flowing to.
+#   - wind_speed, current_speed (m/s), wave_height (m), wave_period (s), speed (boat speed, m/s)
+# The sampled ship parameters are stored as compressed numpy archive. SurrogateTanker reads the archive and
+# estimates the ship parameters for an arbitrary number of courses via multilinear interpolation on the grid.
+
+SURROGATE_AXES = ['wind_angle', 'wind_speed', 'wave_angle', 'wave_height', 'wave_period', 'current_angle',
+                  'current_speed', 'speed']
+
+DEFAULT_SURROGATE_GRID = {
+    'wind_angle': np.linspace(0, 180, 7),
+    'wind_speed': np.linspace(0, 30, 7),
+    'wave_angle': np.linspace(0, 180, 7),
+    'wave_height': np.linspace(0, 8, 5),
+    'wave_period': np.linspace(2, 16, 4),
+    'current_angle': np.linspace(0, 180, 5),
+    'current_speed': np.linspace(0, 2, 3),
+    'speed': np.linspace(4, 10, 4)
+}
+
+
+def read_surrogate_grid(filepath):
+    """
+    Return the grid for SurrogatePowerTable.generate from the json file filepath. The file maps axis names (see
+    SURROGATE_AXES) either to lists of grid points or to {"start": ..., "stop": ..., "num": ...} for evenly spaced
+    grid points. Axes that are not provided are taken from DEFAULT_SURROGATE_GRID.
+    """
+    with open(filepath) as f:
+        grid_file = json.load(f)
+
+    unknown_axes = [axis for axis in grid_file if axis not in SURROGATE_AXES]
+    if unknown_axes:
+        raise ValueError('Surrogate grid contains unknown axes ' + str(unknown_axes) + '. Supported axes: '
+                         + str(SURROGATE_AXES))
+
+    grid = dict(DEFAULT_SURROGATE_GRID)
+    for axis, points in grid_file.items():
+        if isinstance(points, dict):
+            grid[axis] = np.linspace(points['start'], points['stop'], points['num'])
+        else:
+            grid[axis] = np.asarray(points, dtype=float)
+    return grid
+
+
+def get_relative_angle(direction, course):
+    """
+    Return the angle between direction and course (degrees) mapped to the range from 0° to 180°.
+    """
+    return np.abs((direction - course + 180) % 360 - 180)
+
+
+class SurrogatePowerTable:
+    """
+    Lookup table of ship parameters (e.g. power, rpm) on a regular grid of environmental states.
+
+    Parameters
+    ----------
+    axes : dict
+        Mapping of the axis names (see SURROGATE_AXES) to monotonically increasing 1D arrays of grid points.
+    values : dict
+        Mapping of the names of the ship parameters to arrays of shape (len(axis_1), ..., len(axis_n)).
+    """
+
+    def __init__(self, axes, values):
+        missing_axes = [axis for axis in SURROGATE_AXES if axis not in axes]
+        if missing_axes:
+            raise ValueError('Surrogate table is missing the axes ' + str(missing_axes))
+
+        self.axes = {axis: np.asarray(axes[axis], dtype=float) for axis in SURROGATE_AXES}
+        self.values = values
+        grid_points = tuple(self.axes.values())
+        self.interpolators = {}
+        for param, table in values.items():
+            self.interpolators[param] = RegularGridInterpolator(grid_points, table, method='linear')
+
+    @property
+    def shape(self):
+        return tuple(axis.shape[0] for axis in self.axes.values())
+
+    @classmethod
+    def generate(cls, power_function, grid=None):
+        """
+        Sample power_function on every point of grid. power_function receives a dictionary with one value per axis
+        and returns a dictionary of ship parameters, see Tanker.get_params_per_state.
+        """
+        if grid is None:
+            grid = DEFAULT_SURROGATE_GRID
+        axes = {axis: np.asarray(grid[axis], dtype=float) for axis in SURROGATE_AXES}
+        shape = tuple(axis.shape[0] for axis in axes.values())
+        logger.info(form.get_log_step('Sampling power model on grid of shape ' + str(shape) + ' ('
+                                      + str(np.prod(shape)) + ' points)', 0))
+
+        values = {}
+        for idx in itertools.product(*[range(n) for n in shape]):
+            state = {axis: axes[axis][i] for axis, i in zip(SURROGATE_AXES, idx)}
+            params = power_function(state)
+            for param, value in params.items():
+                if param not in values:
+                    values[param] = np.full(shape, np.nan, dtype=np.float32)
+                values[param][idx] = value
+
+        return cls(axes, values)
+
+    @classmethod
+    def from_file(cls, filepath):
+        with np.load(filepath) as archive:
+            axes = {axis: archive['axis_' + axis] for axis in SURROGATE_AXES}
+            values = {key[len('param_'):]: archive[key] for key in archive.files if key.startswith('param_')}
+        return cls(axes, values)
+
+    def write_to_file(self, filepath):
+        arrays = {'axis_' + axis: points for axis, points in self.axes.items()}
+        arrays.update({'param_' + param: table.astype(np.float32) for param, table in self.values.items()})
+        np.savez_compressed(filepath, **arrays)
+        logger.info(form.get_log_step('Surrogate table written to ' + str(filepath), 0))
+
+    def interpolate(self, state):
+        """
+        Return the interpolated ship parameters for the environmental states in state, which maps every axis to a 1D
+        array. States outside of the grid are clipped to its boundaries.
+        """
+        points = np.column_stack([np.clip(state[axis], grid[0], grid[-1]) for axis, grid in self.axes.items()])
+        return {param: interpolator(points) for param, interpolator in self.interpolators.items()}
+
+    def get_holdout_error(self, power_function, n_samples=100, seed=None):
+        """
+        Compare the surrogate to power_function for n_samples random states within the grid. Returns the mean and
+        maximum relative deviation per ship parameter.
+        """
+        rng = np.random.default_rng(seed)
+        state = {axis: rng.uniform(grid[0], grid[-1], n_samples) for axis, grid in self.axes.items()}
+        estimate = self.interpolate(state)
+
+        reference = {param: np.zeros(n_samples) for param in self.values}
+        for isample in range(0, n_samples):
+            params = power_function({axis: values[isample] for axis, values in state.items()})
+            for param in self.values:
+                reference[param][isample] = params[param]
+
+        errors = {}
+        for param in self.values:
+            deviation = np.abs(estimate[param] - reference[param]) / np.maximum(np.abs(reference[param]), 1e-9)
+            errors[param] = {'mean': np.nanmean(deviation), 'max': np.nanmax(deviation)}
+            logger.info(form.get_log_step('holdout error ' + param + ': mean = ' + str(errors[param]['mean'])
+                                          + ', max = ' + str(errors[param]['max']), 1))
+        return errors
+
+
+##
+# Boat that estimates the ship parameters from a SurrogatePowerTable instead of requesting them from mariPower.
+# The environmental data is read from the weather file and sampled at all positions of a routing step in a single
+# interpolation. Resistances are not part of the surrogate table and are set to NaN, as is the rpm if the table does not
+# provide it. If the table does not provide the fuel consumption, it is estimated from the power via a constant
+# specific fuel consumption.
+
+class SurrogateTanker(Boat):
+    table: SurrogatePowerTable
+    environment_path: str  # path to netCDF for environmental data
+    env_sampler: FieldSampler  # environmental variables used for the interpolation
+    specific_fuel_consumption = 180  # (g/kWh)
+
+    def __init__(self, table):
+        Boat.__init__(self)
+        self.table = table
+        self.env_sampler = None
+
+    def init_hydro_model_Route(self, filepath_env, filepath_courses, filepath_depth):
+        self.environment_path = filepath_env
+        self.depth_path = filepath_depth
+        self.read_env_data(filepath_env)
+
+    def read_env_data(self, filepath_env):
+        ds = xr.open_dataset(filepath_env)
+        wave_dir = np.radians(ds['VMDR'])
+        env_data = xr.Dataset({
+            'u_wind': ds['u-component_of_wind_height_above_ground'].sel(height_above_ground2=10, drop=True),
+            'v_wind': ds['v-component_of_wind_height_above_ground'].sel(height_above_ground2=10, drop=True),
+            'u_current': ds['utotal'],
+            'v_current': ds['vtotal'],
+            # wave directions are interpolated as components to avoid artefacts at 0°/360°
+            'sin_wave_dir': np.sin(wave_dir),
+            'cos_wave_dir': np.cos(wave_dir),
+            'wave_height': ds['VHM0'],
+            'wave_period': ds['VTPK']
+        })
+        self.env_sampler = FieldSampler.from_dataset(env_data, list(env_data.data_vars))
+        ds.close()
+
+    def set_boat_speed(self, speed):
+        self.speed = speed
+
+    def get_ship_id(self):
+        # the surrogate table is identified as input file of the power cache
+        return 'surrogate'
+
+    def get_env_state(self, courses, lats, lons, time):
+        env = self.env_sampler.sample(lats, lons, time)
+        env = {var: np.nan_to_num(values) for var, values in env.items()}
+
+        wind_dir = np.degrees(np.arctan2(env['u_wind'], env['v_wind'])) + 180  # direction the wind is coming from
+        current_dir = np.degrees(np.arctan2(env['u_current'], env['v_current']))  # direction the current flows to
+        wave_dir = np.degrees(np.arctan2(env['sin_wave_dir'], env['cos_wave_dir']))
+
+        state = {
+            'wind_angle': get_relative_angle(wind_dir, courses),
+            'wind_speed': np.sqrt(env['u_wind'] ** 2 + env['v_wind'] ** 2),
+            'wave_angle': get_relative_angle(wave_dir, courses),
+            'wave_height': env['wave_height'],
+            'wave_period': env['wave_period'],
+            'current_angle': get_relative_angle(current_dir, courses),
+            'current_speed': np.sqrt(env['u_current'] ** 2 + env['v_current'] ** 2),
+            'speed': np.full(courses.shape, self.speed, dtype=float)
+        }
+        return state
+
+    ##
+    # same interface as Tanker.get_fuel_per_time_netCDF: one entry of courses and time per requested course, lats and
+    # lons either per course or per coordinate pair (unique_coords=True)
+    def get_fuel_per_time_netCDF(self, courses, lats, lons, time, unique_coords=False):
+        courses = np.asarray(courses, dtype=float)
+        lats, lons = get_coords_per_course(courses, lats, lons, unique_coords)
+
+        state = self.get_env_state(courses, lats, lons, np.asarray(time))
+        params = self.table.interpolate(state)
+
+        power = params['power']
+        missing = np.full(power.shape, np.nan)  # parameters that are not part of the table
+        if 'fuel' in params:
+            fuel = params['fuel']
+        else:
+            fuel = power / 1000 * self.specific_fuel_consumption / 1000 / 3600  # W -> kg/s
+        rpm = params['rpm'] if 'rpm' in params else missing
+
+        ship_params = ShipParams(fuel=fuel, power=power, rpm=rpm, speed=state['speed'], r_wind=missing,
+                                 r_calm=missing, r_waves=missing, r_shallow=missing, r_roughness=missing)
+        return ship_params
+
+    def boat_speed_function(self, wind=None):
+        speed = np.array([self.speed])
+        return speed
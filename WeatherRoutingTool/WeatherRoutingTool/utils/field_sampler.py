@@ -0,0 +1,160 @@
+import numpy as np
+
+
+class GridAxis:
+    """
+    Coordinate axis of a FieldSampler. Maps coordinates to the index of the lower neighbouring grid point and the
+    interpolation weight of the upper neighbour. Regular grids are handled by affine index arithmetic, irregular grids
+    by binary search.
+    """
+
+    def __init__(self, points):
+        self.points = np.asarray(points, dtype=float)
+        self.size = self.points.shape[0]
+        self.step = None
+
+        if self.size > 1:
+            steps = np.diff(self.points)
+            if np.any(steps <= 0):
+                raise ValueError('Coordinates of FieldSampler need to be strictly increasing')
+            if np.allclose(steps, steps[0], rtol=1e-6, atol=0):
+                self.step = steps[0]
+
+    def get_index(self, x):
+        """
+        Return the lower index, the weight of the upper neighbour and a mask of the coordinates that are within the
+        range of the axis.
+        """
+        x = np.asarray(x, dtype=float)
+        if self.size == 1:
+            return np.zeros(x.shape, dtype=int), np.zeros(x.shape), np.ones(x.shape, dtype=bool)
+
+        if self.step is not None:
+            pos = (x - self.points[0]) / self.step
+            inside = (pos >= -1e-9) & (pos <= self.size - 1 + 1e-9)
+            pos = np.clip(pos, 0, self.size - 1)
+            idx = np.minimum(np.floor(pos).astype(int), self.size - 2)
+            weight = pos - idx
+        else:
+            inside = (x >= self.points[0]) & (x <= self.points[-1])
+            idx = np.clip(np.searchsorted(self.points, x, side='right') - 1, 0, self.size - 2)
+            weight = (x - self.points[idx]) / (self.points[idx + 1] - self.points[idx])
+            weight = np.clip(weight, 0, 1)
+        return idx, weight, inside
+
+
+class FieldSampler:
+    """
+    Fast sampling of gridded (time, lat, lon) or (lat, lon) variables at scattered points.
+
+    The variables are copied once to a contiguous array. Queries for arbitrary numbers of points are answered for all
+    variables at once by (tri)linear interpolation. Grid points with missing values (NaN) only affect the result if
+    their interpolation weight is non-zero.
+
+    Parameters
+    ----------
+    data : dict
+        Mapping of variable names to arrays of shape (n_time, n_lat, n_lon) or, if times is None, (n_lat, n_lon).
+    lats, lons : np.ndarray
+        Coordinates of the grid. Decreasing coordinates are supported.
+    times : np.ndarray, optional
+        Time coordinates (datetime64).
+    fill_value : float, optional
+        Value returned for points outside of the grid. If None, the points are moved to the boundary of the grid.
+    """
+
+    def __init__(self, data, lats, lons, times=None, fill_value=np.nan):
+        self.variables = list(data.keys())
+        self.fill_value = fill_value
+        values = np.stack([np.asarray(data[var], dtype=float) for var in self.variables])
+        if times is None:
+            values = values[:, np.newaxis]
+            times = np.array(['1970-01-01'], dtype='datetime64[ns]')
+
+        lats = np.asarray(lats, dtype=float)
+        lons = np.asarray(lons, dtype=float)
+        times = np.asarray(times, dtype='datetime64[ns]')
+        if values.shape[1:] != (times.shape[0], lats.shape[0], lons.shape[0]):
+            raise ValueError('Shape of variables ' + str(values.shape[1:]) + ' does not match the coordinates ('
+                             + str(times.shape[0]) + ', ' + str(lats.shape[0]) + ', ' + str(lons.shape[0]) + ')')
+
+        if lats.shape[0] > 1 and lats[0] > lats[-1]:
+            lats = lats[::-1]
+            values = values[:, :, ::-1]
+        if lons.shape[0] > 1 and lons[0] > lons[-1]:
+            lons = lons[::-1]
+            values = values[:, :, :, ::-1]
+
+        self.time_origin = times[0]
+        self.axes = [GridAxis((times - self.time_origin) / np.timedelta64(1, 's')), GridAxis(lats), GridAxis(lons)]
+        self.values = np.ascontiguousarray(values)
+
+    @classmethod
+    def from_dataset(cls, ds, variables, sel=None, bbox=None, lat_name='latitude', lon_name='longitude',
+                     time_name='time', fill_value=np.nan):
+        """
+        Initialise the sampler from the variables of an xarray dataset. sel is passed to Dataset.sel, e.g. to select
+        a height level. If bbox = (lat_min, lon_min, lat_max, lon_max) is provided, only the grid points within the
+        bounding box (plus one grid point on each side) are loaded.
+        """
+        if sel is not None:
+            ds = ds.sel(**sel)
+        if bbox is not None:
+            lat_min, lon_min, lat_max, lon_max = bbox
+            ds = ds.isel({lat_name: get_index_range(ds[lat_name].to_numpy(), lat_min, lat_max),
+                          lon_name: get_index_range(ds[lon_name].to_numpy(), lon_min, lon_max)})
+
+        has_time = time_name in ds[variables[0]].dims
+        dims = (time_name, lat_name, lon_name) if has_time else (lat_name, lon_name)
+        data = {}
+        for var in variables:
+            if set(ds[var].dims) != set(dims):
+                raise ValueError('Variable ' + var + ' has dimensions ' + str(ds[var].dims) + ' but FieldSampler '
+                                 'requires ' + str(dims))
+            data[var] = ds[var].transpose(*dims).to_numpy()
+
+        times = ds[time_name].to_numpy() if has_time else None
+        return cls(data, ds[lat_name].to_numpy(), ds[lon_name].to_numpy(), times, fill_value)
+
+    def sample(self, lats, lons, time=None, variables=None):
+        """
+        Return a dictionary with one array of sampled values per variable. time can be a single time stamp or one
+        time stamp per point.
+        """
+        if variables is None:
+            variables = self.variables
+        ivars = [self.variables.index(var) for var in variables]
+        lats = np.asarray(lats, dtype=float)
+        if time is None:
+            time = self.time_origin
+        time = np.broadcast_to((np.asarray(time, dtype='datetime64[ns]') - self.time_origin) / np.timedelta64(1, 's'),
+                               lats.shape)
+
+        indices = [axis.get_index(x) for axis, x in zip(self.axes, (time, lats, np.asarray(lons, dtype=float)))]
+        inside = indices[0][2] & indices[1][2] & indices[2][2]
+
+        values = self.values[ivars]
+        result = np.zeros((len(ivars),) + lats.shape)
+        for corner in np.ndindex(2, 2, 2):
+            weight = np.ones(lats.shape)
+            grid_idx = []
+            for (idx, w, _), axis, upper in zip(indices, self.axes, corner):
+                weight = weight * (w if upper else 1 - w)
+                grid_idx.append(np.minimum(idx + upper, axis.size - 1))
+            contribution = values[:, grid_idx[0], grid_idx[1], grid_idx[2]]
+            result += np.where(weight > 0, weight * contribution, 0)
+
+        if self.fill_value is not None:
+            result[:, ~inside] = self.fill_value
+        return {var: result[ivar] for ivar, var in enumerate(variables)}
+
+
+def get_index_range(points, lower, upper):
+    """
+    Return the slice of indices of points that covers the range from lower to upper including one additional point on
+    each side. If no point is within the range, all points are selected.
+    """
+    idxs = np.where((points >= lower) & (points <= upper))[0]
+    if idxs.shape[0] == 0:
+        return slice(0, points.shape[0])
+    return slice(max(idxs[0] - 1, 0), min(idxs[-1] + 2, points.shape[0]))
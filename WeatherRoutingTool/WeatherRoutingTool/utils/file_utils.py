@@ -0,0 +1,22 @@
+import hashlib
+import os
+
+
+def get_file_hash(filepath, chunk_size=2 ** 20):
+    """
+    Return the sha256 hash of the content of a file.
+    """
+    sha = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def get_file_identity(filepath):
+    """
+    Return a cheap identifier of a file (absolute path, size and time of the last modification) which, unlike
+    get_file_hash, does not require reading the file.
+    """
+    stat = os.stat(filepath)
+    return os.path.abspath(filepath) + ':' + str(stat.st_size) + ':' + str(stat.st_mtime_ns)
@@ -0,0 +1,216 @@
+import numpy as np
+
+
+class StepBuffer:
+    """
+    Storage for per-step arrays of shape (M,N), whereby M corresponds to the number of routing steps and N to the
+    number of variants. In accordance with the *_per_step arrays of IsoBased, the most recent routing step is found in
+    the first row.
+
+    The variants are stored as a tree: every routing step (level of the tree) only holds the values that have been
+    added in this step together with the index of the parent node in the previous step. The N columns point to nodes
+    of the most recent step. Thus, branching out and pruning of variants only modify these N indices while the full
+    (M,N) array is rebuilt by following the parent indices only if it is requested. The nodes of all steps are written
+    to preallocated buffers whose capacity is doubled if they are full.
+    """
+
+    def __init__(self, array, capacity=0):
+        array = np.asarray(array)
+        if array.ndim != 2:
+            raise ValueError('StepBuffer requires a 2D array, got array of shape ' + str(array.shape))
+
+        self.values = np.empty(max(capacity, array.size), dtype=array.dtype)
+        self.parents = np.empty(self.values.shape[0], dtype=int)
+        self.offsets = []  # index of the first node of every step (oldest step first)
+        self.nnodes = 0
+        self.cols = np.arange(array.shape[1])  # nodes of the most recent step that correspond to the N columns
+        self.cached_array = None
+
+        for row in array[::-1]:
+            self.add_step(row)
+
+    @property
+    def capacity(self):
+        return self.values.shape[0]
+
+    @property
+    def nsteps(self):
+        return len(self.offsets)
+
+    @property
+    def shape(self):
+        return (self.nsteps, self.cols.shape[0])
+
+    @property
+    def array(self):
+        if self.cached_array is None:
+            self.cached_array = self.rebuild(self.cols)
+        return self.cached_array
+
+    def reserve(self, capacity, dtype=None):
+        if dtype is None:
+            dtype = self.values.dtype
+        if (capacity <= self.capacity) and (dtype == self.values.dtype):
+            return
+
+        capacity = max(capacity, self.capacity)
+        values = np.empty(capacity, dtype=dtype)
+        values[:self.nnodes] = self.values[:self.nnodes]
+        parents = np.empty(capacity, dtype=int)
+        parents[:self.nnodes] = self.parents[:self.nnodes]
+        self.values = values
+        self.parents = parents
+
+    def add_step(self, row):
+        nnodes = self.nnodes + self.cols.shape[0]
+        dtype = np.result_type(self.values.dtype, row.dtype)
+        if nnodes > self.capacity:
+            self.reserve(max(2 * self.capacity, nnodes), dtype)
+        else:
+            self.reserve(self.capacity, dtype)
+
+        self.values[self.nnodes:nnodes] = row
+        self.parents[self.nnodes:nnodes] = self.cols
+        self.offsets.append(self.nnodes)
+        self.nnodes = nnodes
+        self.cols = np.arange(self.cols.shape[0])
+        self.cached_array = None
+
+    def prepend(self, rows):
+        rows = np.atleast_2d(rows)
+        if rows.shape[1] != self.cols.shape[0]:
+            raise ValueError('Number of variants not matching: step buffer has ' + str(self.cols.shape[0]) +
+                             ' columns, new step has ' + str(rows.shape[1]))
+
+        for row in rows[::-1]:
+            self.add_step(row)
+
+    def take(self, idxs):
+        """
+        Select (and possibly repeat) the columns idxs, e.g. for branching out or pruning of variants.
+        """
+        self.cols = self.cols[np.asarray(idxs, dtype=int)]
+        self.cached_array = None
+
+    def iter_steps(self, cols):
+        nodes = cols
+        for offset in reversed(self.offsets):
+            nodes = offset + nodes
+            yield nodes
+            nodes = self.parents[nodes]
+
+    def rebuild(self, cols):
+        array = np.empty((self.nsteps,) + np.shape(cols), dtype=self.values.dtype)
+        for istep, nodes in enumerate(self.iter_steps(cols)):
+            array[istep] = self.values[nodes]
+        return array
+
+    def get_columns(self, idxs):
+        """
+        Rebuild the full history only for the columns idxs. Returns a 1D array if idxs is a scalar.
+        """
+        return self.rebuild(self.cols[np.asarray(idxs)])
+
+    def get_step(self, istep):
+        if self.cached_array is not None:
+            return self.cached_array[istep]
+        if (istep < 0) or (istep >= self.nsteps):
+            raise IndexError('Step ' + str(istep) + ' is not available for step buffer with ' + str(self.nsteps) +
+                             ' steps')
+
+        for jstep, nodes in enumerate(self.iter_steps(self.cols)):
+            if jstep == istep:
+                return self.values[nodes]
+
+
+class StepArray:
+    """
+    Descriptor for per-step attributes. 2D arrays that are assigned to the attribute are copied to a StepBuffer,
+    reading the attribute returns the (M,N) array that is rebuilt from the buffer. All other values are stored as they
+    are.
+    """
+
+    def __set_name__(self, owner, name):
+        self.name = '_' + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.name)
+        if isinstance(value, StepBuffer):
+            return value.array
+        return value
+
+    def __set__(self, obj, value):
+        if isinstance(value, np.ndarray) and (value.ndim == 2):
+            old_buffer = obj.__dict__.get(self.name)
+            capacity = old_buffer.capacity if isinstance(old_buffer, StepBuffer) else 0
+            value = StepBuffer(value, capacity)
+        obj.__dict__[self.name] = value
+
+
+def get_step_buffer(obj, name):
+    buffer = obj.__dict__.get('_' + name)
+    if isinstance(buffer, StepBuffer):
+        return buffer
+    return None
+
+
+def get_step(obj, name, istep):
+    """
+    Return row istep of the per-step attribute 'name' of obj without rebuilding the full (M,N) array.
+    """
+    buffer = get_step_buffer(obj, name)
+    if buffer is None:
+        return getattr(obj, name)[istep]
+    return buffer.get_step(istep)
+
+
+def get_steps(obj, name, idxs):
+    """
+    Return the columns idxs of the per-step attribute 'name' of obj, i.e. the full history of the selected variants.
+    """
+    buffer = get_step_buffer(obj, name)
+    if buffer is None:
+        return getattr(obj, name)[:, idxs]
+    return buffer.get_columns(idxs)
+
+
+def get_step_shape(obj, name):
+    buffer = get_step_buffer(obj, name)
+    if buffer is None:
+        return getattr(obj, name).shape
+    return buffer.shape
+
+
+def prepend_step(obj, name, rows):
+    """
+    Write the values of a new routing step to the first row of the per-step attribute 'name' of obj.
+    """
+    buffer = get_step_buffer(obj, name)
+    if buffer is None:
+        setattr(obj, name, np.vstack((rows, getattr(obj, name))))
+    else:
+        buffer.prepend(rows)
+
+
+def take_steps(obj, name, idxs):
+    buffer = get_step_buffer(obj, name)
+    if buffer is None:
+        setattr(obj, name, getattr(obj, name)[:, idxs])
+    else:
+        buffer.take(idxs)
+
+
+def repeat_steps(obj, name, repeats):
+    buffer = get_step_buffer(obj, name)
+    if buffer is None:
+        setattr(obj, name, np.repeat(getattr(obj, name), repeats, axis=1))
+    else:
+        buffer.take(np.repeat(np.arange(buffer.shape[1]), repeats))
+
+
+def reserve_steps(obj, name, nsteps, nvariants):
+    buffer = get_step_buffer(obj, name)
+    if buffer is not None:
+        buffer.reserve(nsteps * nvariants)
@@ -13,6 +13,7 @@ from scipy.interpolate import RegularGridInterpolator
 import WeatherRoutingTool.utils.graphics as graphics
 import WeatherRoutingTool.utils.formatting as form
 from maridatadownloader import DownloaderFactory
+from WeatherRoutingTool.utils.field_sampler import FieldSampler
 from WeatherRoutingTool.utils.maps import Map
 from WeatherRoutingTool.utils.unit_conversion import (check_dataset_spacetime_consistency, convert_nptd64_to_ints,
                                                       round_time)
@@ -52,6 +53,7 @@ class WeatherCond:
 
         time_passed = self.time_end - self.time_start
         self.time_steps = int(time_passed.total_seconds() / self.time_res.total_seconds())
+        self.field_samplers = {}
 
         logger.info(form.get_log_step('forecast from ' + str(self.time_start) + ' to ' + str(self.time_end), 1))
         logger.info(form.get_log_step('nof time steps ' + str(self.time_steps), 1))
@@ -104,6 +106,31 @@ class WeatherCond:
     def set_map_size(self, map):
         self.map_size = map
 
+    def get_field_sampler(self, variables):
+        """
+        Return a FieldSampler for the (time, latitude, longitude) variables of the dataset. Wind is taken at 10 m above
+        ground. Only the requested variables are loaded to memory (restricted to the map if it is set); the sampler is
+        kept for following requests of the same variables.
+        """
+        key = tuple(variables)
+        if key not in self.field_samplers:
+            ds = self.ds[list(variables)]
+            sel = None
+            if 'height_above_ground2' in ds.dims:
+                sel = {'height_above_ground2': 10}
+            bbox = None
+            if getattr(self, 'map_size', None) is not None:
+                bbox = (self.map_size.lat1, self.map_size.lon1, self.map_size.lat2, self.map_size.lon2)
+            self.field_samplers[key] = FieldSampler.from_dataset(ds, list(variables), sel=sel, bbox=bbox)
+        return self.field_samplers[key]
+
+    def get_weather_at_points(self, lats, lons, time, variables):
+        """
+        Return a dictionary with the values of the weather variables at the points (lats, lons, time). Points outside
+        of the data are set to NaN.
+        """
+        return self.get_field_sampler(variables).sample(lats, lons, time)
+
     def get_map_size(self):
         return self.map_size
 
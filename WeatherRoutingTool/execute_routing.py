@@ -4,7 +4,7 @@ from datetime import datetime
 
 import WeatherRoutingTool.utils.graphics as graphics
 from WeatherRoutingTool.config import Config, set_up_logging
-from WeatherRoutingTool.ship.ship import Tanker
+from WeatherRoutingTool.ship.ship_factory import ShipFactory
 from WeatherRoutingTool.weather_factory import WeatherFactory
 from WeatherRoutingTool.constraints.constraints import *
 from WeatherRoutingTool.algorithms.routingalg_factory import *
@@ -53,7 +53,6 @@ if __name__ == "__main__":
     # basic settings
     windfile = config.WEATHER_DATA
     depthfile = config.DEPTH_DATA
-    coursesfile = config.COURSES_FILE
     routepath = config.ROUTE_PATH
     time_resolution = config.DELTA_TIME_FORECAST
     time_forecast = config.TIME_FORECAST
@@ -77,9 +76,7 @@ if __name__ == "__main__":
 
     # *******************************************
     # initialise boat
-    boat = Tanker(-99)
-    boat.init_hydro_model_Route(windfile, coursesfile, depthfile)
-    boat.set_boat_speed(config.BOAT_SPEED)
+    boat = ShipFactory.get_ship(config)
 
     # *******************************************
     # initialise constraints
@@ -102,9 +99,7 @@ if __name__ == "__main__":
     constraint_list.print_settings()'''
 
     water_depth = WaterDepth(config.DATA_MODE, config.BOAT_DRAUGHT, default_map, depthfile)
-    constraint_list = ConstraintsListFactory.get_constraints_list(
-        constraints_string_list=config.CONSTRAINTS_LIST, data_mode=config.DATA_MODE, boat_draught=config.BOAT_DRAUGHT,
-        map_size=default_map, depthfile=depthfile, waypoints=config.INTERMEDIATE_WAYPOINTS)
+    constraint_list = ConstraintsListFactory.get_constraints_list_from_config(config)
 
     # *******************************************
     # initialise route
@@ -114,6 +109,10 @@ if __name__ == "__main__":
     # *******************************************
     # routing
     min_fuel_route = min_fuel_route.execute_routing(boat, wt, constraint_list)
+    if config.BOAT_POWER_CACHE:
+        boat.cache.print_statistics()
+    if config.BOAT_N_WORKERS > 1:
+        boat.close()
     # min_fuel_route.print_route()
     # min_fuel_route.write_to_file(str(min_fuel_route.route_type) +
     # "route.json")
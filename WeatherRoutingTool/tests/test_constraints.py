@@ -1,11 +1,17 @@
 import os
+import shutil
+from datetime import datetime
 
 import numpy as np
+import xarray as xr
 
 import tests.basic_test_func as basic_test_func
-from WeatherRoutingTool.constraints.constraints import (ConstraintsList, ConstraintPars, LandCrossing,
-                                                        RunTestContinuousChecks, WaterDepth, WaveHeight)
+from WeatherRoutingTool.constraints.constraints import (ConstraintsList, ConstraintPars, get_great_circle_points,
+                                                        LandCrossing,
+                                                        RasterisedConstraints, RunTestContinuousChecks, StayOnMap,
+                                                        WaterDepth, WaveHeight)
 from WeatherRoutingTool.utils.maps import Map
+from WeatherRoutingTool.weather import WeatherCondFromFile
 
 
 def generate_dummy_constraint_list():
@@ -140,6 +146,136 @@ def test_safe_waterdepth():
     assert is_constrained[1] == 0
 
 
+'''
+    test whether the rasterised constraints agree with the original constraints, whether points outside of the map are
+    checked and whether the raster is read from the cache
+'''
+
+
+def test_rasterised_constraints(tmp_path):
+    dirname = os.path.dirname(__file__)
+    depthfile = os.path.join(dirname, 'data/reduced_testdata_depth.nc')
+    map = Map(50, 0, 55, 5)
+    on_map = StayOnMap()
+    on_map.set_map(50, 0, 55, 5)
+    constraints = [LandCrossing(), WaterDepth("from_file", 20, map, depthfile), on_map]
+
+    constraint_list = generate_dummy_constraint_list()
+    for constr in constraints:
+        constraint_list.add_neg_constraint(constr)
+    constraint_list.rasterise_constraints(map, 1. / 120, str(tmp_path))
+    assert constraint_list.neg_dis_size == 1
+    raster = constraint_list.negative_constraints_discrete[0]
+
+    rng = np.random.default_rng(0)
+    lat = rng.uniform(50, 55, 1000)
+    lon = rng.uniform(0, 5, 1000)
+    is_constrained = raster.constraint_on_point(lat, lon, 0)
+    assert np.mean(is_constrained == raster.check_constraints(lat, lon, 0)) > 0.99
+    assert np.all(raster.constraint_on_point(np.array([49, 56]), np.array([2, 2]), 0))
+
+    raster_cached = RasterisedConstraints(constraints, map, 1. / 120, str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    assert np.array_equal(raster_cached.bitmap, raster.bitmap)
+
+    # the depth data is identified without reading the file, a modified file invalidates the cached raster
+    depthfile_copy = str(tmp_path / 'depth.nc')
+    shutil.copyfile(depthfile, depthfile_copy)
+    water_depth = WaterDepth("from_file", 20, map, depthfile_copy)
+    raster_id = water_depth.get_raster_id()
+    assert water_depth.get_raster_id() == raster_id
+    os.utime(depthfile_copy, ns=(0, 0))
+    assert water_depth.get_raster_id() != raster_id
+
+
+'''
+    test whether routing segments far away from rasterised constraints are skipped and whether the results agree with
+    the results of sampling all segments
+'''
+
+
+def test_safe_crossing_discrete_clearance(tmp_path):
+    map = Map(50, 0, 58, 8)
+    on_map = StayOnMap()
+    on_map.set_map(50, 0, 58, 8)
+    constraint_lists = []
+    for use_clearance in [True, False]:
+        constraint_list = generate_dummy_constraint_list()
+        constraint_list.pars.use_clearance = use_clearance
+        constraint_list.add_neg_constraint(LandCrossing())
+        constraint_list.add_neg_constraint(on_map)
+        constraint_list.rasterise_constraints(map, 1. / 120, str(tmp_path))
+        constraint_lists.append(constraint_list)
+
+    # open sea, close to the coast of the Netherlands, leaving the map
+    is_clear = constraint_lists[0].get_clear_segments(np.array([55.5, 52.9, 57.8]), np.array([3.5, 4.5, 4.]),
+                                                      np.array([55.7, 53.1, 58.1]), np.array([3.6, 4.5, 4.]))
+    assert np.array_equal(is_clear, [True, False, False])
+
+    rng = np.random.default_rng(0)
+    lat_start = rng.uniform(50, 58, 1000)
+    lon_start = rng.uniform(0, 8, 1000)
+    azimuth = rng.uniform(0, 2 * np.pi, 1000)
+    lat_end = lat_start + 0.5 * np.cos(azimuth)
+    lon_end = lon_start + 0.5 * np.sin(azimuth)
+    is_constrained = [constraint_list.safe_crossing_discrete(lat_start, lon_start, lat_end, lon_end, 0,
+                                                             np.zeros(1000, dtype=bool)) for constraint_list in
+                      constraint_lists]
+    assert np.array_equal(is_constrained[0], is_constrained[1])
+
+
+'''
+    test whether the routing segments are sampled along the great circle and whether the number of samples adapts to
+    the length of the segments
+'''
+
+
+def test_safe_crossing_discrete_sampling():
+    lats, lons = get_great_circle_points(np.array([0, 50]), np.array([0, -30]), np.array([0, 50]), np.array([90, 30]),
+                                         np.array([[0.5, 0.5], [1, 1]]))
+    assert np.allclose(lats[0], [0, 53.99], atol=0.01)
+    assert np.allclose(lons[0], [45, 0])
+    assert np.array_equal(lats[1], [0, 50])
+    assert np.array_equal(lons[1], [90, 30])
+
+    constraint_list = generate_dummy_constraint_list()
+    constraint_list.add_neg_constraint(LandCrossing())
+    n_samples = constraint_list.get_number_of_samples(np.array([53.5, 53.5]), np.array([3.7, 3.7]),
+                                                      np.array([53.51, 55.456]), np.array([3.7, 3.7]))
+    assert n_samples[0] == 10
+    assert n_samples[1] == 235
+
+
+'''
+    test that the negative constraints are evaluated from the cheapest to the most expensive one, that pointwise
+    constraints only receive the candidates which have not been rejected before and that the first rejecting constraint
+    is recorded per candidate
+'''
+
+
+def test_safe_endpoint_cost_order():
+    class CountingLandCrossing(LandCrossing):
+        def constraint_on_point(self, lat, lon, time):
+            self.n_points = lat.shape[0]
+            return LandCrossing.constraint_on_point(self, lat, lon, time)
+
+    lat = np.array([52.7, 53.04, 56.5, 54.0])
+    lon = np.array([4.04, 5.66, 4.0, 4.0])
+    land_crossing = CountingLandCrossing()
+    on_map = StayOnMap()
+    on_map.set_map(50, 0, 55, 6)
+
+    constraint_list = generate_dummy_constraint_list()
+    constraint_list.add_neg_constraint(land_crossing)
+    constraint_list.add_neg_constraint(on_map)
+    assert constraint_list.negative_constraints_discrete == [on_map, land_crossing]
+
+    is_constrained = constraint_list.safe_endpoint(lat, lon, 0, [False, False, False, True])
+    assert list(is_constrained) == [False, True, True, True]
+    assert land_crossing.n_points == 2
+    assert list(constraint_list.rejected_by) == [None, 'LandCrossing', 'StayOnMap', None]
+
+
 '''
     test shape of is_constrained
 '''
@@ -207,3 +343,36 @@ def test_safe_crossing_continuous():
                                                               dummy_lats)
 
     assert np.array_equal(is_constrained_test, is_constrained)
+
+
+'''
+    test whether the wave height constraint samples the significant wave height of the weather data at the candidate
+    positions and times (one time per segment for the samples of a crossing)
+'''
+
+
+def test_wave_height_from_weather():
+    times = np.array(['2023-07-20T09:00', '2023-07-20T12:00'], dtype='datetime64[ns]')
+    lats = np.linspace(53, 56, 13)
+    lons = np.linspace(3, 7, 17)
+    vhm0 = np.stack([np.full((13, 17), 5.), np.full((13, 17), 5.)])
+    vhm0[1, :, 9:] = 15.
+    wt = WeatherCondFromFile(datetime(2023, 7, 20, 9), 3, 3)
+    wt.ds = xr.Dataset({'VHM0': (('time', 'latitude', 'longitude'), vhm0)},
+                       coords={'time': times, 'latitude': lats, 'longitude': lons})
+    wt.set_map_size(Map(54, 4, 55, 6))
+
+    wave_height = WaveHeight(wt)
+    constraint_list = generate_dummy_constraint_list()
+    constraint_list.add_neg_constraint(wave_height)
+
+    lat = np.array([54.5, 54.5, 54.5])
+    lon = np.array([4.5, 5.5, 5.5])
+    time = np.array([datetime(2023, 7, 20, 12), datetime(2023, 7, 20, 12), datetime(2023, 7, 20, 9)])
+    is_constrained = constraint_list.safe_endpoint(lat, lon, time, np.zeros(3, dtype=bool))
+    assert list(is_constrained) == [False, True, False]
+    assert list(wt.field_samplers.keys()) == [('VHM0',)]
+
+    is_constrained = constraint_list.safe_crossing_discrete(lat[1:], np.array([4.2, 4.2]), lat[1:], lon[1:],
+                                                            time[1:], np.zeros(2, dtype=bool))
+    assert list(is_constrained) == [True, False]
@@ -5,7 +5,9 @@ import pytest
 import sqlalchemy as db
 from shapely.geometry import LineString, Point, MultiPolygon, box, Polygon
 
-from WeatherRoutingTool.constraints.constraints import ContinuousCheck, SeamarkCrossing, LandPolygonsCrossing
+from WeatherRoutingTool.constraints.constraints import (ContinuousCheck, get_database_engine, LandPolygonsCrossing,
+                                                        LandPolygonsIntersection, SeamarkCrossing)
+from WeatherRoutingTool.constraints.layer_cache import ConstraintLayerCache
 from WeatherRoutingTool.utils.maps import Map
 
 # Create engine using SQLite
@@ -170,6 +172,26 @@ class TestContinuousCheck:
             ContinuousCheck().connect_database(), type(engine)
         ), "Engine Instantiation Error"
 
+    def test_database_engine_shared(self):
+        """
+        Test for checking if the engine is created only once per database
+        """
+        assert get_database_engine("sqlite:///gdfDB.sqlite") is get_database_engine("sqlite:///gdfDB.sqlite")
+
+    def test_queries_bbox_and_tags(self):
+        """
+        Test for checking if the default queries are restricted to the map and the seamark tags
+        """
+        check = SeamarkCrossing(Map(50, 0, 55, 5))
+        envelope = "ST_MakeEnvelope(-0.5, 49.5, 5.5, 55.5, 4326)"
+
+        assert "geom && " + envelope in check.query[0]
+        assert "linestring && " + envelope in check.query[1]
+        assert "geometry && " + envelope in check.query[2]
+        for query in check.query[0:2]:
+            assert "ARRAY['separation_zone', 'separation_line', 'restricted_area']" in query
+        assert "ST_MakeEnvelope" not in "".join(SeamarkCrossing().query)
+
     def test_query_nodes(self):
         check = SeamarkCrossing()
         gdf = check.query_nodes(engine=engine, query="SELECT *,geometry as geom FROM nodes")
@@ -415,6 +437,28 @@ class TestContinuousCheck:
         for i in range(len(check_list)):
             assert isinstance(check_list[i], bool)
 
+    def test_check_crossing_few_features(self):
+        """
+        Test for checking if the seamark check handles query results with fewer features than tags and without any
+        matching features
+        """
+        lat_start = numpy.array((54.192091, 40.5))
+        lon_start = numpy.array((6.3732417, -29.5))
+        lat_end = numpy.array((48.92595, 40.6))
+        lon_end = numpy.array((12.01631, -29.4))
+
+        query_ways = "SELECT *, geometry AS geom FROM ways WHERE tags LIKE '%no_seamark%'"
+        for query_nodes in ["SELECT *, geometry AS geom FROM nodes WHERE tags LIKE '%harbour%'",
+                            "SELECT *, geometry AS geom FROM nodes WHERE tags LIKE '%no_seamark%'"]:
+            seamark_crossing = SeamarkCrossing(Map(40, -30, 41, -29))
+            check_list = seamark_crossing.check_crossing(
+                lat_start=lat_start, lon_start=lon_start, lat_end=lat_end, lon_end=lon_end,
+                engine=engine, query=[query_nodes, query_ways], seamark_object=["nodes", "ways"],
+                seamark_list=["separation_zone", "separation_line", "restricted_area"])
+
+            assert check_list == [False, False]
+            assert len(seamark_crossing.tree) == 0
+
     def test_query_land_polygons(self):
         gdf = LandPolygonsCrossing(Map(0, 0, 0, 0)).query_land_polygons(
             engine=engine, query="SELECT *,geometry as geom from land_polygons")
@@ -441,6 +485,87 @@ class TestContinuousCheck:
         for i in range(len(check_list)):
             assert isinstance(check_list[i], bool)
 
+    def test_check_land_crossing_tree_reused(self):
+        """
+        Test for checking if all segments are evaluated correctly and if the spatial index is only built once
+        """
+        land_crossing = LandPolygonsCrossing(Map(0, 0, 0, 0))
+        query = "SELECT *,geometry as geom from land_polygons"
+        lat_start = numpy.array((50, 53, 50.5))
+        lon_start = numpy.array((3, 3, 5))
+        lat_end = numpy.array((50, 53, 50.6))
+        lon_end = numpy.array((5, 5, 5.1))
+
+        check_list = land_crossing.check_crossing(lat_start=lat_start, lon_start=lon_start, lat_end=lat_end,
+                                                  lon_end=lon_end, engine=engine, query=query)
+        tree = land_crossing.tree
+        check_list_reused = land_crossing.check_crossing(lat_start=lat_start, lon_start=lon_start, lat_end=lat_end,
+                                                         lon_end=lon_end, engine=engine, query=query)
+
+        assert check_list == [True, False, True]
+        assert check_list_reused == check_list
+        assert land_crossing.tree is tree
+
+    def test_check_land_intersection(self):
+        """
+        Test for checking if the exact land crossing agrees with the spatial index, if the land polygons are clipped to
+        the map and if the prepared geometry is reused
+        """
+        land_crossing = LandPolygonsIntersection(Map(48, 3, 50, 6), simplify_tolerance=0.01)
+        query = "SELECT *,geometry as geom from land_polygons"
+        lat_start = numpy.array((50, 53, 50.5, 49.0))
+        lon_start = numpy.array((3, 3, 5, 3.9))
+        lat_end = numpy.array((50, 53, 50.6, 49.0))
+        lon_end = numpy.array((5, 5, 5.1, 4.0))
+
+        check_list = land_crossing.check_crossing(lat_start=lat_start, lon_start=lon_start, lat_end=lat_end,
+                                                  lon_end=lon_end, engine=engine, query=query)
+        land_geometry = land_crossing.land_geometry
+        check_list_reused = land_crossing.check_crossing(lat_start=lat_start, lon_start=lon_start, lat_end=lat_end,
+                                                         lon_end=lon_end, engine=engine, query=query)
+
+        assert check_list == [True, False, True, False]
+        assert check_list_reused == check_list
+        assert land_crossing.land_geometry is land_geometry
+        assert land_geometry.bounds[2:] == (6 + land_crossing.bbox_buffer, 50 + land_crossing.bbox_buffer)
+
+    def test_layer_cache(self, tmp_path):
+        """
+        Test for checking if the layers are exported to tiles and if only the tiles within the map are read
+        """
+        cache = ConstraintLayerCache(str(tmp_path), tile_size=10)
+        cache.export(engine, {"ways": "SELECT *, geometry AS geom FROM ways",
+                              "land_polygons": "SELECT *, geometry AS geom FROM land_polygons"}, "2024-01-01 00:00:00")
+
+        assert cache.is_up_to_date("2024-01-01 00:00:00")
+        assert not cache.is_up_to_date("2024-02-01 00:00:00")
+        assert "ways_5_0.fgb" in cache.read_manifest()["tiles"]["ways"]
+
+        ways = SeamarkCrossing(Map(50, 0, 55, 8), str(tmp_path)).query_ways()
+        seamark_types = sorted([tags["seamark:type"] for tags in ways["tags"].apply(eval)])
+        assert seamark_types == ["separation_boundary", "separation_crossing"]
+
+        land_crossing = LandPolygonsCrossing(Map(48, 3, 52, 9), str(tmp_path))
+        check_list = land_crossing.check_crossing(numpy.array((50, 53)), numpy.array((3, 3)), numpy.array((50, 53)),
+                                                  numpy.array((5, 5)))
+        assert check_list == [True, False]
+
+    def test_layer_cache_without_seamarks(self, tmp_path):
+        """
+        Test for checking if the seamark check works offline for a map without any cached seamarks
+        """
+        cache = ConstraintLayerCache(str(tmp_path), tile_size=10)
+        cache.export(engine, {"nodes": "SELECT *, geometry AS geom FROM nodes",
+                              "ways": "SELECT *, geometry AS geom FROM ways"}, "2024-01-01 00:00:00")
+
+        seamark_crossing = SeamarkCrossing(Map(40, -30, 41, -29), str(tmp_path))
+        assert seamark_crossing.query_nodes().empty
+        assert seamark_crossing.query_ways().empty
+
+        check_list = seamark_crossing.check_crossing(numpy.array((40.5, 40.2)), numpy.array((-29.5, -29.8)),
+                                                     numpy.array((40.6, 40.9)), numpy.array((-29.4, -29.1)))
+        assert check_list == [False, False]
+
 
 # Closing engine
 engine.dispose()
@@ -0,0 +1,266 @@
+import copy
+from datetime import datetime
+
+import numpy as np
+import xarray as xr
+from pymoo.algorithms.moo.nsga2 import NSGA2
+from pymoo.core.population import Population
+from pymoo.optimize import minimize
+from pymoo.termination import get_termination
+from pymoo.util.running_metric import RunningMetric
+from skimage.graph import route_through_array
+
+import tests.basic_test_func as basic_test_func
+from WeatherRoutingTool.algorithms.data_utils import find_path, get_closest, get_closest_indices
+from WeatherRoutingTool.algorithms.genetic_history import GeneticHistory, read_history_log
+from WeatherRoutingTool.algorithms.genetic_pool import ParallelRoutingProblem
+from WeatherRoutingTool.algorithms.genetic_utils import (GeneticCrossover, get_crossover_candidates, GridBasedMutation,
+                                                         GridBasedPopulation, RouteDuplicateElimination,
+                                                         RoutingProblem)
+from WeatherRoutingTool.constraints.constraints import LandCrossing
+from WeatherRoutingTool.ship.shipparams import ShipParams
+
+
+class CountingBoat():
+    def __init__(self):
+        self.speed = 6
+        self.requested_courses = []
+
+    def boat_speed_function(self, wind=None):
+        return np.array([self.speed])
+
+    def get_fuel_per_time_netCDF(self, courses, lats, lons, time, unique_coords=False):
+        self.requested_courses.append(courses.copy())
+        power = 1000 * np.abs(courses) + lats
+        return ShipParams(fuel=power / 10, power=power, rpm=np.full(courses.shape, 2.),
+                          speed=np.full(courses.shape, 6.), r_calm=power, r_wind=power, r_waves=power,
+                          r_shallow=power, r_roughness=power)
+
+
+def get_dummy_problem():
+    constraint_list = basic_test_func.generate_dummy_constraint_list()
+    constraint_list.add_neg_constraint(LandCrossing())
+    return RoutingProblem(departure_time=datetime(2023, 7, 20, 10), boat=CountingBoat(),
+                          constraint_list=constraint_list)
+
+
+def get_dummy_population():
+    routes = [np.array([[54.0, 6.0], [54.5, 6.5], [55.0, 7.0]]),
+              np.array([[54.0, 6.0], [52.5, 6.0], [52.0, 7.0], [55.0, 7.0]]),
+              np.array([[54.0, 6.0], [55.0, 7.0]])]
+    X = np.full((len(routes), 1), None, dtype=object)
+    for iroute, route in enumerate(routes):
+        X[iroute, 0] = route
+    return X
+
+
+'''
+    test whether the batched evaluation of the population sends all legs in a single power request and returns the
+    same fuel consumption and number of constrained waypoints as the evaluation of the individual routes
+'''
+
+
+def test_routing_problem_batched_evaluation():
+    problem = get_dummy_problem()
+    boat = problem.boat
+
+    X = get_dummy_population()
+    out = {}
+    problem._evaluate(X, out)
+
+    assert len(boat.requested_courses) == 1
+    assert boat.requested_courses[0].shape == (6,)
+    assert out['F'].shape == (3, 1)
+    assert out['G'].shape == (3, 1)
+    for iroute in range(0, X.shape[0]):
+        fuel, _ = problem.get_power(X[iroute, 0])
+        assert np.isclose(out['F'][iroute, 0], fuel)
+        assert out['G'][iroute, 0] == problem.get_constraints(X[iroute, 0])
+    assert list(out['G'][:, 0]) == [0, 2, 0]
+
+
+'''
+    test whether the evaluation of the population by the worker processes returns the results in the original order of
+    the routes and whether the main process does not request the power model
+'''
+
+
+def test_parallel_routing_problem():
+    problem = get_dummy_problem()
+    parallel_problem = ParallelRoutingProblem(problem.departure_time, CountingBoat(), problem.constraint_list, 2,
+                                              get_dummy_problem, min_chunk_size=1)
+    X = get_dummy_population()
+    out = {}
+    out_ref = {}
+    try:
+        parallel_problem._evaluate(X, out)
+    finally:
+        parallel_problem.close()
+    problem._evaluate(X, out_ref)
+
+    assert np.array_equal(out['F'], out_ref['F'])
+    assert np.array_equal(out['G'], out_ref['G'])
+    assert len(parallel_problem.boat.requested_courses) == 0
+
+
+'''
+    test whether routes that agree after rounding are detected as duplicates within the population and with respect
+    to a second population, and whether known routes are answered by the fitness cache
+'''
+
+
+def test_route_duplicates_and_fitness_cache():
+    X = get_dummy_population()
+    X_dup = get_dummy_population()
+    X_dup[0, 0] = X_dup[0, 0] + 1e-9
+    X_dup[1, 0] = X_dup[1, 0][::-1]
+    pop = Population.new("X", np.concatenate((X, X_dup[:2])))
+    other = Population.new("X", X[2:])
+
+    is_duplicate = RouteDuplicateElimination()._do(pop, other, np.full(len(pop), False))
+    assert list(is_duplicate) == [False, False, True, True, False]
+
+    problem = get_dummy_problem()
+    out = {}
+    problem._evaluate(np.concatenate((X, X_dup)), out)
+    assert len(problem.boat.requested_courses) == 1
+    assert problem.boat.requested_courses[0].shape == (9,)
+    assert problem.cache_misses == 4
+
+    out_cached = {}
+    problem._evaluate(X, out_cached)
+    assert len(problem.boat.requested_courses) == 1
+    assert problem.cache_hits == 3
+    assert np.array_equal(out_cached['F'], out['F'][:3])
+
+
+'''
+    test whether the crossover candidates are the shared waypoints of both parents (indices of the first occurrence,
+    one entry per waypoint of the first parent) and whether the children are combined at the crossover point
+'''
+
+
+def test_crossover_candidates():
+    parent1 = np.array([[54.0, 6.0], [54.5, 6.5], [55.0, 6.5], [54.5, 6.5], [55.0, 7.0]])
+    parent2 = np.array([[54.0, 6.0], [54.0, 6.5], [54.5, 6.5], [55.0, 7.0]])
+    parent3 = np.array([[56.0, 6.0], [56.5, 6.5]])
+
+    candidates = get_crossover_candidates([parent1, parent1], [parent2, parent3])
+    assert list(candidates[0][0]) == [0, 1, 1, 4]
+    assert list(candidates[0][1]) == [0, 2, 2, 3]
+    assert candidates[1][0].shape[0] == 0
+
+    child1, child2 = GeneticCrossover().cross_over(parent1, parent2, (np.array([1]), np.array([2])))
+    assert np.array_equal(child1, np.concatenate((parent1[:1], parent2[2:])))
+    assert np.array_equal(child2, np.concatenate((parent2[:2], parent1[1:])))
+    child1, child2 = GeneticCrossover().cross_over(parent1, parent3)
+    assert child1 is parent1
+    assert child2 is parent3
+
+
+'''
+    test whether the paths on the cost pool agree with route_through_array and whether the path search is reused for
+    paths with the same start index and cost field
+'''
+
+
+def test_grid_mixin_cost_pool():
+    rng = np.random.default_rng(0)
+    cost = rng.uniform(1, 10, (20, 30))
+    cost[5:15, 10] = np.nan
+    grid = xr.DataArray(cost, coords={'latitude': np.linspace(54, 56, 20), 'longitude': np.linspace(3, 6, 30)},
+                        dims=['latitude', 'longitude'])
+    mutation = GridBasedMutation(grid, cost_pool_size=3)
+
+    cost_pool = mutation.get_cost_pool()
+    assert len(cost_pool) == 3
+    for start, end in [((0, 0), (19, 29)), ((10, 2), (10, 25)), ((0, 0), (12, 20))]:
+        path_ref, _ = route_through_array(cost_pool[1], start, end, fully_connected=True, geometric=False)
+        assert mutation.get_path(start, end, 1) == path_ref
+    assert list(mutation.mcp_cache.keys()) == [(1, (10, 2)), (1, (0, 0))]
+    assert mutation.get_cost_pool() is cost_pool
+    assert len(copy.deepcopy(mutation).mcp_cache) == 0
+
+
+'''
+    test whether the searches of the initial population stop at the end point with the same result as
+    route_through_array, are not cached and can be distributed over worker processes
+'''
+
+
+def test_grid_based_population():
+    rng = np.random.default_rng(0)
+    cost = rng.uniform(1, 10, (20, 30))
+    cost[5:15, 10] = np.nan
+    grid = xr.DataArray(cost, coords={'latitude': np.linspace(54, 56, 20), 'longitude': np.linspace(3, 6, 30)},
+                        dims=['latitude', 'longitude'])
+    path_ref, _ = route_through_array(cost, (0, 0), (12, 20), fully_connected=True, geometric=False)
+    assert find_path(cost, (0, 0), (12, 20)) == path_ref
+
+    for n_workers in [1, 2]:
+        population = GridBasedPopulation((54.0, 3.0), (55.5, 5.5), grid, cost_pool_size=2, n_workers=n_workers)
+        X = population._do(None, 5)
+        assert X.shape == (5, 1)
+        assert len(population.mcp_cache) == 0
+        assert population.cost_pool is None
+        _, _, end = population.index_to_coords(population.coords_to_index([(55.5, 5.5)])[2])
+        for iroute in range(0, 5):
+            assert np.array_equal(X[iroute, 0][0], [54.0, 3.0])
+            assert np.array_equal(X[iroute, 0][-1], end[0])
+
+
+'''
+    test whether the vectorised mapping of coordinates to grid indices agrees with get_closest for regular, irregular
+    and decreasing coordinates and whether index_to_coords inverts coords_to_index
+'''
+
+
+def test_get_closest_indices():
+    rng = np.random.default_rng(1)
+    values = rng.uniform(-1, 11, 200)
+    for points in [np.linspace(0, 10, 41), np.linspace(10, 0, 41), np.sort(rng.uniform(0, 10, 30))]:
+        indices_ref = [get_closest(points, value) for value in values]
+        assert np.array_equal(get_closest_indices(points, values), indices_ref)
+
+    grid = xr.DataArray(np.ones((20, 30)), coords={'latitude': np.linspace(56, 54, 20),
+                                                   'longitude': np.linspace(3, 6, 30)}, dims=['latitude', 'longitude'])
+    mutation = GridBasedMutation(grid)
+    lats, lons, route = mutation.index_to_coords([(0, 0), (19, 29), (4, 7)])
+    assert route.shape == (3, 2)
+    lat_indices, lon_indices, indices = mutation.coords_to_index(route + 0.01)
+    assert np.array_equal(indices, [[0, 0], [19, 29], [4, 7]])
+
+
+'''
+    test whether the history callback records the same running metric as the evaluation of the full history of pymoo
+    and whether the population snapshots are downsampled and read back from the log
+'''
+
+
+def test_genetic_history(tmp_path):
+    rng = np.random.default_rng(2)
+    grid = xr.DataArray(rng.uniform(1, 10, (20, 30)),
+                        coords={'latitude': np.linspace(54, 56, 20), 'longitude': np.linspace(3, 6, 30)},
+                        dims=['latitude', 'longitude'])
+    history = GeneticHistory(n_routes=3, log_path=str(tmp_path / 'history.jsonl'))
+    algorithm = NSGA2(pop_size=6, sampling=GridBasedPopulation((54.2, 3.2), (55.8, 5.8), grid, cost_pool_size=6),
+                      crossover=GeneticCrossover(), n_offsprings=4, mutation=GridBasedMutation(grid),
+                      eliminate_duplicates=RouteDuplicateElimination(), return_least_infeasible=False)
+    res = minimize(get_dummy_problem(), algorithm, get_termination("n_gen", 4), callback=history, save_history=True)
+
+    running = RunningMetric()
+    assert len(history.generations) == 4
+    assert len(read_history_log(history.log_path)) == 4
+    for igen, algorithm in enumerate(res.history):
+        running.update(algorithm)
+        generation = history.generations[igen]
+        assert 'routes' not in generation
+        assert np.allclose(generation['delta_f'], running.delta_f)
+        assert generation['delta_nadir'] == (running.delta_nadir[igen - 1] if igen > 0 else 0)
+        assert generation['f_min'] == algorithm.pop.get('F').min()
+
+        X = algorithm.pop.get('X')
+        routes = history.get_routes(igen)
+        assert len(routes) == 3
+        for route, idx in zip(routes, [0, 2, 5]):
+            assert np.allclose(route, X[idx, 0], atol=1e-5)
@@ -3,9 +3,11 @@ from datetime import datetime
 
 import numpy as np
 from geovectorslib import geod
+from scipy.stats import binned_statistic
 
 import tests.basic_test_func as basic_test_func
 import WeatherRoutingTool.utils.formatting as form
+from WeatherRoutingTool.algorithms.data_utils import get_max_per_bin
 from WeatherRoutingTool.constraints.constraints import LandCrossing, WaveHeight
 from WeatherRoutingTool.ship.ship import Tanker
 from WeatherRoutingTool.ship.shipparams import ShipParams
@@ -337,6 +339,24 @@ def test_pruning_select_correct_idxs():
     # form.print_line()  # ra.print_ra()
 
 
+'''
+    test whether get_max_per_bin() returns the same maxima as scipy.stats.binned_statistic and the correct indices
+'''
+
+
+def test_get_max_per_bin():
+    courses = np.array([15, 16, 22, 23, 44, 45, 71, 72, 74, 80, 95, 5])
+    dist = np.array([1, 5, 6, 1, 2, 7, 10, 1, np.nan, 3, 20, 20])
+    bins = np.array([10, 20, 40, 60, 80, 90])
+
+    bin_stat, bin_edges, bin_number = binned_statistic(courses, dist, statistic=np.nanmax, bins=bins)
+    bin_max, bin_argmax, bin_number = get_max_per_bin(courses, dist, bins)
+
+    assert np.array_equal(bin_stat, bin_max, equal_nan=True)
+    assert np.array_equal(bin_argmax, np.array([1, 2, 5, 6, 9]))
+    assert np.array_equal(bin_number, np.array([0, 0, 1, 1, 2, 2, 3, 3, -1, 4, -1, -1]))
+
+
 '''
     test shape and content of 'move' for known distance, start and end points
 '''
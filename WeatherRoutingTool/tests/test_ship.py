@@ -1,16 +1,28 @@
 from datetime import datetime, timedelta
+import copy
+import json
 import math
 import os
+import pickle
 
 import matplotlib.pyplot as plt
 import numpy as np
+import pytest
 import xarray as xr
 
+import mariPower
+
 import WeatherRoutingTool.utils.unit_conversion as utils
 
 from WeatherRoutingTool.routeparams import RouteParams
-from WeatherRoutingTool.ship.ship import Tanker
-from WeatherRoutingTool.ship.shipparams import ShipParams
+from WeatherRoutingTool.ship.ship import Tanker, TankerInMemory
+from WeatherRoutingTool.config import Config
+from WeatherRoutingTool.ship.power_cache import CachedBoat, get_cache_id, PowerCache
+from WeatherRoutingTool.ship.power_pool import ParallelBoat
+from WeatherRoutingTool.ship.ship_factory import ShipFactory
+from WeatherRoutingTool.ship.shipparams import ShipParams, get_fuel_per_time_2D
+from WeatherRoutingTool.ship.surrogate import (DEFAULT_SURROGATE_GRID, read_surrogate_grid, SurrogatePowerTable,
+                                               SurrogateTanker)
 
 
 # def test_inc():
@@ -86,6 +98,419 @@ def test_get_netCDF_courses():
     ds.close()
 '''
 
+'''
+    test whether the courses dataset that is kept in memory by TankerInMemory matches the content of the courses netCDF
+    written by Tanker
+'''
+
+
+def test_get_netCDF_courses_in_memory():
+    lat = np.array([1., 2.])
+    lon = np.array([4., 3.])
+    courses = np.array([10., 200., 30., 40., 350., 60.])
+    time = np.array([datetime(2022, 12, 19), datetime(2022, 12, 19), datetime(2022, 12, 19),
+                     datetime(2022, 12, 19) + timedelta(days=360),
+                     datetime(2022, 12, 19) + timedelta(days=360),
+                     datetime(2022, 12, 19) + timedelta(days=360)])
+
+    pol = get_default_Tanker()
+    pol.write_netCDF_courses(courses.copy(), lat, lon, time)
+    ds_file = xr.load_dataset(pol.courses_path)
+
+    pol_mem = TankerInMemory(2)
+    pol_mem.init_hydro_model_Route(pol.environment_path, None, pol.depth_path)
+    ds = pol_mem.get_netCDF_courses(courses.copy(), lat, lon, time)
+
+    assert pol_mem.courses_path != pol.courses_path
+    assert np.array_equal(ds['courses'].to_numpy(), ds_file['courses'].to_numpy())
+    assert np.array_equal(ds['speed'].to_numpy(), ds_file['speed'].to_numpy())
+    assert np.array_equal(ds['lat'].to_numpy(), ds_file['lat'].to_numpy())
+    assert np.array_equal(ds['lon'].to_numpy(), ds_file['lon'].to_numpy())
+    assert np.array_equal(ds['time'].to_numpy(), ds_file['time'].to_numpy())
+    assert ds['courses'].shape == (2, 3)
+
+
+def get_linear_power(state):
+    power = 1000 * state['speed'] + 20 * state['wind_speed'] + 3 * state['wind_angle'] + 50 * state['wave_height']
+    return {'power': power, 'rpm': 2 * state['speed']}
+
+
+def get_small_surrogate_grid():
+    return {'wind_angle': np.array([0, 90, 180]), 'wind_speed': np.array([0, 10, 30]),
+            'wave_angle': np.array([0, 180]), 'wave_height': np.array([0, 4, 8]), 'wave_period': np.array([2, 16]),
+            'current_angle': np.array([0, 180]), 'current_speed': np.array([0, 2]), 'speed': np.array([4, 6, 10])}
+
+
+'''
+    test whether the surrogate table reproduces a power model that is linear in all environmental variables and
+    whether it is correctly written to and read from file
+'''
+
+
+def test_surrogate_table_interpolation(tmp_path):
+    table = SurrogatePowerTable.generate(get_linear_power, get_small_surrogate_grid())
+    assert table.shape == (3, 3, 2, 3, 2, 2, 2, 3)
+
+    filepath = os.path.join(tmp_path, 'surrogate.npz')
+    table.write_to_file(filepath)
+    table_read = SurrogatePowerTable.from_file(filepath)
+
+    state = {'wind_angle': np.array([45., 170.]), 'wind_speed': np.array([5., 12.]),
+             'wave_angle': np.array([10., 100.]), 'wave_height': np.array([1., 7.]),
+             'wave_period': np.array([5., 10.]), 'current_angle': np.array([0., 30.]),
+             'current_speed': np.array([0.5, 1.]), 'speed': np.array([5., 6.])}
+    params = table_read.interpolate(state)
+
+    assert np.allclose(params['power'], get_linear_power(state)['power'], rtol=1e-6)
+    assert np.allclose(params['rpm'], get_linear_power(state)['rpm'], rtol=1e-6)
+
+    errors = table_read.get_holdout_error(get_linear_power, n_samples=20, seed=1)
+    assert errors['power']['max'] < 1e-6
+
+
+'''
+    test whether SurrogateTanker returns one set of ship parameters per course and whether courses that are symmetric
+    with respect to the environmental conditions result in the same power
+'''
+
+
+def test_surrogate_tanker_per_course():
+    dirname = os.path.dirname(__file__)
+    table = SurrogatePowerTable.generate(get_linear_power, get_small_surrogate_grid())
+    pol = SurrogateTanker(table)
+    pol.init_hydro_model_Route(os.path.join(dirname, 'data/reduced_testdata_weather.nc'), None, None)
+    pol.set_boat_speed(6)
+
+    time = np.full(4, datetime.strptime("2023-07-20T10:00Z", '%Y-%m-%dT%H:%MZ'))
+    lats = np.full(4, 54.9)
+    lons = np.full(4, 13.2)
+    courses = np.array([0., 90., 180., 270.])
+    ship_params = pol.get_fuel_per_time_netCDF(courses, lats, lons, time)
+    ship_params_unique = pol.get_fuel_per_time_netCDF(courses, lats, lons, time, True)
+
+    assert ship_params.get_power().shape == (4,)
+    assert np.allclose(ship_params.get_power(), ship_params_unique.get_power())
+    assert np.all(ship_params.get_fuel() > 0)
+    assert np.all(ship_params.speed == 6)
+
+    state = pol.get_env_state(courses, lats, lons, time)
+    env = pol.env_sampler.sample(lats[0], lons[0], time[0], ['u_wind', 'v_wind'])
+    wind_dir = np.degrees(np.arctan2(env['u_wind'], env['v_wind'])) + 180
+    courses_mirrored = (2 * wind_dir - courses) % 360
+    ship_params_mirrored = pol.get_fuel_per_time_netCDF(courses_mirrored, lats, lons, time)
+    state_mirrored = pol.get_env_state(courses_mirrored, lats, lons, time)
+    assert np.allclose(state['wind_angle'], state_mirrored['wind_angle'])
+    assert np.allclose(ship_params.get_power(), ship_params_mirrored.get_power())
+
+
+'''
+    test whether the grid of the surrogate table is read from json (grid points or evenly spaced) with the default
+    grid for missing axes and whether parameters that are not part of the table are returned as NaN
+'''
+
+
+def test_surrogate_grid_and_missing_params(tmp_path):
+    filepath = os.path.join(tmp_path, 'grid.json')
+    with open(filepath, 'w') as f:
+        json.dump({'speed': [6, 7], 'current_speed': {'start': 0, 'stop': 1, 'num': 3}}, f)
+    grid = read_surrogate_grid(filepath)
+    assert np.array_equal(grid['speed'], [6., 7.])
+    assert np.array_equal(grid['current_speed'], [0., 0.5, 1.])
+    assert np.array_equal(grid['wind_angle'], DEFAULT_SURROGATE_GRID['wind_angle'])
+
+    with open(filepath, 'w') as f:
+        json.dump({'boat_speed': [6, 7]}, f)
+    with pytest.raises(ValueError):
+        read_surrogate_grid(filepath)
+
+    dirname = os.path.dirname(__file__)
+    table = SurrogatePowerTable.generate(lambda state: {'power': get_linear_power(state)['power']},
+                                         get_small_surrogate_grid())
+    pol = SurrogateTanker(table)
+    pol.init_hydro_model_Route(os.path.join(dirname, 'data/reduced_testdata_weather.nc'), None, None)
+    pol.set_boat_speed(6)
+
+    time = np.full(2, datetime.strptime("2023-07-20T10:00Z", '%Y-%m-%dT%H:%MZ'))
+    ship_params = pol.get_fuel_per_time_netCDF(np.array([0., 90.]), np.full(2, 54.9), np.full(2, 13.2), time)
+    assert np.all(ship_params.get_power() > 0)
+    assert np.all(np.isnan(ship_params.get_rpm()))
+    for r in [ship_params.get_rwind(), ship_params.get_rcalm(), ship_params.get_rwaves(),
+              ship_params.get_rshallow(), ship_params.get_rroughness()]:
+        assert np.all(np.isnan(r))
+
+
+class CountingBoat():
+    def __init__(self):
+        self.speed = 6
+        self.requested_courses = []
+
+    def set_boat_speed(self, speed):
+        self.speed = speed
+
+    def get_fuel_per_time_netCDF(self, courses, lats, lons, time, unique_coords=False):
+        self.requested_courses.append(courses.copy())
+        power = 1000 * courses + lats
+        return ShipParams(fuel=power / 10, power=power, rpm=np.full(courses.shape, 2.),
+                          speed=np.full(courses.shape, 6.), r_calm=power, r_wind=power, r_waves=power,
+                          r_shallow=power, r_roughness=power)
+
+
+'''
+    test whether CachedBoat only forwards uncached states to the boat, whether states within the tolerances share one
+    cache entry and whether the LRU eviction bounds the number of cached states
+'''
+
+
+def test_power_cache_uncached_subset():
+    boat = CountingBoat()
+    cached_boat = CachedBoat(boat, PowerCache(max_size=3, tolerances={'time': 3600}))
+    time = np.full(3, datetime(2023, 7, 20, 10))
+    lats = np.array([54.9, 54.9, 54.901])
+    lons = np.full(3, 13.2)
+
+    ship_params = cached_boat.get_fuel_per_time_netCDF(np.array([10., 20., 10.2]), lats, lons, time)
+    assert np.array_equal(boat.requested_courses[0], np.array([10., 20.]))
+    assert np.allclose(ship_params.get_power(), np.array([10054.9, 20054.9, 10054.9]))
+    assert cached_boat.speed == 6
+
+    ship_params = cached_boat.get_fuel_per_time_netCDF(np.array([20., 30.]), lats[:2], lons[:2], time[:2])
+    assert np.array_equal(boat.requested_courses[1], np.array([30.]))
+    assert np.allclose(ship_params.get_fuel(), np.array([2005.49, 3005.49]))
+    assert cached_boat.cache.hits == 1
+    assert cached_boat.cache.misses == 4
+    assert len(cached_boat.cache.entries) == 3
+
+    cached_boat.get_fuel_per_time_netCDF(np.array([40., 50.]), lats[:2], lons[:2], time[:2])
+    assert len(cached_boat.cache.entries) == 3
+    cached_boat.get_fuel_per_time_netCDF(np.array([30., 10.]), lats[:2], lons[:2], time[:2])
+    assert np.array_equal(boat.requested_courses[3], np.array([10.]))
+
+
+'''
+    test whether CachedBoat can be copied and pickled, i.e. whether the delegation of attributes to the boat does not
+    recurse for an instance without attributes
+'''
+
+
+def test_power_cache_copy():
+    boat = CountingBoat()
+    cached_boat = CachedBoat(boat, PowerCache(max_size=3, tolerances={'time': 3600}))
+    cached_boat.get_fuel_per_time_netCDF(np.array([10.]), np.array([54.9]), np.array([13.2]),
+                                         np.array([datetime(2023, 7, 20, 10)]))
+
+    for cached_boat_copy in [copy.deepcopy(cached_boat), pickle.loads(pickle.dumps(cached_boat))]:
+        assert cached_boat_copy.speed == 6
+        assert len(cached_boat_copy.cache.entries) == 1
+        assert cached_boat_copy.boat is not boat
+
+    with pytest.raises(AttributeError):
+        CachedBoat.__new__(CachedBoat).speed
+
+
+'''
+    test whether the ship parameters are read from the on-disk tier of the power cache by a new cache instance
+'''
+
+
+def test_power_cache_disk_tier(tmp_path):
+    time = np.full(2, datetime(2023, 7, 20, 10))
+    lats = np.array([54.9, 55.])
+    lons = np.full(2, 13.2)
+    courses = np.array([10., 20.])
+
+    boat = CountingBoat()
+    cached_boat = CachedBoat(boat, PowerCache(cache_dir=str(tmp_path), cache_id='test'))
+    ship_params = cached_boat.get_fuel_per_time_netCDF(courses, lats, lons, time)
+
+    boat_new = CountingBoat()
+    cached_boat_new = CachedBoat(boat_new, PowerCache(cache_dir=str(tmp_path), cache_id='test'))
+    ship_params_new = cached_boat_new.get_fuel_per_time_netCDF(courses, lats, lons, time)
+
+    assert len(boat_new.requested_courses) == 0
+    assert cached_boat_new.cache.disk_hits == 2
+    assert np.array_equal(ship_params.get_power(), ship_params_new.get_power())
+    assert np.array_equal(ship_params.get_rpm(), ship_params_new.get_rpm())
+
+
+'''
+    test whether the identifier of the on-disk tier of the power cache is shared by Tanker and TankerInMemory and
+    changes with the ship, the depth file (path or modification time) and the surrogate table
+'''
+
+
+def test_power_cache_id(tmp_path):
+    for filename in ['weather.nc', 'depth.nc', 'depth_new.nc', 'table.npz', 'table_new.npz']:
+        (tmp_path / filename).write_text(filename)
+    config = Config(file_name=os.path.join(os.path.dirname(__file__), 'config.tests.json'))
+    config.WEATHER_DATA = str(tmp_path / 'weather.nc')
+    config.DEPTH_DATA = str(tmp_path / 'depth.nc')
+    config.BOAT_TYPE = 'tanker'
+
+    tanker = Tanker(-99)
+    tanker.hydro_model = mariPower.ship.CBT()
+    tanker_in_memory = TankerInMemory(-99)
+    tanker_in_memory.hydro_model = mariPower.ship.CBT()
+    ship_id = tanker.get_ship_id()
+    assert tanker_in_memory.get_ship_id() == ship_id
+    assert ship_id.startswith('mariPower-')
+
+    cache_id = get_cache_id(config, ship_id)
+    assert get_cache_id(config, ship_id) == cache_id
+    assert cache_id.startswith(ship_id + '_')
+    assert get_cache_id(config, 'mariPower-other-CBT') != cache_id
+
+    stat = os.stat(config.DEPTH_DATA)
+    os.utime(config.DEPTH_DATA, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert get_cache_id(config, ship_id) != cache_id
+    config.DEPTH_DATA = str(tmp_path / 'depth_new.nc')
+    assert get_cache_id(config, ship_id) != cache_id
+
+    config.BOAT_TYPE = 'surrogate'
+    config.BOAT_SURROGATE_TABLE = str(tmp_path / 'table.npz')
+    cache_id_surrogate = get_cache_id(config, 'surrogate')
+    config.BOAT_SURROGATE_TABLE = str(tmp_path / 'table_new.npz')
+    assert get_cache_id(config, 'surrogate') != cache_id_surrogate
+    assert cache_id_surrogate.startswith('surrogate_')
+
+
+'''
+    test whether the ship parameters returned by the worker processes of ParallelBoat are merged in the original order
+    of the courses
+'''
+
+
+def test_parallel_boat_merge_order():
+    n_courses = 45
+    courses = np.linspace(0, 350, n_courses)
+    lats = np.linspace(54, 55, n_courses)
+    lons = np.full(n_courses, 13.2)
+    time = np.full(n_courses, datetime(2023, 7, 20, 10))
+
+    boat = CountingBoat()
+    parallel_boat = ParallelBoat(CountingBoat(), 3, CountingBoat, min_chunk_size=10)
+    try:
+        ship_params = parallel_boat.get_fuel_per_time_netCDF(courses, lats, lons, time)
+        ship_params_small = parallel_boat.get_fuel_per_time_netCDF(courses[:15], lats[:15], lons[:15], time[:15])
+    finally:
+        parallel_boat.close()
+    ship_params_ref = boat.get_fuel_per_time_netCDF(courses, lats, lons, time)
+
+    assert np.array_equal(ship_params.get_power(), ship_params_ref.get_power())
+    assert np.array_equal(ship_params.get_fuel(), ship_params_ref.get_fuel())
+    assert np.array_equal(ship_params_small.get_power(), ship_params_ref.get_power()[:15])
+    assert len(parallel_boat.requested_courses) == 1
+
+
+'''
+    test whether ParallelBoat can be copied and pickled while its pool of worker processes is running and whether the
+    copies start their own pool
+'''
+
+
+def test_parallel_boat_copy():
+    n_courses = 30
+    courses = np.linspace(0, 350, n_courses)
+    lats = np.linspace(54, 55, n_courses)
+    lons = np.full(n_courses, 13.2)
+    time = np.full(n_courses, datetime(2023, 7, 20, 10))
+
+    parallel_boat = ParallelBoat(CountingBoat(), 2, CountingBoat, min_chunk_size=10)
+    parallel_boat_copies = []
+    try:
+        ship_params = parallel_boat.get_fuel_per_time_netCDF(courses, lats, lons, time)
+        parallel_boat_copies = [copy.deepcopy(parallel_boat), pickle.loads(pickle.dumps(parallel_boat))]
+        for parallel_boat_copy in parallel_boat_copies:
+            assert parallel_boat_copy.pool is None
+            assert parallel_boat_copy.speed == 6
+            ship_params_copy = parallel_boat_copy.get_fuel_per_time_netCDF(courses, lats, lons, time)
+            assert np.array_equal(ship_params_copy.get_power(), ship_params.get_power())
+            assert parallel_boat_copy.pool is not parallel_boat.pool
+    finally:
+        for boat in [parallel_boat] + parallel_boat_copies:
+            boat.close()
+
+
+def get_fake_prediction(n_courses_per_request):
+    def predict_power(ship, courses_path, environment_path, *args):
+        ds = xr.load_dataset(courses_path)
+        n_courses_per_request.append(ds['it_course'].shape[0])
+        for var in ['Power_brake', 'RotationRate', 'Fuel_consumption_rate', 'Calm_resistance', 'Wind_resistance',
+                    'Wave_resistance', 'Shallow_water_resistance', 'Hull_roughness_resistance']:
+            ds[var] = 1000 * ds['courses'] + ds['lat']
+        ds.to_netcdf(courses_path)
+
+    return predict_power
+
+
+'''
+    test whether 2D requests return the ship parameters per space-time point and course and whether the shim for
+    single-course requests returns the same ship parameters as the batched request
+'''
+
+
+def test_get_fuel_per_time_2D(monkeypatch):
+    n_courses_per_request = []
+    monkeypatch.setattr(mariPower.__main__, 'PredictPowerOrSpeedRoute', get_fake_prediction(n_courses_per_request),
+                        raising=False)
+
+    lats = np.array([54.9, 55.1])
+    lons = np.array([13.2, 13.2])
+    time = np.array([datetime(2023, 7, 20, 10), datetime(2023, 7, 20, 11)])
+    courses = np.array([[10., 20., 30.], [40., 50., 60.]])
+
+    pol = get_default_Tanker()
+    ship_params = pol.get_fuel_per_time_netCDF_2D(courses.copy(), lats, lons, time)
+
+    pol.single_course_requests = True
+    ship_params_single = pol.get_fuel_per_time_netCDF_2D(courses.copy(), lats, lons, time)
+
+    power_test = 1000 * np.radians(courses) + lats[:, np.newaxis]
+    assert n_courses_per_request == [3, 1, 1, 1]
+    assert ship_params.get_power().shape == (2, 3)
+    assert np.allclose(ship_params.get_power(), power_test)
+    assert np.allclose(ship_params_single.get_power(), power_test)
+    assert np.allclose(ship_params_single.get_fuel(), ship_params.get_fuel())
+
+    boat = CountingBoat()
+    ship_params_flat = get_fuel_per_time_2D(boat, courses, lats, lons, time)
+    assert np.array_equal(boat.requested_courses[0], courses.flatten())
+    assert np.allclose(ship_params_flat.get_power(), 1000 * courses + lats[:, np.newaxis])
+
+
+'''
+    test whether BOAT_SINGLE_COURSE_REQUESTS is passed to the boats of the main process and of the worker processes
+    and whether it is rejected for the surrogate model
+'''
+
+
+def test_single_course_requests_from_config(tmp_path):
+    dirname = os.path.dirname(__file__)
+    config = Config(file_name=os.path.join(dirname, 'config.tests.json'))
+    config.WEATHER_DATA = os.path.join(dirname, 'data/reduced_testdata_weather.nc')
+    config.DEPTH_DATA = os.path.join(dirname, 'data/reduced_testdata_depth.nc')
+    config.COURSES_FILE = str(tmp_path / 'courses.nc')
+    config.BOAT_TYPE = 'tanker_in_memory'
+
+    assert not ShipFactory.get_ship(config).single_course_requests
+
+    config.BOAT_SINGLE_COURSE_REQUESTS = True
+    assert ShipFactory.get_ship(config).single_course_requests
+
+    config.BOAT_N_WORKERS = 2
+    parallel_boat = ShipFactory.get_ship(config)
+    assert isinstance(parallel_boat, ParallelBoat)
+    assert parallel_boat.single_course_requests
+    assert ShipFactory.get_ship(*parallel_boat.args).single_course_requests
+
+    config.BOAT_N_WORKERS = 1
+    config.BOAT_TYPE = 'surrogate'
+    config.BOAT_SURROGATE_TABLE = str(tmp_path / 'surrogate.npz')
+    table = SurrogatePowerTable.generate(get_linear_power, get_small_surrogate_grid())
+    table.write_to_file(config.BOAT_SURROGATE_TABLE)
+    with pytest.raises(ValueError):
+        ShipFactory.get_ship(config)
+
+
 '''
     test whether power is correctly extracted from courses netCDF
 '''
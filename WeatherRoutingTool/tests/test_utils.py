@@ -1,4 +1,9 @@
+import numpy as np
+import xarray as xr
+
 import WeatherRoutingTool.utils.unit_conversion as unit
+from WeatherRoutingTool.utils.field_sampler import FieldSampler
+from WeatherRoutingTool.utils.step_buffer import StepBuffer
 
 
 def test_get_angle_bins_2greater360():
@@ -49,3 +54,78 @@ def test_get_angle_bins_minsmaller0():
     assert result[0] == 320
     assert result[result.shape[0] - 1] == 20
     assert (result[1] - result[0]) == 1
+
+
+'''
+    test whether StepBuffer.prepend() gives the same result as np.vstack and grows the capacity if the buffer is full
+'''
+
+
+def test_step_buffer_prepend():
+    history = np.array([[0, 0, 0]])
+    buffer = StepBuffer(history, 6)
+
+    for i in range(1, 4):
+        row = np.array([i + 0.1, i + 0.2, i + 0.3])
+        history = np.vstack((row, history))
+        buffer.prepend(row)
+
+    assert np.array_equal(buffer.array, history)
+    assert buffer.array.dtype == history.dtype
+    assert buffer.capacity == 12
+
+
+'''
+    test whether the full history is rebuilt correctly after branching out and pruning of variants via
+    StepBuffer.take()
+'''
+
+
+def test_step_buffer_take():
+    history = np.array([[1, 2, 3], [4, 5, 6]])
+    buffer = StepBuffer(history)
+
+    buffer.take([2, 0, 0])
+    history = history[:, [2, 0, 0]]
+    assert np.array_equal(buffer.array, history)
+
+    buffer.prepend(np.array([7, 8, 9]))
+    buffer.take([1, 2])
+    history = np.vstack((np.array([7, 8, 9]), history))[:, [1, 2]]
+
+    assert np.array_equal(buffer.array, history)
+    assert np.array_equal(buffer.get_step(1), history[1])
+    assert np.array_equal(buffer.get_columns(1), history[:, 1])
+    assert buffer.shape == history.shape
+
+
+'''
+    test whether FieldSampler returns the same values as the linear interpolation of xarray, including points on
+    grids with decreasing coordinates, missing values and points outside of the grid
+'''
+
+
+def test_field_sampler_matches_xarray_interp():
+    rng = np.random.default_rng(1)
+    time = np.datetime64('2023-08-01T00:00', 'ns') + np.arange(4) * np.timedelta64(3, 'h')
+    lats = np.linspace(56, 50, 13)
+    lons = np.array([0., 0.5, 1., 2., 3.5, 5.])
+    data = rng.uniform(0, 10, (4, 13, 6))
+    data[2, 5, 3] = np.nan
+    ds = xr.Dataset({'var': (('time', 'latitude', 'longitude'), data)},
+                    coords={'time': time, 'latitude': lats, 'longitude': lons})
+
+    n_points = 200
+    lats_sample = rng.uniform(49.5, 56, n_points)
+    lons_sample = rng.uniform(0, 5.5, n_points)
+    time_sample = time[0] + rng.uniform(0, 9 * 3600, n_points).astype('timedelta64[s]')
+
+    sampler = FieldSampler.from_dataset(ds, ['var'])
+    result = sampler.sample(lats_sample, lons_sample, time_sample)['var']
+    expected = ds['var'].interp(time=xr.DataArray(time_sample, dims='points'),
+                                latitude=xr.DataArray(lats_sample, dims='points'),
+                                longitude=xr.DataArray(lons_sample, dims='points')).to_numpy()
+
+    assert result.shape == (n_points,)
+    assert np.array_equal(np.isnan(result), np.isnan(expected))
+    assert np.allclose(result[~np.isnan(result)], expected[~np.isnan(expected)])
@@ -0,0 +1,21 @@
+import argparse
+
+from WeatherRoutingTool.config import set_up_logging
+from WeatherRoutingTool.constraints.constraints import ContinuousCheck
+from WeatherRoutingTool.constraints.layer_cache import CACHE_LAYERS, ConstraintLayerCache
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Weather Routing Tool')
+    parser.add_argument('-o', '--out', help="Directory of the constraint layer cache (absolute path)", required=True,
+                        type=str)
+    parser.add_argument('--tile-size', help="Size of the tiles in degrees. Defaults to 10.", required=False,
+                        type=float, default=10)
+    parser.add_argument('--force', help="Export the layers even if the cache is up to date.", action='store_true')
+
+    args = parser.parse_args()
+
+    set_up_logging()
+    check = ContinuousCheck()
+    cache = ConstraintLayerCache(args.out, args.tile_size)
+    cache.sync(check.connect_database(), dict(zip(CACHE_LAYERS, check.query)), args.force)
@@ -0,0 +1,36 @@
+import argparse
+
+from WeatherRoutingTool.config import Config, set_up_logging
+from WeatherRoutingTool.ship.ship import Tanker
+from WeatherRoutingTool.ship.surrogate import DEFAULT_SURROGATE_GRID, read_surrogate_grid, SurrogatePowerTable
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Weather Routing Tool')
+    parser.add_argument('-f', '--file', help="Config file name (absolute path)", required=True, type=str)
+    parser.add_argument('-o', '--out', help="Surrogate table file name (absolute path)", required=True, type=str)
+    parser.add_argument('--holdout', help="Number of random states for the comparison to mariPower. Defaults to 0.",
+                        required=False, type=int, default=0)
+    parser.add_argument('--grid', help="Json file with the grid points per axis (absolute path). Axes that are not "
+                                       "provided are taken from the default grid.", required=False, type=str)
+
+    args = parser.parse_args()
+    if not args.file:
+        raise RuntimeError("No config file name provided!")
+
+    set_up_logging()
+    config = Config(file_name=args.file)
+    config.print()
+
+    boat = Tanker(-99)
+    boat.init_hydro_model_Route(config.WEATHER_DATA, config.COURSES_FILE, config.DEPTH_DATA)
+
+    grid = DEFAULT_SURROGATE_GRID
+    if args.grid:
+        grid = read_surrogate_grid(args.grid)
+
+    table = SurrogatePowerTable.generate(boat.get_params_per_state, grid)
+    table.write_to_file(args.out)
+
+    if args.holdout > 0:
+        table.get_holdout_error(boat.get_params_per_state, args.holdout)